@@ -1,16 +1,9 @@
 import os
-from typing import Final, Optional
+from typing import Final
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def _find_photo_path(base_dir: str, name: str) -> Optional[str]:
-    for ext in ['.jpg', '.JPG', '.jpeg', '.JPEG', '.png', '.PNG']:
-        path = os.path.join(base_dir, f"{name}{ext}")
-        if os.path.exists(path):
-            return path
-    return None
-
 BOT_TOKEN: Final[str] = os.getenv("BOT_TOKEN", "")
 ADMIN_ID: Final[int] = int(os.getenv("ADMIN_ID", "0"))
 CHANNEL_ID: Final[int] = int(os.getenv("CHANNEL_ID", "0"))
@@ -19,14 +12,16 @@ CHANNEL_USERNAME: Final[str] = os.getenv("CHANNEL_USERNAME", "")
 DATABASE_PATH: Final[str] = "data/database.db"
 LOGS_PATH: Final[str] = "data/bot.log"
 BACKUP_DIR: Final[str] = "data/backups"
+MEDIA_CACHE_DIR: Final[str] = "data/media_cache"
 
 BROADCAST_COOLDOWN_MINUTES: Final[int] = 2
-MESSAGE_DELAY_SECONDS: Final[float] = 0.3
 
 PROMO_CHECK_INTERVAL_HOURS: Final[int] = 24
 
 ADMIN_USERNAME: Final[str] = os.getenv("ADMIN_USERNAME", "@katana8pro")
 NOTIFICATION_CHAT_ID: Final[int] = int(os.getenv("NOTIFICATION_CHAT_ID", "-1001712750879"))
+# Чат для предзагрузки фото меню при старте (по умолчанию - главный админ)
+PHOTO_WARMUP_CHAT_ID: Final[int] = int(os.getenv("PHOTO_WARMUP_CHAT_ID", "0"))
 
 DEFAULT_PROMO_DAYS: Final[int] = 7
 MIN_PROMO_DAYS: Final[int] = 1
@@ -34,11 +29,94 @@ MAX_PROMO_DAYS: Final[int] = 365
 MAX_PROMO_CODE_LENGTH: Final[int] = 100
 
 MENU_PHOTOS_DIR: Final[str] = os.path.join(os.path.dirname(__file__), "media", "menu")
+MENU_PHOTO_KEYS: Final[tuple[str, ...]] = ("main", "promo", "book_pc", "promotions", "tariffs", "feedbackph", "help")
+MENU_PHOTO_EXTENSIONS: Final[tuple[str, ...]] = (".jpg", ".JPG", ".jpeg", ".JPEG", ".png", ".PNG")
+# Оптимизация фото меню перед загрузкой: длинная сторона и целевой размер JPEG
+MENU_PHOTO_MAX_SIDE: Final[int] = 1280
+MENU_PHOTO_TARGET_BYTES: Final[int] = 350 * 1024
+# Интервал пересканирования каталога фото меню (новые и замененные файлы подхватываются без рестарта)
+MEDIA_SCAN_INTERVAL_SECONDS: Final[int] = 30
+
+# Отслеживание сообщений меню: максимум чатов в памяти и период сброса изменений в БД
+TRACKED_MESSAGES_MAX_CHATS: Final[int] = 50000
+TRACKED_MESSAGES_FLUSH_SECONDS: Final[int] = 10
+
+# Слой запросов к Bot API: повторы, ожидание flood control и предохранитель по методам
+API_MAX_ATTEMPTS: Final[int] = 3
+API_BACKOFF_BASE_SECONDS: Final[float] = 0.5
+API_BACKOFF_MAX_SECONDS: Final[float] = 8.0
+API_RETRY_AFTER_MAX_SECONDS: Final[int] = 30
+API_CIRCUIT_FAILURE_THRESHOLD: Final[int] = 5
+API_CIRCUIT_RESET_SECONDS: Final[int] = 30
+
+# Лимиты отправки Bot API: глобально в секунду и на один чат (личный / группа)
+API_GLOBAL_RATE_PER_SECOND: Final[int] = 30
+API_PRIVATE_CHAT_RATE_PER_SECOND: Final[float] = 1.0
+API_GROUP_CHAT_RATE_PER_MINUTE: Final[int] = 20
+
+# Параллельная обработка обновлений: одновременно выполняемые обработчики и принятые в работу обновления
+MAX_CONCURRENT_UPDATES: Final[int] = int(os.getenv("MAX_CONCURRENT_UPDATES", "32"))
+MAX_PENDING_UPDATES: Final[int] = 1024
+
+# Режим получения обновлений: polling (по умолчанию) или webhook
+BOT_MODE: Final[str] = os.getenv("BOT_MODE", "polling").lower()
+# Публичный адрес, на который Telegram шлет обновления (без пути). Пустой - webhook не регистрируется,
+# сервер только принимает запросы (удобно для локальной проверки через curl)
+WEBHOOK_URL: Final[str] = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH: Final[str] = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_LISTEN: Final[str] = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT: Final[int] = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_SECRET_TOKEN: Final[str] = os.getenv("WEBHOOK_SECRET_TOKEN", "")
+WEBHOOK_QUEUE_SIZE: Final[int] = int(os.getenv("WEBHOOK_QUEUE_SIZE", "500"))
+WEBHOOK_MAX_CONNECTIONS: Final[int] = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+
+# Как часто состояние пользователей (режимы меню, шаги админ-диалогов) сохраняется в БД
+PERSISTENCE_UPDATE_INTERVAL_SECONDS: Final[int] = 10
+
+# Выгрузка user_data пользователей, неактивных дольше USER_DATA_IDLE_HOURS (проверка раз в интервал)
+USER_DATA_IDLE_HOURS: Final[int] = 6
+USER_DATA_EVICTION_INTERVAL_MINUTES: Final[int] = 15
+
+# Антифлуд для меню и текстовых сообщений: токены в секунду, запас на всплеск, окно отсева повторных нажатий
+FLOOD_RATE_PER_SECOND: Final[float] = 2.0
+FLOOD_BURST: Final[int] = 6
+CALLBACK_DEDUP_SECONDS: Final[float] = 2.0
+
+# Сколько дней помнить, от какого пользователя пришло пересланное админу сообщение (для ответов)
+RELAY_MESSAGE_TTL_DAYS: Final[int] = 30
+
+# Очередь уведомлений в NOTIFICATION_CHAT_ID: при такой глубине заявки объединяются в сводки,
+# неудачные отправки повторяются с растущей задержкой
+NOTIFICATION_DIGEST_THRESHOLD: Final[int] = 5
+NOTIFICATION_DIGEST_MAX_ITEMS: Final[int] = 10
+NOTIFICATION_RETRY_BASE_SECONDS: Final[int] = 5
+NOTIFICATION_RETRY_MAX_SECONDS: Final[int] = 600
+
+# Заявки (брони, отзывы, участие в розыгрыше): повторная заявка того же вида от пользователя
+# в течение окна не принимается; участники розыгрыша учитываются по кампании
+SUBMISSION_DEDUP_MINUTES: Final[int] = 10
+WINTER_DROP_CAMPAIGN: Final[str] = os.getenv("WINTER_DROP_CAMPAIGN", "katana_winter_drop")
+
+# Режим дропа (включается в админке): одновременно обрабатываемых нажатий на "Промокод",
+# выдач в секунду, мест в очереди; как часто и скольким ожидающим обновлять номер в очереди.
+# Ожидающий в очереди занимает место среди принятых в работу обновлений (MAX_PENDING_UPDATES),
+# поэтому очередь меньше него - остальным пользователям остается запас
+DROP_MAX_CONCURRENCY: Final[int] = 8
+DROP_CLAIMS_PER_SECOND: Final[float] = 10.0
+DROP_MAX_QUEUE: Final[int] = MAX_PENDING_UPDATES * 3 // 4
+DROP_POSITION_UPDATE_SECONDS: Final[float] = 3.0
+DROP_POSITION_UPDATES_PER_TICK: Final[int] = 20
+
+# Истекшие промокоды деактивируются точно в срок, пачками по столько строк
+PROMO_EXPIRY_BATCH_SIZE: Final[int] = 500
+
+# Удаление истекших промокодов (история выдачи уходит в promo_usage_archive):
+# пачка на одну транзакцию и пауза между пачками
+PROMO_CLEANUP_BATCH_SIZE: Final[int] = 200
+PROMO_CLEANUP_PAUSE_SECONDS: Final[float] = 0.05
 
-def _init_menu_photos() -> dict[str, Optional[str]]:
-    photos = {}
-    for key in ["main", "promo", "book_pc", "promotions", "tariffs", "feedbackph", "help"]:
-        photos[key] = _find_photo_path(MENU_PHOTOS_DIR, key)
-    return photos
+# Промокод выдается случайный из стольких ближайших по сроку свободных
+PROMO_CLAIM_CANDIDATES: Final[int] = 20
 
-MENU_PHOTOS: Final[dict[str, Optional[str]]] = _init_menu_photos()
\ No newline at end of file
+# Новые пользователи и изменения профиля из /start записываются в БД пачкой раз в столько секунд
+USER_REGISTRY_FLUSH_SECONDS: Final[float] = 0.3
\ No newline at end of file
@@ -26,6 +26,23 @@ NO_ACTIVE_PROMO_MESSAGE: Final[str] = (
     "Ожидайте новых предложений!"
 )
 
+DUPLICATE_SUBMISSION_MESSAGE: Final[str] = (
+    "Мы уже получили вашу заявку и скоро с вами свяжемся.\n"
+    "Если нужно что-то уточнить, напишите администратору через раздел «Помощь»."
+)
+
+DROP_QUEUED_MESSAGE: Final[str] = (
+    "⏳ Вы {position}-й в очереди за промокодом.\n\n"
+    "Не нажимайте кнопку повторно - сообщение обновится само."
+)
+
+DROP_SOLD_OUT_MESSAGE: Final[str] = (
+    "😔 Промокоды этого дропа закончились.\n"
+    "Следите за анонсами в канале!"
+)
+
+DROP_BUSY_MESSAGE: Final[str] = "Слишком много желающих прямо сейчас. Попробуйте через минуту."
+
 ADMIN_ONLY_MESSAGE: Final[str] = "Эта команда доступна только администратору."
 
 BROADCAST_STARTED_MESSAGE: Final[str] = "Начинаю рассылку для {count} пользователей..."
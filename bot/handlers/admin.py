@@ -1,6 +1,7 @@
 import os
 import logging
-from typing import Optional
+from html import escape
+from typing import List, Optional, Tuple
 from datetime import datetime
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes, ConversationHandler
@@ -15,13 +16,35 @@ from bot.config import (
 from bot.constants import ADMIN_ONLY_MESSAGE, ADMIN_PANEL_MAIN
 from bot.services.database import db
 from bot.services.promo import promo_service
+from bot.services.telegram_api import telegram_api
 from bot.middleware.message_cleanup import message_cleanup
+from bot.middleware.update_processor import update_processor
+from bot.middleware.user_activity import user_activity
+from bot.middleware.flood_control import flood_control
+from bot.services.persistence import persistence
+from bot.services.notification_queue import notification_queue
+from bot.services.drop_admission import drop_admission
+from bot.services.promo_expiry import promo_expiry
+from bot.services.user_registry import user_registry
+from bot.services.submissions import (
+    submission_store,
+    SUBMISSION_BOOKING,
+    SUBMISSION_FEEDBACK,
+    SUBMISSION_WINTER_DROP
+)
+from bot.handlers.router import create_router, routers
+from bot.utils.timefmt import format_datetime, format_expiry, format_time
 
 logger = logging.getLogger(__name__)
 
 AWAITING_PROMO_CODE, AWAITING_PROMO_DAYS, AWAITING_BROADCAST_TEXT, AWAITING_BROADCAST_PHOTO, AWAITING_BROADCAST_CONFIRM, AWAITING_PROMO_FILE, AWAITING_ADMIN_ID, AWAITING_FILE_EXPIRY_DATE, AWAITING_FILE_EXPIRY_TIME = range(9)
 ADMIN_MAIN = "admin_main"
 
+# Сколько самых медленных маршрутов показывать на экране производительности
+PERF_TOP_ROUTES = 8
+# Сколько последних открытых броней показывать на экране заявок
+SUBMISSIONS_SHOWN = 5
+
 PROMO_FILES_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'promo_files')
 os.makedirs(PROMO_FILES_DIR, exist_ok=True)
 
@@ -67,11 +90,15 @@ async def show_admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, ed
             InlineKeyboardButton("📁 Загрузить файл с промокодами", callback_data="upload_promo_file")
         ],
         [
-            InlineKeyboardButton("📜 История выдачи", callback_data="promo_history")
+            InlineKeyboardButton("📜 История выдачи", callback_data="promo_history"),
+            InlineKeyboardButton("📥 Заявки", callback_data="submissions")
         ],
         [
             InlineKeyboardButton("📊 Статистика", callback_data="stats"),
             InlineKeyboardButton("📤 Рассылка", callback_data="broadcast_menu")
+        ],
+        [
+            InlineKeyboardButton("🚀 Режим дропа", callback_data="drop_mode")
         ]
     ]
 
@@ -114,11 +141,15 @@ async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
             InlineKeyboardButton("📁 Загрузить файл с промокодами", callback_data="upload_promo_file")
         ],
         [
-            InlineKeyboardButton("📜 История выдачи", callback_data="promo_history")
+            InlineKeyboardButton("📜 История выдачи", callback_data="promo_history"),
+            InlineKeyboardButton("📥 Заявки", callback_data="submissions")
         ],
         [
             InlineKeyboardButton("📊 Статистика", callback_data="stats"),
             InlineKeyboardButton("📤 Рассылка", callback_data="broadcast_menu")
+        ],
+        [
+            InlineKeyboardButton("🚀 Режим дропа", callback_data="drop_mode")
         ]
     ]
 
@@ -148,239 +179,344 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     await query.answer()
 
-    if query.data == ADMIN_MAIN:
-        await show_admin_menu(update, context, edit=True)
-        return ConversationHandler.END
+    return await admin_router.dispatch(update, context)
 
-    elif query.data == "add_promo":
-        keyboard = [[InlineKeyboardButton("❌ Отмена", callback_data=ADMIN_MAIN)]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(
-            "Введите промокод:",
-            reply_markup=reply_markup
-        )
-        context.user_data["admin_message_id"] = query.message.message_id
-        return AWAITING_PROMO_CODE
 
-    elif query.data == "upload_promo_file":
-        keyboard = [[InlineKeyboardButton("❌ Отмена", callback_data=ADMIN_MAIN)]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(
-            "Отправьте текстовый файл с промокодами (каждый промокод на новой строке):",
-            reply_markup=reply_markup
-        )
-        context.user_data["admin_message_id"] = query.message.message_id
-        return AWAITING_PROMO_FILE
+async def admin_back_to_main(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await show_admin_menu(update, context, edit=True)
+    return ConversationHandler.END
 
-    elif query.data == "list_promos":
-        promos = await promo_service.get_all_promos()
-        if not promos:
-            keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data=ADMIN_MAIN)]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.edit_message_text("Промокоды не найдены", reply_markup=reply_markup)
-            return ConversationHandler.END
 
-        text = "📋 Список промокодов:\n\n"
-        for promo in promos:
-            status = "✅" if promo["active"] else "❌"
-            text += f"{status} *{promo['code']}*\n"
-            text += f"   📅 Срок: до {promo['expiry_date']}\n"
-            text += f"   🕐 Создан: {promo['created_at']}\n\n"
+async def admin_add_promo(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    keyboard = [[InlineKeyboardButton("❌ Отмена", callback_data=ADMIN_MAIN)]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.edit_message_text(
+        "Введите промокод:",
+        reply_markup=reply_markup
+    )
+    context.user_data["admin_message_id"] = query.message.message_id
+    return AWAITING_PROMO_CODE
 
-        keyboard = [
-            [InlineKeyboardButton("🗑 Удалить промокод", callback_data="delete_promo_menu")],
-            [InlineKeyboardButton("🔙 Назад", callback_data=ADMIN_MAIN)]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
 
-        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
-        return ConversationHandler.END
+async def admin_upload_promo_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    keyboard = [[InlineKeyboardButton("❌ Отмена", callback_data=ADMIN_MAIN)]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.edit_message_text(
+        "Отправьте текстовый файл с промокодами (каждый промокод на новой строке):",
+        reply_markup=reply_markup
+    )
+    context.user_data["admin_message_id"] = query.message.message_id
+    return AWAITING_PROMO_FILE
 
-    elif query.data == "delete_promo_menu":
-        promos = await promo_service.get_all_promos()
-        keyboard = []
-        for promo in promos:
-            keyboard.append([InlineKeyboardButton(
-                f"🗑 {promo['code']}",
-                callback_data=f"delete_{promo['code']}"
-            )])
-        keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="list_promos")])
 
+async def admin_list_promos(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    promos = await promo_service.get_all_promos()
+    if not promos:
+        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data=ADMIN_MAIN)]]
         reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text("Выберите промокод для удаления:", reply_markup=reply_markup)
+        await query.edit_message_text("Промокоды не найдены", reply_markup=reply_markup)
+        return ConversationHandler.END
 
-    elif query.data.startswith("delete_"):
-        code = query.data.replace("delete_", "")
-        keyboard = [[InlineKeyboardButton("🔙 В главное меню", callback_data=ADMIN_MAIN)]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+    text = "📋 Список промокодов:\n\n"
+    for promo in promos:
+        status = "✅" if promo["active"] else "❌"
+        text += f"{status} *{promo['code']}*\n"
+        text += f"   📅 Срок: до {format_expiry(promo['expiry_ts'])}\n"
+        text += f"   🕐 Создан: {format_datetime(promo['created_ts'])}\n\n"
 
-        if await promo_service.delete_promo(code):
-            await query.edit_message_text(f"✅ Промокод *{code}* удален", reply_markup=reply_markup, parse_mode='Markdown')
-        else:
-            await query.edit_message_text("❌ Ошибка удаления", reply_markup=reply_markup)
-        return ConversationHandler.END
+    keyboard = [
+        [InlineKeyboardButton("🗑 Удалить промокод", callback_data="delete_promo_menu")],
+        [InlineKeyboardButton("🔙 Назад", callback_data=ADMIN_MAIN)]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
 
-    elif query.data == "promo_history":
-        usage_history = await db.get_promo_usage_with_users()
+    await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+    return ConversationHandler.END
 
-        if not usage_history:
-            keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data=ADMIN_MAIN)]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.edit_message_text("История выдачи промокодов пуста", reply_markup=reply_markup)
-            return ConversationHandler.END
 
-        text = "📜 *История выдачи промокодов*\n\n"
-        for idx, entry in enumerate(usage_history[:20], 1):
-            username = f"@{entry['username']}" if entry['username'] else "без username"
-            text += (
-                f"{idx}. *{entry['promo_code']}*\n"
-                f"   👤 {entry['first_name']} ({username})\n"
-                f"   🆔 User ID: `{entry['user_id']}`\n"
-                f"   🕐 Выдан: {entry['received_at']}\n"
-                f"   📅 Срок: до {entry['expiry_date']}\n\n"
-            )
+async def admin_delete_promo_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    promos = await promo_service.get_all_promos()
+    keyboard = []
+    for promo in promos:
+        keyboard.append([InlineKeyboardButton(
+            f"🗑 {promo['code']}",
+            callback_data=f"delete_{promo['code']}"
+        )])
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="list_promos")])
 
-        if len(usage_history) > 20:
-            text += f"_Показано 20 из {len(usage_history)} записей_"
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.edit_message_text("Выберите промокод для удаления:", reply_markup=reply_markup)
 
-        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data=ADMIN_MAIN)]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
 
-        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
-        return ConversationHandler.END
+async def admin_delete_promo(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    code = query.data.replace("delete_", "")
+    keyboard = [[InlineKeyboardButton("🔙 В главное меню", callback_data=ADMIN_MAIN)]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    if await promo_service.delete_promo(code):
+        await query.edit_message_text(f"✅ Промокод *{code}* удален", reply_markup=reply_markup, parse_mode='Markdown')
+    else:
+        await query.edit_message_text("❌ Ошибка удаления", reply_markup=reply_markup)
+    return ConversationHandler.END
 
-    elif query.data == "stats":
-        users_count = await db.get_users_count()
-        promos = await promo_service.get_all_promos()
-        active_promos = len([p for p in promos if p["active"]])
-        unused_promos = await db.get_unused_active_promos()
-        usage_history = await db.get_promo_usage_with_users()
-
-        promo_files = await get_promo_files_stats()
-
-        text = (
-            f"📊 *Статистика бота*\n\n"
-            f"👥 Пользователей: *{users_count}*\n"
-            f"🎫 Всего промокодов: *{len(promos)}*\n"
-            f"✅ Активных промокодов: *{active_promos}*\n"
-            f"🆓 Неиспользованных активных: *{len(unused_promos)}*\n"
-            f"📤 Выдано промокодов: *{len(usage_history)}*\n"
-            f"📁 Файлов с промокодами: *{len(promo_files)}*\n"
-        )
 
-        if promo_files:
-            total_codes = sum(stats['count'] for stats in promo_files.values())
-            text += f"📊 Промокодов в файлах: *{total_codes}*"
+async def admin_promo_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    usage_history = await db.get_promo_usage_with_users()
 
+    if not usage_history:
         keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data=ADMIN_MAIN)]]
         reply_markup = InlineKeyboardMarkup(keyboard)
-
-        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+        await query.edit_message_text("История выдачи промокодов пуста", reply_markup=reply_markup)
         return ConversationHandler.END
 
-    elif query.data == "broadcast_menu":
-        keyboard = [[InlineKeyboardButton("❌ Отмена", callback_data=ADMIN_MAIN)]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(
-            "Введите текст сообщения для рассылки:",
-            reply_markup=reply_markup
+    text = "📜 *История выдачи промокодов*\n\n"
+    for idx, entry in enumerate(usage_history[:20], 1):
+        username = f"@{entry['username']}" if entry['username'] else "без username"
+        text += (
+            f"{idx}. *{entry['promo_code']}*\n"
+            f"   👤 {entry['first_name']} ({username})\n"
+            f"   🆔 User ID: `{entry['user_id']}`\n"
+            f"   🕐 Выдан: {format_datetime(entry['received_ts'])}\n"
+            f"   📅 Срок: до {format_expiry(entry['expiry_ts'])}\n\n"
         )
-        context.user_data["admin_message_id"] = query.message.message_id
-        return AWAITING_BROADCAST_TEXT
 
-    elif query.data == "manage_admins":
-        if not is_super_admin(update.effective_user.id):
-            await query.answer("Эта функция доступна только главному администратору.", show_alert=True)
-            return ConversationHandler.END
+    if len(usage_history) > 20:
+        text += f"_Показано 20 из {len(usage_history)} записей_"
+
+    keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data=ADMIN_MAIN)]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+    return ConversationHandler.END
+
+
+async def admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    users_count = await db.get_users_count()
+    promo_stats = await db.get_promo_stats()
+
+    promo_files = await get_promo_files_stats()
+
+    text = (
+        f"📊 *Статистика бота*\n\n"
+        f"👥 Пользователей: *{users_count}*\n"
+        f"🎫 Всего промокодов: *{promo_stats['total']}*\n"
+        f"✅ Активных промокодов: *{promo_stats['active']}*\n"
+        f"🆓 Неиспользованных активных: *{promo_stats['unused']}*\n"
+        f"📤 Выдано промокодов: *{promo_stats['issued']}*\n"
+        f"📁 Файлов с промокодами: *{len(promo_files)}*\n"
+    )
+
+    if promo_files:
+        total_codes = sum(stats['count'] for stats in promo_files.values())
+        text += f"📊 Промокодов в файлах: *{total_codes}*"
+
+    keyboard = [
+        [InlineKeyboardButton("⚙️ Производительность", callback_data="perf")],
+        [InlineKeyboardButton("🔙 Назад", callback_data=ADMIN_MAIN)]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+    return ConversationHandler.END
+
+
+async def admin_submissions(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    text, bookings = await format_submissions()
+
+    keyboard = [
+        [InlineKeyboardButton(f"✅ Закрыть {format_time(booking['created_at'])} · {booking_author(booking)}",
+                              callback_data=f"close_submission_{booking['id']}")]
+        for booking in bookings
+    ]
+    keyboard += [
+        [InlineKeyboardButton("🔄 Обновить", callback_data="submissions")],
+        [InlineKeyboardButton("🔙 Назад", callback_data=ADMIN_MAIN)]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='HTML')
+    return ConversationHandler.END
+
+
+async def admin_close_submission(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    submission_id = int(query.data.replace("close_submission_", ""))
 
-        admins = await db.get_all_admins()
-        text = "👥 *Управление администраторами*\n\n"
+    # Уже закрытая (повторное нажатие) просто пропадет из обновленного списка
+    await db.close_submission(submission_id)
+    return await admin_submissions(update, context)
+
+
+async def admin_drop_mode(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
 
-        if admins:
-            text += "📋 Список администраторов:\n\n"
-            for admin in admins:
-                username = f"@{admin['username']}" if admin['username'] else "без username"
-                text += f"• {admin['first_name']} ({username})\n"
-                text += f"  ID: `{admin['user_id']}`\n"
-                text += f"  Добавлен: {admin['added_at']}\n\n"
+    if query.data == "drop_toggle":
+        if drop_admission.enabled:
+            drop_admission.disable()
         else:
-            text += "Дополнительных администраторов нет\n\n"
+            await drop_admission.enable()
+
+    drop = drop_admission.stats()
+    status = "🟢 включен" if drop["enabled"] else "⚪️ выключен"
+    stock = drop["stock"] if drop["stock"] is not None else "—"
+    text = (
+        f"🚀 *Режим дропа*: {status}\n\n"
+        "Нажатия на «Промокод» проходят через очередь: пользователь видит свой номер, "
+        "а когда промокоды заканчиваются, сразу получает ответ без обращения к БД.\n"
+        "Включайте перед анонсом дропа в канале.\n\n"
+        f"🎫 Осталось промокодов: *{stock}*\n"
+        f"⏳ В очереди: *{drop['queued']}*, обрабатывается: *{drop['in_progress']}*\n"
+        f"✅ Обслужено: *{drop['served']}* из *{drop['admitted']}*\n"
+        f"😔 Ответов «закончились»: *{drop['sold_out']}*, отказов при переполнении: *{drop['rejected']}*"
+    )
 
-        keyboard = [
-            [InlineKeyboardButton("➕ Добавить админа", callback_data="add_admin")],
-        ]
+    keyboard = [
+        [InlineKeyboardButton("⏹ Выключить" if drop["enabled"] else "▶️ Включить", callback_data="drop_toggle")],
+        [InlineKeyboardButton("🔄 Обновить", callback_data="drop_mode")],
+        [InlineKeyboardButton("🔙 Назад", callback_data=ADMIN_MAIN)]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
 
-        if admins:
-            keyboard.append([InlineKeyboardButton("🗑 Удалить админа", callback_data="remove_admin_menu")])
+    await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+    return ConversationHandler.END
 
-        keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data=ADMIN_MAIN)])
 
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
-        return ConversationHandler.END
+async def admin_perf(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    text = format_perf_stats(context.application)
 
-    elif query.data == "add_admin":
-        if not is_super_admin(update.effective_user.id):
-            await query.answer("Эта функция доступна только главному администратору.", show_alert=True)
-            return ConversationHandler.END
+    keyboard = [
+        [InlineKeyboardButton("🔄 Обновить", callback_data="perf")],
+        [InlineKeyboardButton("🔙 Назад", callback_data="stats")]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
 
-        keyboard = [[InlineKeyboardButton("❌ Отмена", callback_data="manage_admins")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(
-            "Введите username пользователя, которого хотите сделать администратором:\n\n"
-            "Пример: `@jemappelleilya` или `jemappelleilya`",
-            reply_markup=reply_markup,
-            parse_mode='Markdown'
-        )
-        context.user_data["admin_message_id"] = query.message.message_id
-        return AWAITING_ADMIN_ID
+    await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='HTML')
+    return ConversationHandler.END
 
-    elif query.data == "remove_admin_menu":
-        if not is_super_admin(update.effective_user.id):
-            await query.answer("Эта функция доступна только главному администратору.", show_alert=True)
-            return ConversationHandler.END
 
-        admins = await db.get_all_admins()
-        if not admins:
-            keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="manage_admins")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.edit_message_text("Нет администраторов для удаления", reply_markup=reply_markup)
-            return ConversationHandler.END
+async def admin_broadcast_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    keyboard = [[InlineKeyboardButton("❌ Отмена", callback_data=ADMIN_MAIN)]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.edit_message_text(
+        "Введите текст сообщения для рассылки:",
+        reply_markup=reply_markup
+    )
+    context.user_data["admin_message_id"] = query.message.message_id
+    return AWAITING_BROADCAST_TEXT
+
 
-        keyboard = []
+async def admin_manage_admins(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    if not is_super_admin(update.effective_user.id):
+        await query.answer("Эта функция доступна только главному администратору.", show_alert=True)
+        return ConversationHandler.END
+
+    admins = await db.get_all_admins()
+    text = "👥 *Управление администраторами*\n\n"
+
+    if admins:
+        text += "📋 Список администраторов:\n\n"
         for admin in admins:
-            username = f"@{admin['username']}" if admin['username'] else admin['first_name']
-            keyboard.append([InlineKeyboardButton(
-                f"🗑 {username} (ID: {admin['user_id']})",
-                callback_data=f"remove_admin_{admin['user_id']}"
-            )])
-        keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="manage_admins")])
+            username = f"@{admin['username']}" if admin['username'] else "без username"
+            text += f"• {admin['first_name']} ({username})\n"
+            text += f"  ID: `{admin['user_id']}`\n"
+            text += f"  Добавлен: {format_datetime(admin['added_ts'])}\n\n"
+    else:
+        text += "Дополнительных администраторов нет\n\n"
 
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text("Выберите администратора для удаления:", reply_markup=reply_markup)
+    keyboard = [
+        [InlineKeyboardButton("➕ Добавить админа", callback_data="add_admin")],
+    ]
+
+    if admins:
+        keyboard.append([InlineKeyboardButton("🗑 Удалить админа", callback_data="remove_admin_menu")])
+
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data=ADMIN_MAIN)])
+
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+    return ConversationHandler.END
+
+
+async def admin_add_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    if not is_super_admin(update.effective_user.id):
+        await query.answer("Эта функция доступна только главному администратору.", show_alert=True)
         return ConversationHandler.END
 
-    elif query.data.startswith("remove_admin_"):
-        if not is_super_admin(update.effective_user.id):
-            await query.answer("Эта функция доступна только главному администратору.", show_alert=True)
-            return ConversationHandler.END
+    keyboard = [[InlineKeyboardButton("❌ Отмена", callback_data="manage_admins")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.edit_message_text(
+        "Введите username пользователя, которого хотите сделать администратором:\n\n"
+        "Пример: `@jemappelleilya` или `jemappelleilya`",
+        reply_markup=reply_markup,
+        parse_mode='Markdown'
+    )
+    context.user_data["admin_message_id"] = query.message.message_id
+    return AWAITING_ADMIN_ID
 
-        admin_id = int(query.data.replace("remove_admin_", ""))
-        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="manage_admins")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
 
-        if await db.remove_admin(admin_id):
-            await query.edit_message_text(f"✅ Администратор (ID: `{admin_id}`) удален", reply_markup=reply_markup, parse_mode='Markdown')
-        else:
-            await query.edit_message_text("❌ Ошибка удаления", reply_markup=reply_markup)
+async def admin_remove_admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    if not is_super_admin(update.effective_user.id):
+        await query.answer("Эта функция доступна только главному администратору.", show_alert=True)
         return ConversationHandler.END
 
-    elif query.data == "cancel":
-        keyboard = [[InlineKeyboardButton("🔙 В главное меню", callback_data=ADMIN_MAIN)]]
+    admins = await db.get_all_admins()
+    if not admins:
+        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="manage_admins")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text("❌ Отменено", reply_markup=reply_markup)
+        await query.edit_message_text("Нет администраторов для удаления", reply_markup=reply_markup)
+        return ConversationHandler.END
+
+    keyboard = []
+    for admin in admins:
+        username = f"@{admin['username']}" if admin['username'] else admin['first_name']
+        keyboard.append([InlineKeyboardButton(
+            f"🗑 {username} (ID: {admin['user_id']})",
+            callback_data=f"remove_admin_{admin['user_id']}"
+        )])
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="manage_admins")])
+
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.edit_message_text("Выберите администратора для удаления:", reply_markup=reply_markup)
+    return ConversationHandler.END
+
+
+async def admin_remove_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    if not is_super_admin(update.effective_user.id):
+        await query.answer("Эта функция доступна только главному администратору.", show_alert=True)
         return ConversationHandler.END
 
+    admin_id = int(query.data.replace("remove_admin_", ""))
+    keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="manage_admins")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    if await db.remove_admin(admin_id):
+        await query.edit_message_text(f"✅ Администратор (ID: `{admin_id}`) удален", reply_markup=reply_markup, parse_mode='Markdown')
+    else:
+        await query.edit_message_text("❌ Ошибка удаления", reply_markup=reply_markup)
+    return ConversationHandler.END
+
+
+async def admin_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    keyboard = [[InlineKeyboardButton("🔙 В главное меню", callback_data=ADMIN_MAIN)]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.edit_message_text("❌ Отменено", reply_markup=reply_markup)
+    return ConversationHandler.END
+
 
 async def receive_promo_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message_id = context.user_data.get("admin_message_id")
@@ -461,6 +597,125 @@ async def get_promo_files_stats():
     return stats
 
 
+def format_perf_stats(application) -> str:
+    """Текст экрана производительности: обработка обновлений, память, запросы к Bot API"""
+    governor = telegram_api.governor.stats()
+    updates = update_processor.stats()
+    activity = user_activity.stats(application)
+    stored = persistence.stats()
+    registry = user_registry.stats()
+    flood = flood_control.stats()
+    notifications = notification_queue.stats()
+    submissions = submission_store.stats()
+    expiry = promo_expiry.stats()
+    next_expiry = (
+        format_datetime(expiry["next_expiry"]) if expiry["next_expiry"] else "—"
+    )
+    text = (
+        "⚙️ <b>Производительность</b>\n\n"
+        "<b>Обработка обновлений</b>\n"
+        f"⚡ В работе: {updates['active']} из {updates['max_running']}\n"
+        f"👤 Пользователей с обновлениями в очереди: {updates['users']}\n"
+        f"🛡 Антифлуд: пропущено {flood['passed']}, повторных нажатий {flood['duplicates']}, "
+        f"ограничено {flood['throttled']}\n\n"
+        "<b>Данные пользователей в памяти</b>\n"
+        f"🧠 user_data: {activity['resident_users']}, chat_data: {activity['resident_chats']}\n"
+        f"📤 Выгружено по неактивности: {activity['evicted_total']} (последний проход: {activity['last_evicted']})\n"
+        f"📥 Загружено из БД по обращению: {stored['restored']}\n"
+        f"💾 Ожидают записи: {stored['pending_writes']}\n"
+        f"👥 Реестр пользователей: {registry['known']}, новых {registry['new_users']}, "
+        f"обновлений профиля {registry['profile_updates']}, ожидают записи {registry['pending_writes']}\n\n"
+        "<b>Очередь отправки</b>\n"
+        f"📥 В очереди: {governor['queued']} (рассылка: {governor['queued_bulk']})\n"
+        f"⏱ Ожидали лимита: {governor['waited']}, в среднем {governor['avg_wait']:.2f}с\n"
+        f"💬 Чатов под лимитом: {governor['chats']}\n"
+        f"📬 Уведомления в канал: в очереди {notifications['pending']}, отправлено {notifications['sent']} "
+        f"(сводок {notifications['digests']}), ошибок {notifications['failures']}, отклонено {notifications['dropped']}\n"
+        f"📥 Заявки: принято {submissions['accepted']}, повторных {submissions['duplicates']}, "
+        f"ожидают записи {submissions['pending_writes']}\n"
+        f"⌛️ Истечение промокодов: ближайшее {next_expiry}, сроков в плане {expiry['pending_expiries']}, "
+        f"деактивировано {expiry['deactivated_total']}\n\n"
+    )
+    text += format_route_stats()
+    text += "<b>Запросы к Bot API</b>\n"
+
+    api_stats = telegram_api.stats()
+    if not api_stats:
+        return text + "Запросов пока не было"
+
+    for endpoint, counters in api_stats.items():
+        circuit = "" if counters["circuit"] == "closed" else f" ⚠️ {counters['circuit']}"
+        text += (
+            f"\n<code>{endpoint}</code>{circuit}\n"
+            f"   ✅ {counters.get('ok', 0)}/{counters.get('requests', 0)}"
+            f" · 🔁 {counters.get('retries', 0)}"
+            f" · ⏳ {counters.get('retry_after', 0)}"
+            f" · 🌐 {counters.get('network_errors', 0)}"
+            f" · 🚫 {counters.get('rejected', 0)}\n"
+        )
+
+    text += "\n<i>✅ успешно/всего · 🔁 повторы · ⏳ flood wait · 🌐 ошибки сети · 🚫 отклонено предохранителем</i>"
+    return text
+
+
+def booking_author(booking: dict) -> str:
+    return str(f"@{booking['username']}" if booking['username'] else (booking['first_name'] or booking['user_id']))
+
+
+async def format_submissions() -> Tuple[str, List[dict]]:
+    """Текст экрана заявок (счетчики за сегодня, розыгрыши, последние открытые брони)
+    и сами открытые брони - для кнопок закрытия"""
+    today = int(datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+    counts = await db.get_submission_counts(today)
+    bookings = await db.get_open_submissions(SUBMISSION_BOOKING, today, SUBMISSIONS_SHOWN)
+    campaigns = await db.get_campaign_stats()
+
+    text = (
+        "📥 <b>Заявки за сегодня</b>\n\n"
+        f"💻 Брони: {counts.get(SUBMISSION_BOOKING, 0)}\n"
+        f"📝 Отзывы: {counts.get(SUBMISSION_FEEDBACK, 0)}\n"
+        f"🎯 Участие в розыгрыше: {counts.get(SUBMISSION_WINTER_DROP, 0)}\n"
+    )
+
+    if campaigns:
+        text += "\n<b>Розыгрыши (за все время)</b>\n"
+        for campaign, entries, participants in campaigns:
+            text += f"<code>{escape(campaign)}</code>: заявок {entries}, участников {participants}\n"
+
+    if bookings:
+        text += "\n<b>Открытые брони за сегодня</b>\n"
+        for booking in bookings:
+            summary = booking['text'] if len(booking['text']) <= 80 else booking['text'][:80] + "…"
+            text += (
+                f"\n🕐 {format_time(booking['created_at'])} · {escape(booking_author(booking))}\n"
+                f"<code>{escape(summary)}</code>\n"
+            )
+
+    return text, bookings
+
+
+def format_route_stats(limit: int = PERF_TOP_ROUTES) -> str:
+    """Самые медленные по p95 экраны (маршруты callback) - для экрана производительности"""
+    route_stats = [
+        (f"{router.name}:{route}", stats)
+        for router in routers
+        for route, stats in router.stats().items()
+    ]
+    if not route_stats:
+        return ""
+
+    route_stats.sort(key=lambda item: (item[1].percentile(0.95), item[1].max_ms), reverse=True)
+    text = "<b>Экраны (p95)</b>\n"
+    for route, stats in route_stats[:limit]:
+        errors = f" · ❌ {stats.errors}" if stats.errors else ""
+        text += (
+            f"<code>{escape(route)}</code> {stats.calls}× · "
+            f"ср. {stats.total_ms / stats.calls:.0f} · p95 ≤{stats.percentile(0.95):.0f} · "
+            f"макс. {stats.max_ms:.0f} мс{errors}\n"
+        )
+    return text + "\n"
+
+
 async def receive_promo_code(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка ввода промокода"""
     code = update.message.text.strip()
@@ -699,6 +954,26 @@ async def show_broadcast_confirmation(update: Update, context: ContextTypes.DEFA
     return AWAITING_BROADCAST_CONFIRM
 
 
+async def run_broadcast(bot, chat_id: int, message_id: int, text: str, photo_file_id: Optional[str]):
+    """Отправить рассылку и показать итог в сообщении панели"""
+    from bot.services.broadcast import broadcast_service
+    result = await broadcast_service.send_broadcast(bot, text, photo_file_id)
+
+    keyboard = [[InlineKeyboardButton("🔙 В главное меню", callback_data=ADMIN_MAIN)]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    try:
+        await bot.edit_message_text(
+            chat_id=chat_id,
+            message_id=message_id,
+            text=f"✅ *Рассылка завершена*\n\n📤 Отправлено: *{result['sent']}*\n❌ Ошибок: *{result['failed']}*",
+            reply_markup=reply_markup,
+            parse_mode='Markdown'
+        )
+    except Exception:
+        pass
+
+
 async def confirm_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Подтверждение и отправка рассылки"""
     query = update.callback_query
@@ -711,23 +986,12 @@ async def confirm_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         if broadcast_text:
             await query.edit_message_text("📤 Рассылка запущена. Пожалуйста, подождите...")
-
-            from bot.services.broadcast import broadcast_service
-            result = await broadcast_service.send_broadcast(context.bot, broadcast_text, photo_file_id)
-
-            keyboard = [[InlineKeyboardButton("🔙 В главное меню", callback_data=ADMIN_MAIN)]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
-            try:
-                await context.bot.edit_message_text(
-                    chat_id=update.effective_chat.id,
-                    message_id=message_id,
-                    text=f"✅ *Рассылка завершена*\n\n📤 Отправлено: *{result['sent']}*\n❌ Ошибок: *{result['failed']}*",
-                    reply_markup=reply_markup,
-                    parse_mode='Markdown'
-                )
-            except Exception:
-                pass
+            # Рассылка идет в фоне: обработка апдейта (и очередь апдейтов админа) не ждет ее окончания;
+            # задачу дожидается остановка приложения
+            context.application.create_task(
+                run_broadcast(context.bot, update.effective_chat.id, message_id, broadcast_text, photo_file_id),
+                update=update
+            )
 
         context.user_data.clear()
         return ConversationHandler.END
@@ -919,7 +1183,7 @@ async def receive_file_expiry_time(update: Update, context: ContextTypes.DEFAULT
         date_obj = context.user_data.get("expiry_date_obj")
 
         expiry_datetime = date_obj.replace(hour=time_obj.hour, minute=time_obj.minute, second=0, microsecond=0)
-        expiry_date_str = expiry_datetime.strftime("%Y-%m-%d")
+        expiry_ts = int(expiry_datetime.timestamp())
 
         promo_codes = context.user_data.get("promo_codes", [])
         invalid_count = context.user_data.get("invalid_codes_count", 0)
@@ -929,7 +1193,7 @@ async def receive_file_expiry_time(update: Update, context: ContextTypes.DEFAULT
         skipped_count = 0
 
         for code in promo_codes:
-            if await promo_service.create_promo_with_date(code, expiry_date_str):
+            if await promo_service.create_promo_until(code, expiry_ts):
                 added_count += 1
             else:
                 skipped_count += 1
@@ -950,7 +1214,7 @@ async def receive_file_expiry_time(update: Update, context: ContextTypes.DEFAULT
         if invalid_count > 0:
             result_text += f"⚠️ Пропущено (слишком длинные): `{invalid_count}`\n"
 
-        result_text += f"\n📅 Срок действия: до `{expiry_datetime.strftime('%d.%m.%y %H:%M')}`"
+        result_text += f"\n📅 Срок действия: до `{format_expiry(expiry_ts)}`"
 
         try:
             await context.bot.edit_message_text(
@@ -964,7 +1228,7 @@ async def receive_file_expiry_time(update: Update, context: ContextTypes.DEFAULT
             logger.debug(f"Не удалось отредактировать сообщение: {e}")
 
         context.user_data.clear()
-        logger.info(f"Добавлено {added_count} промокодов из файла {file_name} со сроком до {expiry_date_str}")
+        logger.info(f"Добавлено {added_count} промокодов из файла {file_name} со сроком до {format_expiry(expiry_ts)}")
         return ConversationHandler.END
 
     except ValueError:
@@ -1005,3 +1269,25 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     context.user_data.clear()
     return ConversationHandler.END
+
+
+admin_router = create_router("admin")
+admin_router.exact(ADMIN_MAIN, admin_back_to_main)
+admin_router.exact("add_promo", admin_add_promo)
+admin_router.exact("upload_promo_file", admin_upload_promo_file)
+admin_router.exact("list_promos", admin_list_promos)
+admin_router.exact("delete_promo_menu", admin_delete_promo_menu)
+admin_router.prefix("delete_", admin_delete_promo)
+admin_router.exact("promo_history", admin_promo_history)
+admin_router.exact("stats", admin_stats)
+admin_router.exact("perf", admin_perf)
+admin_router.exact("submissions", admin_submissions)
+admin_router.prefix("close_submission_", admin_close_submission)
+admin_router.exact("drop_mode", admin_drop_mode)
+admin_router.exact("drop_toggle", admin_drop_mode)
+admin_router.exact("broadcast_menu", admin_broadcast_menu)
+admin_router.exact("manage_admins", admin_manage_admins)
+admin_router.exact("add_admin", admin_add_admin)
+admin_router.exact("remove_admin_menu", admin_remove_admin_menu)
+admin_router.prefix("remove_admin_", admin_remove_admin)
+admin_router.exact("cancel", admin_cancel)
\ No newline at end of file
@@ -1,37 +1,49 @@
-from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton, InputFile
+from telegram import Update, Message, InlineKeyboardMarkup, InputFile, InputMediaPhoto
 from telegram.ext import ContextTypes
 from telegram.error import BadRequest, TimedOut, NetworkError
-import os
 import logging
-import asyncio
-
-from bot.config import CHANNEL_USERNAME, ADMIN_ID, ADMIN_USERNAME, NOTIFICATION_CHAT_ID, MENU_PHOTOS
-from bot.constants import (
-    MENU_MAIN,
-    NOT_SUBSCRIBED_MESSAGE,
-    PROMO_RECEIVED_MESSAGE,
-    PROMO_ALREADY_RECEIVED_MESSAGE,
-    NO_ACTIVE_PROMO_MESSAGE,
-    HELP_USER_MESSAGE,
-    HELP_ADMIN_MESSAGE,
-    BOOK_PC_MESSAGE,
-    FEEDBACK_MESSAGE,
-    PROMOTIONS_MESSAGE,
-    TARIFFS_MESSAGE
-)
+
+from bot.config import ADMIN_ID, ADMIN_USERNAME, WINTER_DROP_CAMPAIGN
+from bot.constants import NO_ACTIVE_PROMO_MESSAGE, DUPLICATE_SUBMISSION_MESSAGE
 from bot.services.database import db
 from bot.services.subscription import check_subscription
 from bot.services.promo import promo_service
 from bot.services.photo_cache import photo_cache
+from bot.services.media_registry import media_registry, MenuPhoto
+from bot.services.telegram_api import CircuitOpenError
+from bot.services.drop_admission import drop_admission
+from bot.services.user_registry import user_registry
+from bot.services.submissions import (
+    submission_store,
+    SUBMISSION_BOOKING,
+    SUBMISSION_FEEDBACK,
+    SUBMISSION_WINTER_DROP
+)
 from bot.middleware.message_cleanup import message_cleanup
+from bot.utils.timefmt import format_expiry
+from bot.handlers.router import create_router
+from bot.handlers.screens import (
+    screens,
+    Screen,
+    ADMIN_VARIANT,
+    MAIN,
+    PROMO,
+    HELP,
+    BOOK_PC,
+    FEEDBACK,
+    PROMOTIONS,
+    TARIFFS
+)
 
 logger = logging.getLogger(__name__)
 
-MAIN, PROMO, HELP, BOOK_PC, FEEDBACK, PROMOTIONS, TARIFFS = range(7)
 
-# Константы для обработки таймаутов
-MAX_RETRY_ATTEMPTS = 3
-RETRY_DELAY_SECONDS = 1.0
+async def remember_relay(sent: Message, user_id: int):
+    """Запомнить автора пересланного сообщения, чтобы ответ на него дошел до пользователя"""
+    try:
+        await db.save_relay_message(sent.chat_id, sent.message_id, user_id)
+    except Exception as e:
+        logger.warning(f"Не удалось сохранить связь сообщения {sent.message_id} с пользователем {user_id}: {e}")
 
 
 def escape_html(text: str) -> str:
@@ -44,94 +56,176 @@ def escape_html(text: str) -> str:
         .replace('>', '&gt;'))
 
 
-async def send_text_message(
+async def upload_menu_photo(
     update: Update,
-    context: ContextTypes.DEFAULT_TYPE,
+    photo: MenuPhoto,
     text: str,
     reply_markup: InlineKeyboardMarkup,
-    edit: bool = False,
-    photo_key: str = None
+    parse_mode: str = None,
+    stale_file_id: str = None
 ):
-    if photo_key:
-        photo_path = MENU_PHOTOS.get(photo_key)
-        if photo_path and os.path.exists(photo_path):
-            is_valid, _ = photo_cache.validate_photo(photo_path)
-            if is_valid:
-                try:
-                    cached_file_id = photo_cache.get_file_id(photo_key, photo_path)
-                    response = None
-
-                    if cached_file_id:
-                        # Попытка отправки с retry логикой
-                        for attempt in range(MAX_RETRY_ATTEMPTS):
-                            try:
-                                response = await update.effective_chat.send_photo(
-                                    photo=cached_file_id,
-                                    caption=text,
-                                    reply_markup=reply_markup
-                                )
-                                break
-                            except (TimedOut, NetworkError) as e:
-                                if attempt < MAX_RETRY_ATTEMPTS - 1:
-                                    logger.warning(f"Таймаут при отправке фото (попытка {attempt + 1}/{MAX_RETRY_ATTEMPTS}): {e}")
-                                    await asyncio.sleep(RETRY_DELAY_SECONDS * (attempt + 1))
-                                else:
-                                    raise
-                    else:
-                        with open(photo_path, 'rb') as photo_file:
-                            for attempt in range(MAX_RETRY_ATTEMPTS):
-                                try:
-                                    response = await update.effective_chat.send_photo(
-                                        photo=InputFile(photo_file),
-                                        caption=text,
-                                        reply_markup=reply_markup
-                                    )
-                                    if response.photo:
-                                        new_file_id = response.photo[-1].file_id
-                                        photo_cache.save_file_id(photo_key, photo_path, new_file_id)
-                                    break
-                                except (TimedOut, NetworkError) as e:
-                                    if attempt < MAX_RETRY_ATTEMPTS - 1:
-                                        logger.warning(f"Таймаут при отправке фото через файл (попытка {attempt + 1}/{MAX_RETRY_ATTEMPTS}): {e}")
-                                        await asyncio.sleep(RETRY_DELAY_SECONDS * (attempt + 1))
-                                        photo_file.seek(0)
-                                    else:
-                                        raise
-
-                    if response:
-                        await message_cleanup.track_bot_message(
-                            update.effective_chat.id,
-                            response.message_id,
-                            context
-                        )
-                        return response
-                except (TimedOut, NetworkError) as e:
-                    logger.warning(f"Ошибка сети при отправке фото для {photo_key}: {e}")
-                except Exception as e:
-                    logger.warning(f"Ошибка отправки фото для {photo_key}: {e}")
-
-    # Отправка текстового сообщения с retry логикой
-    for attempt in range(MAX_RETRY_ATTEMPTS):
-        try:
-            response = await update.effective_chat.send_message(
+    """Отправка фото меню загрузкой файла. Параллельные запросы ждут первую загрузку
+    и переиспользуют полученный file_id вместо повторной загрузки того же файла."""
+    async with photo_cache.upload_lock(photo.key):
+        fresh_file_id = photo_cache.get_file_id(photo)
+        if fresh_file_id and fresh_file_id != stale_file_id:
+            return await update.effective_chat.send_photo(
+                photo=fresh_file_id,
+                caption=text,
+                reply_markup=reply_markup,
+                parse_mode=parse_mode
+            )
+
+        # Повторы при сетевых ошибках выполняет слой запросов к API (bot/services/telegram_api.py)
+        with open(photo.upload_path, 'rb') as photo_file:
+            response = await update.effective_chat.send_photo(
+                photo=InputFile(photo_file),
+                caption=text,
+                reply_markup=reply_markup,
+                parse_mode=parse_mode
+            )
+
+        if response.photo:
+            photo_cache.save_file_id(photo, response.photo[-1].file_id)
+            logger.info(f"Отправлено и кешировано фото {photo.key}")
+        return response
+
+
+async def edit_menu_message(
+    update: Update,
+    text: str,
+    reply_markup: InlineKeyboardMarkup,
+    parse_mode: str = None,
+    photo: MenuPhoto = None
+):
+    """Редактирование текущего сообщения меню вместо отправки нового.
+    Возвращает None, если сообщение нельзя привести к нужному типу (текст <-> фото)."""
+    query = update.callback_query
+    if not query or not query.message:
+        return None
+
+    message = query.message
+
+    try:
+        if not photo:
+            if message.photo or not message.text:
+                return None
+            return await query.edit_message_text(
                 text=text,
+                reply_markup=reply_markup,
+                parse_mode=parse_mode
+            )
+
+        if not message.photo:
+            return None
+
+        cached_file_id = photo_cache.get_file_id(photo)
+        if cached_file_id:
+            return await query.edit_message_media(
+                media=InputMediaPhoto(cached_file_id, caption=text, parse_mode=parse_mode),
                 reply_markup=reply_markup
             )
-            break
-        except (TimedOut, NetworkError) as e:
-            if attempt < MAX_RETRY_ATTEMPTS - 1:
-                logger.warning(f"Таймаут при отправке текстового сообщения (попытка {attempt + 1}/{MAX_RETRY_ATTEMPTS}): {e}")
-                await asyncio.sleep(RETRY_DELAY_SECONDS * (attempt + 1))
+
+        async with photo_cache.upload_lock(photo.key):
+            cached_file_id = photo_cache.get_file_id(photo)
+            if cached_file_id:
+                media = InputMediaPhoto(cached_file_id, caption=text, parse_mode=parse_mode)
             else:
-                logger.error(f"Не удалось отправить текстовое сообщение после {MAX_RETRY_ATTEMPTS} попыток: {e}")
-                raise
+                with open(photo.upload_path, 'rb') as photo_file:
+                    media = InputMediaPhoto(photo_file, caption=text, parse_mode=parse_mode)
 
-    await message_cleanup.track_bot_message(
-        update.effective_chat.id,
-        response.message_id,
-        context
+            response = await query.edit_message_media(media=media, reply_markup=reply_markup)
+            if not cached_file_id and isinstance(response, Message) and response.photo:
+                photo_cache.save_file_id(photo, response.photo[-1].file_id)
+                logger.info(f"Загружено при редактировании и кешировано фото {photo.key}")
+            return response
+
+    except BadRequest as e:
+        if "message is not modified" in str(e).lower():
+            return message
+        logger.debug(f"Не удалось отредактировать сообщение меню: {e}")
+        return None
+
+
+async def _track(update: Update, context: ContextTypes.DEFAULT_TYPE, message: Message) -> Message:
+    await message_cleanup.track_bot_message(update.effective_chat.id, message.message_id, context)
+    return message
+
+
+async def _edit_or_send_text(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    text: str,
+    reply_markup: InlineKeyboardMarkup,
+    edit: bool,
+    parse_mode: str = None
+):
+    """Текстовое меню: редактирование текущего сообщения, иначе новое сообщение"""
+    if edit:
+        edited = await edit_menu_message(update, text, reply_markup, parse_mode=parse_mode)
+        if edited:
+            return await _track(update, context, edited)
+
+    response = await update.effective_chat.send_message(
+        text=text,
+        reply_markup=reply_markup,
+        parse_mode=parse_mode
     )
-    return response
+    return await _track(update, context, response)
+
+
+async def _edit_or_send_photo(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    photo: MenuPhoto,
+    text: str,
+    reply_markup: InlineKeyboardMarkup,
+    edit: bool,
+    parse_mode: str = None
+):
+    """Меню с фото: редактирование текущего сообщения, иначе отправка по file_id или загрузкой файла"""
+    if edit:
+        edited = await edit_menu_message(update, text, reply_markup, parse_mode=parse_mode, photo=photo)
+        if edited:
+            return await _track(update, context, edited)
+
+    cached_file_id = photo_cache.get_file_id(photo)
+    response = None
+
+    if cached_file_id:
+        try:
+            response = await update.effective_chat.send_photo(
+                photo=cached_file_id,
+                caption=text,
+                reply_markup=reply_markup,
+                parse_mode=parse_mode
+            )
+            logger.debug(f"Отправлено фото {photo.key} через кешированный file_id")
+        except BadRequest as cache_error:
+            logger.warning(f"Ошибка использования кешированного file_id для {photo.key}: {cache_error}")
+
+    # Нет file_id или он не сработал - загружаем файл (одна загрузка на ключ)
+    if response is None:
+        response = await upload_menu_photo(
+            update, photo, text, reply_markup,
+            parse_mode=parse_mode,
+            stale_file_id=cached_file_id
+        )
+
+    return await _track(update, context, response)
+
+
+async def send_text_message(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    text: str,
+    reply_markup: InlineKeyboardMarkup,
+    edit: bool = False,
+    photo_key: str = None
+):
+    if photo_key:
+        return await send_menu_with_photo(update, context, photo_key, text, reply_markup, edit=edit)
+    return await _edit_or_send_text(update, context, text, reply_markup, edit)
 
 
 async def send_menu_with_photo(
@@ -143,138 +237,18 @@ async def send_menu_with_photo(
     edit: bool = False,
     parse_mode: str = None
 ):
-    photo_path = MENU_PHOTOS.get(photo_key)
+    photo = media_registry.get(photo_key)
 
-    async def send_text_fallback():
-        """Отправка текстового сообщения с retry логикой при таймаутах"""
-        last_error = None
-        for attempt in range(MAX_RETRY_ATTEMPTS):
-            try:
-                response = await update.effective_chat.send_message(
-                    text=text,
-                    reply_markup=reply_markup,
-                    parse_mode=parse_mode
-                )
-                await message_cleanup.track_bot_message(
-                    update.effective_chat.id,
-                    response.message_id,
-                    context
-                )
-                return response
-            except (TimedOut, NetworkError) as e:
-                last_error = e
-                if attempt < MAX_RETRY_ATTEMPTS - 1:
-                    logger.warning(f"Таймаут при отправке сообщения (попытка {attempt + 1}/{MAX_RETRY_ATTEMPTS}): {e}")
-                    await asyncio.sleep(RETRY_DELAY_SECONDS * (attempt + 1))
-                else:
-                    logger.error(f"Не удалось отправить сообщение после {MAX_RETRY_ATTEMPTS} попыток: {e}")
-                    raise
-        
-        if last_error:
-            raise last_error
-
-    if not photo_path or not os.path.exists(photo_path):
+    if not photo:
         logger.debug(f"Фото для {photo_key} не найдено, отправка текстового меню")
-        return await send_text_fallback()
+        return await _edit_or_send_text(update, context, text, reply_markup, edit, parse_mode)
 
-    is_valid, error_msg = photo_cache.validate_photo(photo_path)
-    if not is_valid:
-        logger.warning(f"Фото {photo_key} не прошло валидацию: {error_msg}")
-        return await send_text_fallback()
+    if not photo.is_valid:
+        logger.debug(f"Фото {photo_key} не прошло валидацию: {photo.error}")
+        return await _edit_or_send_text(update, context, text, reply_markup, edit, parse_mode)
 
     try:
-        cached_file_id = photo_cache.get_file_id(photo_key, photo_path)
-
-        if cached_file_id:
-            # Попытка отправки с кешированным file_id с retry логикой
-            success = False
-            for attempt in range(MAX_RETRY_ATTEMPTS):
-                try:
-                    response = await update.effective_chat.send_photo(
-                        photo=cached_file_id,
-                        caption=text,
-                        reply_markup=reply_markup,
-                        parse_mode=parse_mode
-                    )
-                    logger.debug(f"Отправлено фото {photo_key} через кешированный file_id")
-                    success = True
-                    break
-                except (TimedOut, NetworkError) as e:
-                    if attempt < MAX_RETRY_ATTEMPTS - 1:
-                        logger.warning(f"Таймаут при отправке фото с file_id (попытка {attempt + 1}/{MAX_RETRY_ATTEMPTS}): {e}")
-                        await asyncio.sleep(RETRY_DELAY_SECONDS * (attempt + 1))
-                    else:
-                        logger.warning(f"Не удалось отправить фото с file_id после {MAX_RETRY_ATTEMPTS} попыток, пробуем через файл")
-                        break
-                except Exception as cache_error:
-                    logger.warning(f"Ошибка использования кешированного file_id для {photo_key}: {cache_error}")
-                    break
-            
-            # Если не удалось отправить с file_id, пробуем через файл
-            if not success:
-                try:
-                    with open(photo_path, 'rb') as photo_file:
-                        for attempt in range(MAX_RETRY_ATTEMPTS):
-                            try:
-                                response = await update.effective_chat.send_photo(
-                                    photo=InputFile(photo_file),
-                                    caption=text,
-                                    reply_markup=reply_markup,
-                                    parse_mode=parse_mode
-                                )
-                                if response.photo:
-                                    new_file_id = response.photo[-1].file_id
-                                    photo_cache.save_file_id(photo_key, photo_path, new_file_id)
-                                success = True
-                                break
-                            except (TimedOut, NetworkError) as e:
-                                if attempt < MAX_RETRY_ATTEMPTS - 1:
-                                    logger.warning(f"Таймаут при отправке фото через файл (попытка {attempt + 1}/{MAX_RETRY_ATTEMPTS}): {e}")
-                                    await asyncio.sleep(RETRY_DELAY_SECONDS * (attempt + 1))
-                                    photo_file.seek(0)
-                                else:
-                                    logger.error(f"Не удалось отправить фото через файл после {MAX_RETRY_ATTEMPTS} попыток")
-                                    return await send_text_fallback()
-                except Exception as e:
-                    logger.error(f"Ошибка при отправке фото через файл: {e}")
-                    return await send_text_fallback()
-        else:
-            # Отправка фото без кеша с retry логикой
-            success = False
-            with open(photo_path, 'rb') as photo_file:
-                for attempt in range(MAX_RETRY_ATTEMPTS):
-                    try:
-                        response = await update.effective_chat.send_photo(
-                            photo=InputFile(photo_file),
-                            caption=text,
-                            reply_markup=reply_markup,
-                            parse_mode=parse_mode
-                        )
-
-                        if response.photo:
-                            new_file_id = response.photo[-1].file_id
-                            photo_cache.save_file_id(photo_key, photo_path, new_file_id)
-                            logger.info(f"Отправлено и кешировано фото {photo_key}")
-                        success = True
-                        break
-                    except (TimedOut, NetworkError) as e:
-                        if attempt < MAX_RETRY_ATTEMPTS - 1:
-                            logger.warning(f"Таймаут при отправке фото (попытка {attempt + 1}/{MAX_RETRY_ATTEMPTS}): {e}")
-                            await asyncio.sleep(RETRY_DELAY_SECONDS * (attempt + 1))
-                            photo_file.seek(0)
-                        else:
-                            logger.error(f"Не удалось отправить фото после {MAX_RETRY_ATTEMPTS} попыток: {e}")
-                            return await send_text_fallback()
-
-        if success:
-            await message_cleanup.track_bot_message(
-                update.effective_chat.id,
-                response.message_id,
-                context
-            )
-            return response
-        else:
-            return await send_text_fallback()
+        return await _edit_or_send_photo(update, context, photo, text, reply_markup, edit, parse_mode)
 
     except BadRequest as e:
         error_message = str(e).lower()
@@ -282,76 +256,53 @@ async def send_menu_with_photo(
             logger.warning(f"Telegram не смог обработать изображение {photo_key}, отправка текстового меню")
         else:
             logger.error(f"Ошибка BadRequest при отправке меню с фото {photo_key}: {e}")
-        return await send_text_fallback()
+
+    except CircuitOpenError as e:
+        # API деградировал - не ждем загрузку фото, сразу отвечаем текстом
+        logger.warning(f"Отправка фото {photo_key} временно отключена: {e}")
 
     except (TimedOut, NetworkError) as e:
         logger.error(f"Ошибка сети/таймаут при отправке меню с фото {photo_key}: {e}")
-        return await send_text_fallback()
 
     except Exception as e:
         logger.error(f"Неожиданная ошибка при отправке меню с фото {photo_key}: {e}")
-        return await send_text_fallback()
+
+    return await _edit_or_send_text(update, context, text, reply_markup, edit, parse_mode)
+
+
+async def show_screen(update: Update, context: ContextTypes.DEFAULT_TYPE, screen: Screen, edit: bool = False):
+    """Показать готовый экран из реестра (bot/handlers/screens.py)"""
+    await send_menu_with_photo(
+        update, context, screen.photo_key, screen.text, screen.reply_markup,
+        edit=edit,
+        parse_mode=screen.parse_mode
+    )
+
+
+def help_variant(user_id: int):
+    return ADMIN_VARIANT if user_id == ADMIN_ID else None
 
 
 async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, edit: bool = False):
-    keyboard = [
-        [
-            InlineKeyboardButton("🎁 Промокод", callback_data=str(PROMO)),
-            InlineKeyboardButton("💻 Бронь", callback_data=str(BOOK_PC))
-        ],
-        [
-            InlineKeyboardButton("💰 Акции", callback_data=str(PROMOTIONS)),
-            InlineKeyboardButton("📊 Тарифы", callback_data=str(TARIFFS))
-        ],
-        [
-            InlineKeyboardButton("📝 Отзыв", callback_data=str(FEEDBACK)),
-            InlineKeyboardButton("❓ Помощь", callback_data=str(HELP))
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await send_menu_with_photo(update, context, "main", MENU_MAIN, reply_markup, edit=edit)
+    await show_screen(update, context, screens.get("main"), edit=edit)
 
 
 async def menu_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
 
-    await db.add_user(
-        user_id=user.id,
-        first_name=user.first_name,
-        username=user.username
-    )
+    # Запись в БД - фоном, пачкой (bot/services/user_registry.py)
+    user_registry.register(user.id, user.first_name, user.username)
 
     await message_cleanup.cleanup_user_command(update, context)
 
-    keyboard = [
-        [
-            InlineKeyboardButton("🎁 Промокод", callback_data=str(PROMO)),
-            InlineKeyboardButton("💻 Бронь", callback_data=str(BOOK_PC))
-        ],
-        [
-            InlineKeyboardButton("💰 Акции", callback_data=str(PROMOTIONS)),
-            InlineKeyboardButton("📊 Тарифы", callback_data=str(TARIFFS))
-        ],
-        [
-            InlineKeyboardButton("📝 Отзыв", callback_data=str(FEEDBACK)),
-            InlineKeyboardButton("❓ Помощь", callback_data=str(HELP))
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await send_menu_with_photo(update, context, "main", MENU_MAIN, reply_markup)
+    await show_screen(update, context, screens.get("main"))
 
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.effective_user.id
     await message_cleanup.cleanup_user_command(update, context)
 
-    if user_id == ADMIN_ID:
-        text = HELP_ADMIN_MESSAGE
-    else:
-        text = HELP_USER_MESSAGE
-
-    response = await update.effective_chat.send_message(text)
+    screen = screens.get("help", help_variant(update.effective_user.id))
+    response = await update.effective_chat.send_message(screen.text)
 
     await message_cleanup.track_bot_message(
         update.effective_chat.id,
@@ -364,53 +315,38 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
-    data = query.data
-
-    if data == str(MAIN):
-        # Сбрасываем все режимы ввода при возврате в главное меню
-        context.user_data.pop('booking_mode', None)
-        context.user_data.pop('feedback_mode', None)
-        context.user_data.pop('winter_drop_mode', None)
-        await show_main_menu(update, context, edit=True)
-
-    elif data == str(PROMO):
-        await handle_promo(update, context)
+    await menu_router.dispatch(update, context)
 
-    elif data == str(HELP):
-        await handle_help(update, context)
 
-    elif data == str(BOOK_PC):
-        await handle_book_pc(update, context)
+async def handle_back_to_main(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Сбрасываем все режимы ввода при возврате в главное меню
+    context.user_data.pop('booking_mode', None)
+    context.user_data.pop('feedback_mode', None)
+    context.user_data.pop('winter_drop_mode', None)
+    await show_main_menu(update, context, edit=True)
 
-    elif data == str(FEEDBACK):
-        # Сбрасываем режим отзыва при возврате в раздел отзывов
-        context.user_data.pop('feedback_mode', None)
-        await handle_feedback(update, context)
 
-    elif data == str(PROMOTIONS):
-        # Сбрасываем режим WINTER DROP при возврате в раздел акций
-        context.user_data.pop('winter_drop_mode', None)
-        await handle_promotions(update, context)
+async def handle_feedback_section(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Сбрасываем режим отзыва при возврате в раздел отзывов
+    context.user_data.pop('feedback_mode', None)
+    await handle_feedback(update, context)
 
-    elif data == str(TARIFFS):
-        await handle_tariffs(update, context)
 
-    elif data == "subscribe_check":
-        await handle_subscribe_check(update, context)
+async def handle_promotions_section(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Сбрасываем режим WINTER DROP при возврате в раздел акций
+    context.user_data.pop('winter_drop_mode', None)
+    await handle_promotions(update, context)
 
-    elif data == "leave_feedback":
-        await handle_leave_feedback(update, context)
 
-    elif data == "winter_drop":
-        await handle_winter_drop(update, context)
+async def handle_end_admin_chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Выходим из режима чата с админом и возвращаемся в раздел помощи
+    context.user_data.pop('admin_chat_mode', None)
+    await handle_help(update, context)
 
-    elif data == "contact_admin":
-        await handle_contact_admin(update, context)
 
-    elif data == "end_admin_chat":
-        # Выходим из режима чата с админом и возвращаемся в раздел помощи
-        context.user_data.pop('admin_chat_mode', None)
-        await handle_help(update, context)
+async def handle_promo_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # В режиме дропа нажатия проходят через очередь (bot/services/drop_admission.py)
+    await drop_admission.admit(update, context, handle_promo, screens.get("promo_back").reply_markup)
 
 
 async def handle_promo(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -420,31 +356,18 @@ async def handle_promo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     is_subscribed = await check_subscription(context.bot, user_id)
 
     if not is_subscribed:
-        keyboard = [
-            [InlineKeyboardButton("Подписаться на канал", url=f"https://t.me/{CHANNEL_USERNAME.strip('@')}")],
-            [InlineKeyboardButton("✅ Проверить подписку", callback_data="subscribe_check")],
-            [InlineKeyboardButton("🔙 Назад", callback_data=str(MAIN))]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
-        await send_text_message(
-            update,
-            context,
-            NOT_SUBSCRIBED_MESSAGE.format(channel=CHANNEL_USERNAME),
-            reply_markup,
-            edit=True,
-            photo_key="promo"
-        )
+        screen = screens.get("not_subscribed")
+        await send_text_message(update, context, screen.text, screen.reply_markup, edit=True, photo_key=screen.photo_key)
         return
 
     # ПРОВЕРЯЕМ используя существующий метод can_receive_promo
     can_receive, reason = await promo_service.can_receive_promo(user_id)
     
     if not can_receive:
-        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data=str(MAIN))]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = screens.get("promo_back").reply_markup
 
         if reason == "no_promo":
+            drop_admission.mark_sold_out()
             await send_text_message(
                 update,
                 context,
@@ -461,7 +384,7 @@ async def handle_promo(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     update,
                     context,
                     f"🎁 Ваш промокод:\n\n`{last_promo['code']}`\n\n"
-                    f"📅 Действует до: {last_promo['expiry_date']}\n\n",
+                    f"📅 Действует до: {format_expiry(last_promo['expiry_ts'])}\n\n",
                     reply_markup,
                     edit=True,
                     photo_key="promo"
@@ -478,29 +401,27 @@ async def handle_promo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # Если может получить - выдаем новый случайный промокод
-    received_promo = await promo_service.get_random_active_promo()
+    received_promo = await promo_service.claim_random_promo(user_id)
     
     if received_promo:
-        # Отмечаем что пользователь получил промокод
-        await promo_service.mark_promo_received(user_id, received_promo["code"])
+        drop_admission.consume()
         
-        keyboard = [[InlineKeyboardButton("🔙 В главное меню", callback_data=str(MAIN))]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = screens.get("promo_received").reply_markup
 
         await send_text_message(
             update,
             context,
             f"🎁 *Ваш промокод:*\n\n`{received_promo['code']}`\n\n"
-            f"📅 *Действует до:* {received_promo['expiry_date']}\n\n"
+            f"📅 *Действует до:* {format_expiry(received_promo['expiry_ts'])}\n\n"
             f"💡 *Сохраните этот промокод! Он будет доступен до конца недели*",
             reply_markup,
             edit=True,
             photo_key="promo"
         )
     else:
-        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data=str(MAIN))]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
+        drop_admission.mark_sold_out()
+        reply_markup = screens.get("promo_back").reply_markup
+
         await send_text_message(
             update,
             context,
@@ -512,24 +433,8 @@ async def handle_promo(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def handle_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    user_id = update.effective_user.id
-
-    # Для админа показываем админскую справку, но кнопка связи с админом есть для всех,
-    # чтобы можно было тестировать функционал.
-    if user_id == ADMIN_ID:
-        text = HELP_ADMIN_MESSAGE
-    else:
-        text = HELP_USER_MESSAGE
-
-    keyboard = [
-        [InlineKeyboardButton("💬 Связаться с админом", callback_data="contact_admin")],
-        [InlineKeyboardButton("🔙 Назад", callback_data=str(MAIN))]
-    ]
-
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await send_menu_with_photo(update, context, "help", text, reply_markup, edit=True)
+    screen = screens.get("help", help_variant(update.effective_user.id))
+    await show_screen(update, context, screen, edit=True)
 
 
 async def handle_contact_admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -543,24 +448,17 @@ async def handle_contact_admin(update: Update, context: ContextTypes.DEFAULT_TYP
     context.user_data.pop('feedback_mode', None)
     context.user_data.pop('winter_drop_mode', None)
 
-    keyboard = [[InlineKeyboardButton("Завершить диалог", callback_data="end_admin_chat")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
+    screen = screens.get("contact_admin")
     await query.edit_message_text(
-        text=(
-            "*Связь с администратором*\n\n"
-            "Вы можете задать любой вопрос в свободной форме.\n"
-            "Все ваши сообщения будут автоматически направлены администратору.\n\n"
-            "Ответ администратора будет отправлен в этот диалог."
-        ),
-        reply_markup=reply_markup,
-        parse_mode='Markdown'
+        text=screen.text,
+        reply_markup=screen.reply_markup,
+        parse_mode=screen.parse_mode
     )
 
     # Уведомляем админа, что пользователь начал диалог
     try:
         username = f"@{user.username}" if user.username else "нет username"
-        await context.bot.send_message(
+        sent = await context.bot.send_message(
             chat_id=ADMIN_ID,
             text=(
                 "<b>Новый диалог с пользователем</b>\n\n"
@@ -572,6 +470,7 @@ async def handle_contact_admin(update: Update, context: ContextTypes.DEFAULT_TYP
             ),
             parse_mode='HTML'
         )
+        await remember_relay(sent, user.id)
     except Exception as e:
         logger.warning(f"Не удалось уведомить админа о начале диалога: {e}")
 
@@ -584,10 +483,7 @@ async def handle_book_pc(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.pop('feedback_mode', None)
     context.user_data.pop('winter_drop_mode', None)
 
-    keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data=str(MAIN))]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await send_menu_with_photo(update, context, "book_pc", BOOK_PC_MESSAGE, reply_markup, edit=True, parse_mode='Markdown')
+    await show_screen(update, context, screens.get("book_pc"), edit=True)
 
 
 async def handle_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -598,13 +494,7 @@ async def handle_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.pop('winter_drop_mode', None)
     context.user_data.pop('feedback_mode', None)  # Сбрасываем режим отзыва
 
-    keyboard = [
-        [InlineKeyboardButton("💬 Оставить отзыв", callback_data="leave_feedback")],
-        [InlineKeyboardButton("🔙 Назад", callback_data=str(MAIN))]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await send_menu_with_photo(update, context, "feedback", FEEDBACK_MESSAGE, reply_markup, edit=True)
+    await show_screen(update, context, screens.get("feedback"), edit=True)
 
 
 async def handle_leave_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -617,13 +507,11 @@ async def handle_leave_feedback(update: Update, context: ContextTypes.DEFAULT_TY
     context.user_data.pop('booking_mode', None)
     context.user_data.pop('winter_drop_mode', None)
     
-    keyboard = [[InlineKeyboardButton("🔙 Отмена", callback_data=str(FEEDBACK))]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
+    screen = screens.get("leave_feedback")
     await query.edit_message_text(
-        text="💬 *Введите ваш отзыв:*\n\nПожалуйста, напишите ваше мнение, предложение или замечание:",
-        reply_markup=reply_markup,
-        parse_mode='Markdown'
+        text=screen.text,
+        reply_markup=screen.reply_markup,
+        parse_mode=screen.parse_mode
     )
 
 
@@ -651,11 +539,12 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
                 f"<b>Текст сообщения:</b>\n{escaped_message}"
             )
 
-            await context.bot.send_message(
+            sent = await context.bot.send_message(
                 chat_id=ADMIN_ID,
                 text=admin_message,
                 parse_mode="HTML",
             )
+            await remember_relay(sent, user.id)
 
             await update.message.reply_text(
                 "Ваше сообщение передано администратору.\n\n"
@@ -691,18 +580,15 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
         )
         
         try:
-            # Отправляем отзыв в канал
-            await context.bot.send_message(
-                chat_id=NOTIFICATION_CHAT_ID,
-                text=admin_message,
-                parse_mode='HTML'
-            )
-            
-            # Подтверждение пользователю
-            await update.message.reply_text(
-                "✅ *Спасибо за ваш отзыв!*\n\nВаши отзывы помогают нам становиться лучше! 🥷",
-                parse_mode='Markdown'
-            )
+            # Сохраняем отзыв; уведомление в канал уйдет из очереди
+            if submission_store.submit(SUBMISSION_FEEDBACK, user.id, message_text, admin_message):
+                # Подтверждение пользователю
+                await update.message.reply_text(
+                    "✅ *Спасибо за ваш отзыв!*\n\nВаши отзывы помогают нам становиться лучше! 🥷",
+                    parse_mode='Markdown'
+                )
+            else:
+                await update.message.reply_text(DUPLICATE_SUBMISSION_MESSAGE)
             
         except Exception as e:
             logger.error(f"Ошибка отправки отзыва: {e}")
@@ -734,18 +620,18 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
             )
 
             try:
-                # Отправляем данные участника в канал
-                await context.bot.send_message(
-                    chat_id=NOTIFICATION_CHAT_ID,
-                    text=admin_message,
-                    parse_mode='HTML'
-                )
-
-                # Подтверждение пользователю
-                await update.message.reply_text(
-                    "✅ *Заявка на участие принята!*\n\nМы получили ваши данные и свяжемся с вами при необходимости.",
-                    parse_mode='Markdown'
-                )
+                # Сохраняем заявку участника; уведомление в канал уйдет из очереди
+                if submission_store.submit(
+                    SUBMISSION_WINTER_DROP, user.id, message_text, admin_message,
+                    campaign=WINTER_DROP_CAMPAIGN
+                ):
+                    # Подтверждение пользователю
+                    await update.message.reply_text(
+                        "✅ *Заявка на участие принята!*\n\nМы получили ваши данные и свяжемся с вами при необходимости.",
+                        parse_mode='Markdown'
+                    )
+                else:
+                    await update.message.reply_text(DUPLICATE_SUBMISSION_MESSAGE)
 
             except Exception as e:
                 logger.error(f"Ошибка отправки данных KATANA WINTER DROP: {e}")
@@ -775,18 +661,15 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
             )
 
             try:
-                # Отправляем в канал
-                await context.bot.send_message(
-                    chat_id=NOTIFICATION_CHAT_ID,
-                    text=admin_message,
-                    parse_mode='HTML'
-                )
-
-                # Подтверждение пользователю
-                await update.message.reply_text(
-                    "✅ *Заявка принята!*\n\nМы получили ваши данные и скоро свяжемся с вами для подтверждения брони.",
-                    parse_mode='Markdown'
-                )
+                # Сохраняем бронь; уведомление в канал уйдет из очереди
+                if submission_store.submit(SUBMISSION_BOOKING, user.id, message_text, admin_message):
+                    # Подтверждение пользователю
+                    await update.message.reply_text(
+                        "✅ *Заявка принята!*\n\nМы получили ваши данные и скоро свяжемся с вами для подтверждения брони.",
+                        parse_mode='Markdown'
+                    )
+                else:
+                    await update.message.reply_text(DUPLICATE_SUBMISSION_MESSAGE)
 
             except Exception as e:
                 logger.error(f"Ошибка отправки уведомления: {e}")
@@ -806,22 +689,13 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def handle_promotions(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
 
-    keyboard = [
-        [InlineKeyboardButton("❄️ KATANA WINTER DROP", callback_data="winter_drop")],
-        [InlineKeyboardButton("🔙 Назад", callback_data=str(MAIN))]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await send_menu_with_photo(update, context, "promotions", PROMOTIONS_MESSAGE, reply_markup, edit=True)
+    await show_screen(update, context, screens.get("promotions"), edit=True)
 
 
 async def handle_tariffs(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
 
-    keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data=str(MAIN))]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await send_menu_with_photo(update, context, "tariffs", TARIFFS_MESSAGE, reply_markup, edit=True)
+    await show_screen(update, context, screens.get("tariffs"), edit=True)
 
 
 async def handle_subscribe_check(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -833,21 +707,15 @@ async def handle_subscribe_check(update: Update, context: ContextTypes.DEFAULT_T
     if is_subscribed:
         await handle_promo(update, context)
     else:
-        keyboard = [
-            [InlineKeyboardButton("Подписаться на канал", url=f"https://t.me/{CHANNEL_USERNAME.strip('@')}")],
-            [InlineKeyboardButton("✅ Проверить подписку", callback_data="subscribe_check")],
-            [InlineKeyboardButton("🔙 Назад", callback_data=str(MAIN))]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
+        screen = screens.get("not_subscribed")
         try:
             await send_text_message(
                 update,
                 context,
-                NOT_SUBSCRIBED_MESSAGE.format(channel=CHANNEL_USERNAME),
-                reply_markup,
+                screen.text,
+                screen.reply_markup,
                 edit=True,
-                photo_key="promo"
+                photo_key=screen.photo_key
             )
         except BadRequest as e:
             if "message is not modified" not in str(e).lower():
@@ -864,16 +732,24 @@ async def handle_winter_drop(update: Update, context: ContextTypes.DEFAULT_TYPE)
     context.user_data.pop('feedback_mode', None)
     context.user_data.pop('booking_mode', None)
 
-    keyboard = [[InlineKeyboardButton("🔙 Отмена", callback_data=str(PROMOTIONS))]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
+    screen = screens.get("winter_drop")
     await query.edit_message_text(
-        text=(
-            "❄️ *KATANA WINTER DROP*\n\n"
-            "Привет! Для участия в розыгрыше, пожалуйста укажи:\n"
-            "• ФИО\n"
-            "• Контактный номер телефона"
-        ),
-        reply_markup=reply_markup,
-        parse_mode='Markdown'
-    )
\ No newline at end of file
+        text=screen.text,
+        reply_markup=screen.reply_markup,
+        parse_mode=screen.parse_mode
+    )
+
+
+menu_router = create_router("menu")
+menu_router.exact(str(MAIN), handle_back_to_main)
+menu_router.exact(str(PROMO), handle_promo_button)
+menu_router.exact(str(HELP), handle_help)
+menu_router.exact(str(BOOK_PC), handle_book_pc)
+menu_router.exact(str(FEEDBACK), handle_feedback_section)
+menu_router.exact(str(PROMOTIONS), handle_promotions_section)
+menu_router.exact(str(TARIFFS), handle_tariffs)
+menu_router.exact("subscribe_check", handle_subscribe_check)
+menu_router.exact("leave_feedback", handle_leave_feedback)
+menu_router.exact("winter_drop", handle_winter_drop)
+menu_router.exact("contact_admin", handle_contact_admin)
+menu_router.exact("end_admin_chat", handle_end_admin_chat)
\ No newline at end of file
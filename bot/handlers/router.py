@@ -0,0 +1,116 @@
+import time
+import bisect
+import logging
+from typing import Any, Awaitable, Callable, Optional
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+CallbackHandler = Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[Any]]
+
+# Границы корзин гистограммы задержек, мс (последняя корзина - все, что дольше)
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class RouteStats:
+    """Счетчик вызовов и гистограмма задержек одного маршрута"""
+
+    __slots__ = ("calls", "errors", "total_ms", "max_ms", "buckets")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def observe(self, elapsed_ms: float, failed: bool):
+        self.calls += 1
+        self.errors += failed
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+    def percentile(self, fraction: float) -> float:
+        """Оценка перцентиля по гистограмме (верхняя граница корзины)"""
+        if not self.calls:
+            return 0.0
+        target = fraction * self.calls
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target:
+                if index < len(LATENCY_BUCKETS_MS):
+                    return min(LATENCY_BUCKETS_MS[index], self.max_ms)
+                return self.max_ms
+        return self.max_ms
+
+
+class CallbackRouter:
+    """Маршрутизация callback_data: точное совпадение через словарь, префиксы через trie
+    (выбирается самый длинный подходящий префикс). Для каждого маршрута ведется статистика."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._exact: dict[str, CallbackHandler] = {}
+        self._trie: dict[str, Any] = {}
+        self._stats: dict[str, RouteStats] = {}
+
+    def exact(self, data: str, handler: CallbackHandler):
+        self._exact[data] = handler
+        self._stats.setdefault(data, RouteStats())
+
+    def prefix(self, prefix: str, handler: CallbackHandler):
+        node = self._trie
+        for char in prefix:
+            node = node.setdefault(char, {})
+        # Ключ None не пересекается с символами callback_data
+        node[None] = (f"{prefix}*", handler)
+        self._stats.setdefault(f"{prefix}*", RouteStats())
+
+    def resolve(self, data: str) -> Optional[tuple[str, CallbackHandler]]:
+        handler = self._exact.get(data)
+        if handler is not None:
+            return data, handler
+
+        match = None
+        node = self._trie
+        for char in data:
+            node = node.get(char)
+            if node is None:
+                break
+            match = node.get(None, match)
+        return match
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> Any:
+        data = update.callback_query.data or ""
+        route = self.resolve(data)
+        if route is None:
+            logger.debug(f"[{self.name}] Нет маршрута для callback_data={data!r}")
+            return None
+
+        route_name, handler = route
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = await handler(update, context)
+            failed = False
+            return result
+        finally:
+            self._stats[route_name].observe((time.perf_counter() - started) * 1000, failed)
+
+    def stats(self) -> dict[str, RouteStats]:
+        """Статистика маршрутов, которые вызывались хотя бы раз"""
+        return {route: stats for route, stats in self._stats.items() if stats.calls}
+
+
+# Все роутеры бота - для экрана производительности
+routers: list[CallbackRouter] = []
+
+
+def create_router(name: str) -> CallbackRouter:
+    router = CallbackRouter(name)
+    routers.append(router)
+    return router
\ No newline at end of file
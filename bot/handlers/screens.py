@@ -0,0 +1,156 @@
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from telegram import InlineKeyboardMarkup, InlineKeyboardButton
+
+from bot.config import CHANNEL_USERNAME
+from bot.constants import (
+    MENU_MAIN,
+    NOT_SUBSCRIBED_MESSAGE,
+    HELP_USER_MESSAGE,
+    HELP_ADMIN_MESSAGE,
+    BOOK_PC_MESSAGE,
+    FEEDBACK_MESSAGE,
+    PROMOTIONS_MESSAGE,
+    TARIFFS_MESSAGE
+)
+
+logger = logging.getLogger(__name__)
+
+# callback_data разделов главного меню
+MAIN, PROMO, HELP, BOOK_PC, FEEDBACK, PROMOTIONS, TARIFFS = range(7)
+
+# Вариант экрана для главного администратора
+ADMIN_VARIANT = "admin"
+
+
+@dataclass(frozen=True)
+class Screen:
+    text: str
+    reply_markup: InlineKeyboardMarkup
+    photo_key: Optional[str] = None
+    parse_mode: Optional[str] = None
+
+
+def back_markup(callback_data: str, label: str = "🔙 Назад") -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[InlineKeyboardButton(label, callback_data=callback_data)]])
+
+
+class ScreenRegistry:
+    """Готовые экраны меню: текст, клавиатура и ключ фото собираются один раз при запуске,
+    обработчики берут их по ключу. Вариант экрана (например, справка для админа)
+    хранится отдельно; если варианта нет, возвращается основной экран."""
+
+    def __init__(self):
+        self._screens: dict[tuple[str, Optional[str]], Screen] = {}
+
+    def register(self, key: str, screen: Screen, variant: Optional[str] = None):
+        self._screens[(key, variant)] = screen
+
+    def get(self, key: str, variant: Optional[str] = None) -> Screen:
+        if variant is not None:
+            screen = self._screens.get((key, variant))
+            if screen is not None:
+                return screen
+        return self._screens[(key, None)]
+
+    def build(self):
+        """Собрать статические экраны меню"""
+        back_to_main = back_markup(str(MAIN))
+
+        self.register("main", Screen(
+            text=MENU_MAIN,
+            reply_markup=InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton("🎁 Промокод", callback_data=str(PROMO)),
+                    InlineKeyboardButton("💻 Бронь", callback_data=str(BOOK_PC))
+                ],
+                [
+                    InlineKeyboardButton("💰 Акции", callback_data=str(PROMOTIONS)),
+                    InlineKeyboardButton("📊 Тарифы", callback_data=str(TARIFFS))
+                ],
+                [
+                    InlineKeyboardButton("📝 Отзыв", callback_data=str(FEEDBACK)),
+                    InlineKeyboardButton("❓ Помощь", callback_data=str(HELP))
+                ]
+            ]),
+            photo_key="main"
+        ))
+
+        # Кнопка связи с админом есть и у админа, чтобы можно было проверить функционал
+        help_markup = InlineKeyboardMarkup([
+            [InlineKeyboardButton("💬 Связаться с админом", callback_data="contact_admin")],
+            [InlineKeyboardButton("🔙 Назад", callback_data=str(MAIN))]
+        ])
+        self.register("help", Screen(HELP_USER_MESSAGE, help_markup, photo_key="help"))
+        self.register("help", Screen(HELP_ADMIN_MESSAGE, help_markup, photo_key="help"), variant=ADMIN_VARIANT)
+
+        self.register("book_pc", Screen(BOOK_PC_MESSAGE, back_to_main, photo_key="book_pc", parse_mode="Markdown"))
+
+        self.register("feedback", Screen(
+            text=FEEDBACK_MESSAGE,
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("💬 Оставить отзыв", callback_data="leave_feedback")],
+                [InlineKeyboardButton("🔙 Назад", callback_data=str(MAIN))]
+            ]),
+            photo_key="feedback"
+        ))
+
+        self.register("leave_feedback", Screen(
+            text="💬 *Введите ваш отзыв:*\n\nПожалуйста, напишите ваше мнение, предложение или замечание:",
+            reply_markup=back_markup(str(FEEDBACK), "🔙 Отмена"),
+            parse_mode="Markdown"
+        ))
+
+        self.register("promotions", Screen(
+            text=PROMOTIONS_MESSAGE,
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("❄️ KATANA WINTER DROP", callback_data="winter_drop")],
+                [InlineKeyboardButton("🔙 Назад", callback_data=str(MAIN))]
+            ]),
+            photo_key="promotions"
+        ))
+
+        self.register("winter_drop", Screen(
+            text=(
+                "❄️ *KATANA WINTER DROP*\n\n"
+                "Привет! Для участия в розыгрыше, пожалуйста укажи:\n"
+                "• ФИО\n"
+                "• Контактный номер телефона"
+            ),
+            reply_markup=back_markup(str(PROMOTIONS), "🔙 Отмена"),
+            parse_mode="Markdown"
+        ))
+
+        self.register("tariffs", Screen(TARIFFS_MESSAGE, back_to_main, photo_key="tariffs"))
+
+        self.register("contact_admin", Screen(
+            text=(
+                "*Связь с администратором*\n\n"
+                "Вы можете задать любой вопрос в свободной форме.\n"
+                "Все ваши сообщения будут автоматически направлены администратору.\n\n"
+                "Ответ администратора будет отправлен в этот диалог."
+            ),
+            reply_markup=back_markup("end_admin_chat", "Завершить диалог"),
+            parse_mode="Markdown"
+        ))
+
+        # Экраны раздела промокодов: текст с кодом подставляется при выдаче, клавиатуры общие
+        self.register("not_subscribed", Screen(
+            text=NOT_SUBSCRIBED_MESSAGE.format(channel=CHANNEL_USERNAME),
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("Подписаться на канал", url=f"https://t.me/{CHANNEL_USERNAME.strip('@')}")],
+                [InlineKeyboardButton("✅ Проверить подписку", callback_data="subscribe_check")],
+                [InlineKeyboardButton("🔙 Назад", callback_data=str(MAIN))]
+            ]),
+            photo_key="promo"
+        ))
+        self.register("promo_back", Screen("", back_to_main, photo_key="promo"))
+        self.register("promo_received", Screen("", back_markup(str(MAIN), "🔙 В главное меню"), photo_key="promo"))
+
+        logger.info(f"Подготовлено экранов меню: {len(self._screens)}")
+
+
+screens = ScreenRegistry()
+screens.build()
\ No newline at end of file
@@ -1,53 +1,68 @@
 import logging
 import re
+from typing import Optional
 
 from telegram import Update
 from telegram.ext import ContextTypes
 
+from bot.services.database import db
+
 logger = logging.getLogger(__name__)
 
 
+async def resolve_relay_user(message) -> Optional[int]:
+    """Найти пользователя, чье сообщение переслано админу: по таблице relay_messages,
+    а для сообщений, отправленных до ее появления, - по строке с ID в тексте"""
+    user_id = await db.get_relay_user(message.chat_id, message.message_id)
+    if user_id is not None:
+        return user_id
+
+    # Старые уведомления: "Идентификатор пользователя: <code>123</code>" (в тексте без разметки - просто число)
+    match = re.search(r"Идентификатор пользователя:\s*(\d+)", message.text or message.caption or "")
+    return int(match.group(1)) if match else None
+
+
 async def handle_admin_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Обработка ответов админа на сообщения клиентов.
 
     Сценарий:
-    1. Пользователь пишет боту в режиме чата с админом.
-    2. Бот отправляет админу сообщение в формате:
-       ID: <user_id>, Имя, Username, Текст.
-    3. Админ отвечает *ответом* на это сообщение.
-    4. Бот парсит ID пользователя из текста и отправляет ему ответ.
+    1. Пользователь пишет боту в режиме чата с админом (или оставляет отзыв, бронь, заявку).
+    2. Бот пересылает сообщение админу или в канал уведомлений и запоминает,
+       от какого пользователя оно пришло (таблица relay_messages).
+    3. Админ отвечает *ответом* на это сообщение - текстом, фото, файлом и т.п.
+    4. Бот находит пользователя по id исходного сообщения и отправляет ему ответ.
     """
     message = update.message
 
     if not message or not message.reply_to_message:
         return
 
-    original = message.reply_to_message
-    original_text = original.text or ""
-
-    # Ищем строку с ID: <число>
-    match = re.search(r"ID:\s*<code>(\d+)</code>|ID:\s*(\d+)", original_text)
-    if not match:
-        logger.debug("Не удалось извлечь ID пользователя из сообщения, пропускаем ответ админа")
-        return
-
-    user_id_str = match.group(1) or match.group(2)
-    try:
-        user_id = int(user_id_str)
-    except ValueError:
-        logger.debug("Извлечён некорректный ID пользователя, пропускаем ответ админа")
+    user_id = await resolve_relay_user(message.reply_to_message)
+    if user_id is None:
+        logger.info("Сообщение, на которое ответил админ, не связано с пользователем")
+        try:
+            await message.reply_text(
+                "⚠️ Не удалось определить, кому адресован ответ: это сообщение не связано "
+                "с пользователем (или связь уже устарела). Ответ не отправлен."
+            )
+        except Exception as e:
+            logger.debug(f"Не удалось предупредить админа о неотправленном ответе: {e}")
         return
 
     try:
-        await context.bot.send_message(
-            chat_id=user_id,
-            text=(
-                "*Ответ администратора:*\n\n"
-                f"{message.text}"
-            ),
-            parse_mode="Markdown",
-        )
+        if message.text:
+            await context.bot.send_message(
+                chat_id=user_id,
+                text=(
+                    "*Ответ администратора:*\n\n"
+                    f"{message.text}"
+                ),
+                parse_mode="Markdown",
+            )
+        else:
+            # Фото, документы, голосовые и т.п. копируются как есть, вместе с подписью
+            await message.copy(chat_id=user_id)
     except Exception as e:
         logger.error(f"Не удалось отправить ответ администратора пользователю {user_id}: {e}")
         try:
@@ -56,4 +71,3 @@ async def handle_admin_reply(update: Update, context: ContextTypes.DEFAULT_TYPE)
             )
         except Exception:
             pass
-
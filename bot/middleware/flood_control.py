@@ -0,0 +1,131 @@
+import time
+import logging
+from typing import Optional
+
+from telegram import Update
+
+from bot.config import FLOOD_RATE_PER_SECOND, FLOOD_BURST, CALLBACK_DEDUP_SECONDS
+from bot.services.rate_governor import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+THROTTLED_ANSWER = "⏳ Слишком много нажатий, подождите пару секунд"
+THROTTLED_MESSAGE = "⏳ Слишком много сообщений подряд, подождите пару секунд и повторите"
+# Порог, после которого из памяти вычищаются давно неактивные пользователи
+MAX_TRACKED_USERS = 10000
+
+
+class FloodControl:
+    """Защита обработчиков от флуда: token bucket на пользователя и отсев повторных нажатий.
+
+    Проверка выполняется до очереди обновлений пользователя (bot/middleware/update_processor.py):
+    повторное нажатие той же кнопки того же сообщения, пока первое ждет своей очереди или
+    обрабатывается, или в течение dedup_seconds после него, сразу получает ответ и не занимает
+    место в очереди."""
+
+    def __init__(
+        self,
+        rate: float = FLOOD_RATE_PER_SECOND,
+        burst: int = FLOOD_BURST,
+        dedup_seconds: float = CALLBACK_DEDUP_SECONDS
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.dedup_seconds = dedup_seconds
+        self._buckets: dict[int, TokenBucket] = {}
+        # user_id -> (data, message_id, время завершения; None - еще обрабатывается)
+        self._last_callback: dict[int, tuple[str, int, Optional[float]]] = {}
+        # Кому уже сообщили об ограничении - повторно не пишем, пока не пройдет следующее сообщение
+        self._notified: set[int] = set()
+        self.passed = 0
+        self.duplicates = 0
+        self.throttled = 0
+
+    async def admit(self, update: object) -> bool:
+        """Пропустить обновление к обработчикам. False - отсеяно, пользователю уже ответили"""
+        if not isinstance(update, Update) or not update.effective_user:
+            return True
+
+        user_id = update.effective_user.id
+        query = update.callback_query
+        if query and self._is_duplicate(user_id, query):
+            self.duplicates += 1
+            await self._reply(update)
+            return False
+
+        if not self._take_token(user_id):
+            self.throttled += 1
+            logger.debug(f"Пользователь {user_id} ограничен антифлудом")
+            await self._reply(update, throttled=True)
+            return False
+
+        self.passed += 1
+        self._notified.discard(user_id)
+        if query:
+            self._last_callback[user_id] = (*self._callback_key(query), None)
+        return True
+
+    def finished(self, update: object):
+        """Обработка пропущенного обновления завершена - отсчитываем окно повторных нажатий"""
+        if not isinstance(update, Update) or not update.effective_user or not update.callback_query:
+            return
+
+        key = self._callback_key(update.callback_query)
+        last = self._last_callback.get(update.effective_user.id)
+        if last is not None and last[:2] == key:
+            self._last_callback[update.effective_user.id] = (*key, time.monotonic())
+
+    async def _reply(self, update: Update, throttled: bool = False):
+        query = update.callback_query
+        try:
+            if query:
+                await query.answer(THROTTLED_ANSWER if throttled else None)
+            elif throttled and update.message and update.effective_user.id not in self._notified:
+                self._notified.add(update.effective_user.id)
+                await update.message.reply_text(THROTTLED_MESSAGE)
+        except Exception as e:
+            logger.debug(f"Не удалось ответить на отсеянное обновление: {e}")
+
+    @staticmethod
+    def _callback_key(query) -> tuple[str, int]:
+        return query.data, query.message.message_id if query.message else 0
+
+    def _is_duplicate(self, user_id: int, query) -> bool:
+        last = self._last_callback.get(user_id)
+        if last is None or last[:2] != self._callback_key(query):
+            return False
+
+        finished_at = last[2]
+        return finished_at is None or time.monotonic() - finished_at < self.dedup_seconds
+
+    def _take_token(self, user_id: int) -> bool:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) >= MAX_TRACKED_USERS:
+                self._prune()
+            bucket = self._buckets[user_id] = TokenBucket(self.rate, self.burst)
+
+        if bucket.time_until_available() > 0:
+            return False
+        bucket.reserve()
+        return True
+
+    def _prune(self):
+        self._buckets = {user_id: bucket for user_id, bucket in self._buckets.items() if not bucket.is_idle()}
+        self._notified &= self._buckets.keys()
+        now = time.monotonic()
+        self._last_callback = {
+            user_id: last for user_id, last in self._last_callback.items()
+            if last[2] is None or now - last[2] < self.dedup_seconds
+        }
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "passed": self.passed,
+            "duplicates": self.duplicates,
+            "throttled": self.throttled,
+            "users": len(self._buckets)
+        }
+
+
+flood_control = FloodControl()
@@ -1,22 +1,36 @@
+import asyncio
 import logging
-from typing import Optional
-from telegram import Update
+from typing import Optional, Iterable
+from telegram import Update, Bot
 from telegram.ext import ContextTypes, BaseHandler
+from telegram.error import TelegramError
+
+from bot.middleware.tracked_messages import TrackedMessageStore
 
 logger = logging.getLogger(__name__)
 
+# Лимит Bot API на количество сообщений в одном вызове deleteMessages
+DELETE_BATCH_SIZE = 100
+# Окно, в течение которого удаления по одному чату собираются в один запрос
+DELETE_COALESCE_SECONDS = 0.3
+
 
 class MessageCleanupMiddleware:
 
     def __init__(self):
-        self.tracked_messages = {}
+        self.tracked_messages = TrackedMessageStore()
+        self._pending_deletions: dict[int, set[int]] = {}
+        self._deletion_event = asyncio.Event()
+        self._deletion_worker: Optional[asyncio.Task] = None
+        self._deletion_batch: Optional[asyncio.Task] = None
+        self._bot: Optional[Bot] = None
 
     async def track_bot_message(self, chat_id: int, message_id: int, context: ContextTypes.DEFAULT_TYPE):
         await self.cleanup_all_except(chat_id, message_id, context)
+        # Актуальное сообщение меню могло уже стоять в очереди на удаление
+        self._pending_deletions.get(chat_id, set()).discard(message_id)
 
-        if chat_id not in self.tracked_messages:
-            self.tracked_messages[chat_id] = set()
-        self.tracked_messages[chat_id] = {message_id}
+        self.tracked_messages.set(chat_id, (message_id,))
 
         context.user_data["active_menu_message"] = message_id
 
@@ -24,44 +38,87 @@ class MessageCleanupMiddleware:
         if not update.message:
             return
 
-        try:
-            if update.message.text and update.message.text.startswith('/'):
-                await update.message.delete()
-                logger.info(f"Удалена команда: {update.message.text}")
-        except Exception as e:
-            logger.debug(f"Не удалось удалить команду: {e}")
+        if update.message.text and update.message.text.startswith('/'):
+            self.schedule_deletion(update.message.chat_id, [update.message.message_id], context.bot)
 
     async def cleanup_old_messages(self, chat_id: int, keep_message_id: Optional[int], context: ContextTypes.DEFAULT_TYPE):
-        if chat_id not in self.tracked_messages:
+        tracked = self.tracked_messages.get(chat_id)
+        if not tracked:
             return
 
-        messages_to_delete = self.tracked_messages[chat_id].copy()
+        messages_to_delete = set(tracked)
 
         if keep_message_id:
             messages_to_delete.discard(keep_message_id)
 
-        for msg_id in messages_to_delete:
-            try:
-                await context.bot.delete_message(chat_id=chat_id, message_id=msg_id)
-                self.tracked_messages[chat_id].discard(msg_id)
-                logger.info(f"Удалено старое сообщение: {msg_id}")
-            except Exception as e:
-                logger.debug(f"Не удалось удалить сообщение {msg_id}: {e}")
-                self.tracked_messages[chat_id].discard(msg_id)
+        self.tracked_messages.set(chat_id, tuple(set(tracked) - messages_to_delete))
+        self.schedule_deletion(chat_id, messages_to_delete, context.bot)
 
     async def cleanup_all_except(self, chat_id: int, keep_message_id: int, context: ContextTypes.DEFAULT_TYPE):
-        if chat_id not in self.tracked_messages:
-            return
-
-        messages_to_delete = self.tracked_messages[chat_id].copy()
+        messages_to_delete = set(self.tracked_messages.get(chat_id))
         messages_to_delete.discard(keep_message_id)
 
-        for msg_id in messages_to_delete:
+        self.schedule_deletion(chat_id, messages_to_delete, context.bot)
+
+    def schedule_deletion(self, chat_id: int, message_ids: Iterable[int], bot: Bot):
+        """Поставить сообщения в очередь на удаление, не дожидаясь запросов к API"""
+        message_ids = set(message_ids)
+        if not message_ids:
+            return
+
+        self._bot = bot
+        self._pending_deletions.setdefault(chat_id, set()).update(message_ids)
+        self._deletion_event.set()
+
+        if self._deletion_worker is None or self._deletion_worker.done():
+            self._deletion_worker = asyncio.create_task(self._deletion_loop())
+
+    async def _deletion_loop(self):
+        while True:
+            await self._deletion_event.wait()
+            await asyncio.sleep(DELETE_COALESCE_SECONDS)
+            self._deletion_event.clear()
+            # shield: остановка воркера не должна обрывать уже начатую пачку удалений
+            self._deletion_batch = asyncio.create_task(self._delete_pending())
+            await asyncio.shield(self._deletion_batch)
+
+    async def _delete_pending(self):
+        pending, self._pending_deletions = self._pending_deletions, {}
+
+        for chat_id, message_ids in pending.items():
+            message_ids = sorted(message_ids)
+            for start in range(0, len(message_ids), DELETE_BATCH_SIZE):
+                batch = message_ids[start:start + DELETE_BATCH_SIZE]
+                try:
+                    await self._bot.delete_messages(chat_id=chat_id, message_ids=batch)
+                    logger.info(f"Удалено старых сообщений в чате {chat_id}: {len(batch)}")
+                except TelegramError as e:
+                    logger.debug(f"Не удалось удалить сообщения {batch} в чате {chat_id}: {e}")
+
+    async def load(self):
+        """Восстановить отслеживаемые сообщения после перезапуска"""
+        await self.tracked_messages.load()
+
+    async def flush(self):
+        """Сбросить изменения отслеживаемых сообщений в БД"""
+        await self.tracked_messages.flush()
+
+    async def shutdown(self):
+        """Остановить фоновое удаление, выполнив уже поставленные в очередь удаления"""
+        if self._deletion_worker and not self._deletion_worker.done():
+            self._deletion_worker.cancel()
             try:
-                await context.bot.delete_message(chat_id=chat_id, message_id=msg_id)
-                logger.info(f"Удалено старое сообщение: {msg_id}")
-            except Exception as e:
-                logger.debug(f"Не удалось удалить сообщение {msg_id}: {e}")
+                await self._deletion_worker
+            except asyncio.CancelledError:
+                pass
+
+        if self._deletion_batch and not self._deletion_batch.done():
+            await self._deletion_batch
+
+        if self._pending_deletions and self._bot:
+            await self._delete_pending()
+
+        await self.flush()
 
 
 message_cleanup = MessageCleanupMiddleware()
@@ -0,0 +1,76 @@
+import time
+import logging
+from collections import OrderedDict
+
+from bot.config import TRACKED_MESSAGES_MAX_CHATS
+from bot.services.database import db
+
+logger = logging.getLogger(__name__)
+
+# Telegram не дает боту удалять сообщения старше 48 часов - хранить их дольше бессмысленно
+TRACKED_MESSAGE_TTL_SECONDS = 48 * 3600
+
+
+class TrackedMessageStore:
+    """Ограниченное хранилище отслеживаемых сообщений меню: LRU по чатам с TTL 48ч.
+    Изменения копятся в памяти и периодически сбрасываются в SQLite (write-behind)."""
+
+    def __init__(self, max_chats: int = TRACKED_MESSAGES_MAX_CHATS, ttl_seconds: int = TRACKED_MESSAGE_TTL_SECONDS):
+        self.max_chats = max_chats
+        self.ttl = ttl_seconds
+        # chat_id -> (message_ids, tracked_at)
+        self._entries: OrderedDict[int, tuple[tuple[int, ...], int]] = OrderedDict()
+        self._dirty: set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, chat_id: int) -> tuple[int, ...]:
+        entry = self._entries.get(chat_id)
+        if entry is None:
+            return ()
+
+        message_ids, tracked_at = entry
+        if time.time() - tracked_at >= self.ttl:
+            del self._entries[chat_id]
+            return ()
+
+        return message_ids
+
+    def set(self, chat_id: int, message_ids: tuple[int, ...]):
+        self._entries[chat_id] = (message_ids, int(time.time()))
+        self._entries.move_to_end(chat_id)
+        self._dirty.add(chat_id)
+
+        while len(self._entries) > self.max_chats:
+            evicted_chat_id, _ = self._entries.popitem(last=False)
+            self._dirty.discard(evicted_chat_id)
+
+    async def load(self):
+        """Загрузить из БД сообщения, которые еще можно удалить"""
+        since = int(time.time()) - self.ttl
+        rows = await db.get_tracked_messages(since, self.max_chats)
+
+        self._entries.clear()
+        for chat_id, message_ids, tracked_at in rows:
+            ids = tuple(int(message_id) for message_id in message_ids.split(',') if message_id)
+            self._entries[chat_id] = (ids, tracked_at)
+
+        logger.info(f"Загружено отслеживаемых сообщений меню: {len(self._entries)}")
+
+    async def flush(self):
+        """Записать накопленные изменения одной транзакцией и удалить устаревшие записи"""
+        dirty, self._dirty = self._dirty, set()
+
+        rows = []
+        for chat_id in dirty:
+            entry = self._entries.get(chat_id)
+            if entry is not None:
+                message_ids, tracked_at = entry
+                rows.append((chat_id, ','.join(map(str, message_ids)), tracked_at))
+
+        try:
+            await db.save_tracked_messages(rows, expired_before=int(time.time()) - self.ttl)
+        except Exception:
+            self._dirty |= dirty
+            raise
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from bot.config import MAX_CONCURRENT_UPDATES, MAX_PENDING_UPDATES
+from bot.middleware.flood_control import flood_control
+
+logger = logging.getLogger(__name__)
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка обновлений: разные пользователи обрабатываются одновременно,
+    обновления одного пользователя - строго по очереди (от этого зависят режимы в user_data
+    и состояние ConversationHandler). Число одновременно выполняемых обработчиков ограничено.
+
+    Семафор базового класса ограничивает только число принятых в работу обновлений
+    (вместе с ожидающими своей очереди), поэтому ему передается MAX_PENDING_UPDATES.
+    Антифлуд проверяется до очереди пользователя: повторные нажатия и флуд получают ответ
+    сразу, не дожидаясь, пока обработается предыдущее обновление."""
+
+    def __init__(self, max_running: int = MAX_CONCURRENT_UPDATES, max_pending: int = MAX_PENDING_UPDATES):
+        super().__init__(max_concurrent_updates=max_pending)
+        self.max_running = max_running
+        self._running = asyncio.Semaphore(max_running)
+        # user_id -> (lock, число обновлений, которые его держат или ждут)
+        self._user_locks: dict[int, tuple[asyncio.Lock, int]] = {}
+        self._active = 0
+        self._in_flight = 0
+        self._slot_released = asyncio.Event()
+
+    @staticmethod
+    def _ordering_key(update: object) -> Optional[int]:
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user:
+            return update.effective_user.id
+        if update.effective_chat:
+            return update.effective_chat.id
+        return None
+
+    @property
+    def in_flight(self) -> int:
+        """Сколько обновлений принято в работу и еще не обработано"""
+        return self._in_flight
+
+    def is_busy(self, key: int) -> bool:
+        """Есть ли у пользователя (чата) обновления в обработке или в очереди"""
+        return key in self._user_locks
+
+    async def wait_for_slot(self):
+        """Дождаться завершения обработки какого-либо обновления"""
+        self._slot_released.clear()
+        await self._slot_released.wait()
+
+    @asynccontextmanager
+    async def yield_slot(self) -> AsyncIterator[None]:
+        """Отдать слот выполнения на время долгого ожидания внутри обработчика (очередь дропа).
+        Обновления этого пользователя по-прежнему ждут, пока текущее не завершится"""
+        self._active -= 1
+        self._running.release()
+        try:
+            yield
+        finally:
+            await self._running.acquire()
+            self._active += 1
+
+    async def do_process_update(self, update: object, coroutine: Awaitable) -> None:
+        self._in_flight += 1
+        try:
+            if not await flood_control.admit(update):
+                coroutine.close()
+                return
+            try:
+                await self._process_in_order(update, coroutine)
+            finally:
+                flood_control.finished(update)
+        finally:
+            self._in_flight -= 1
+            self._slot_released.set()
+
+    async def _process_in_order(self, update: object, coroutine: Awaitable):
+        key = self._ordering_key(update)
+        if key is None:
+            async with self._running:
+                await self._run(coroutine)
+            return
+
+        lock, waiters = self._user_locks.get(key, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._user_locks[key] = (lock, waiters + 1)
+
+        try:
+            async with lock:
+                async with self._running:
+                    await self._run(coroutine)
+        finally:
+            lock, waiters = self._user_locks[key]
+            if waiters <= 1:
+                del self._user_locks[key]
+            else:
+                self._user_locks[key] = (lock, waiters - 1)
+
+    async def _run(self, coroutine: Awaitable):
+        self._active += 1
+        try:
+            await coroutine
+        finally:
+            self._active -= 1
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "active": self._active,
+            "users": len(self._user_locks),
+            "max_running": self.max_running
+        }
+
+
+update_processor = PerUserUpdateProcessor()
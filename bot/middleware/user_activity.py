@@ -0,0 +1,83 @@
+import time
+import logging
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes, TypeHandler
+
+from bot.config import USER_DATA_IDLE_HOURS
+from bot.middleware.update_processor import update_processor
+
+logger = logging.getLogger(__name__)
+
+
+class UserActivityTracker:
+    """Учет активности пользователей и выгрузка user_data неактивных из памяти.
+
+    При наличии persistence данные перед выгрузкой сохраняются и подгружаются обратно
+    при следующем обращении пользователя (refresh_user_data); без нее - просто удаляются."""
+
+    def __init__(self, idle_seconds: float = USER_DATA_IDLE_HOURS * 3600):
+        self.idle_seconds = idle_seconds
+        self._last_seen: dict[int, float] = {}
+        self._started_at = time.time()
+        self.evicted_total = 0
+        self.last_evicted = 0
+
+    def register(self, application: Application):
+        # Группа -1 выполняется раньше основных обработчиков и не мешает им
+        application.add_handler(TypeHandler(Update, self._touch), group=-1)
+
+    async def _touch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if update.effective_user:
+            self._last_seen[update.effective_user.id] = time.time()
+
+    def _is_idle(self, user_id: int, threshold: float) -> bool:
+        # Пользователи без отметки активности появились до запуска трекера
+        if self._last_seen.get(user_id, self._started_at) >= threshold:
+            return False
+        return not update_processor.is_busy(user_id)
+
+    async def evict_idle(self, context: ContextTypes.DEFAULT_TYPE):
+        """Фоновая задача: выгрузить user_data пользователей, неактивных дольше idle_seconds"""
+        application = context.application
+        threshold = time.time() - self.idle_seconds
+
+        idle_users = [user_id for user_id in application.user_data if self._is_idle(user_id, threshold)]
+
+        persistence = application.persistence
+        if idle_users and persistence:
+            # Сначала сохраняем актуальное состояние, иначе последние изменения потеряются
+            await application.update_persistence()
+            # Пока шло сохранение, пользователь мог снова написать боту - его данные уже не сохранены
+            idle_users = [user_id for user_id in idle_users if self._is_idle(user_id, threshold)]
+
+        if not idle_users:
+            self.last_evicted = 0
+            return
+
+        # Личный чат пользователя совпадает с его id
+        idle_chats = [user_id for user_id in idle_users if user_id in application.chat_data]
+        if persistence:
+            persistence.mark_offloaded(idle_users, idle_chats)
+
+        for user_id in idle_users:
+            application.drop_user_data(user_id)
+            self._last_seen.pop(user_id, None)
+        for chat_id in idle_chats:
+            application.drop_chat_data(chat_id)
+
+        self.evicted_total += len(idle_users)
+        self.last_evicted = len(idle_users)
+        logger.info(f"Выгружено из памяти данных неактивных пользователей: {len(idle_users)}")
+
+    def stats(self, application: Application) -> dict[str, int]:
+        return {
+            "resident_users": len(application.user_data),
+            "resident_chats": len(application.chat_data),
+            "tracked": len(self._last_seen),
+            "evicted_total": self.evicted_total,
+            "last_evicted": self.last_evicted
+        }
+
+
+user_activity = UserActivityTracker()
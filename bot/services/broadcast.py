@@ -1,11 +1,10 @@
-import asyncio
 import logging
 from typing import Optional
 from telegram import Bot
 from telegram.error import TelegramError
 
-from bot.config import MESSAGE_DELAY_SECONDS
 from bot.services.database import db
+from bot.services.rate_governor import PRIORITY_BULK
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +17,10 @@ class BroadcastService:
         failed = 0
         failed_users = []
 
+        # Темп задает общий лимитер запросов: рассылка идет в нижнем приоритете
+        # и не вытесняет ответы пользователям
+        rate_limit_args = {"priority": PRIORITY_BULK}
+
         for user in users:
             user_id = user["user_id"]
             try:
@@ -25,13 +28,13 @@ class BroadcastService:
                     await bot.send_photo(
                         chat_id=user_id,
                         photo=photo_file_id,
-                        caption=message if message else None
+                        caption=message if message else None,
+                        rate_limit_args=rate_limit_args
                     )
                 else:
-                    await bot.send_message(user_id, message)
+                    await bot.send_message(user_id, message, rate_limit_args=rate_limit_args)
 
                 sent += 1
-                await asyncio.sleep(MESSAGE_DELAY_SECONDS)
 
             except TelegramError as e:
                 failed += 1
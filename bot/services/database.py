@@ -1,6 +1,8 @@
 import os
+import time
+import random
+import asyncio
 import aiosqlite
-from datetime import datetime
 from typing import Optional, List, Dict
 
 from bot.config import DATABASE_PATH
@@ -21,16 +23,18 @@ class Database:
                     user_id INTEGER PRIMARY KEY,
                     first_name TEXT NOT NULL,
                     username TEXT,
-                    joined_at TEXT NOT NULL
+                    joined_ts INTEGER NOT NULL
                 )
             """)
 
             await conn.execute("""
                 CREATE TABLE IF NOT EXISTS promos (
                     code TEXT PRIMARY KEY,
-                    expiry_date TEXT NOT NULL,
-                    created_at TEXT NOT NULL,
-                    active INTEGER NOT NULL DEFAULT 1
+                    expiry_ts INTEGER NOT NULL,
+                    created_ts INTEGER NOT NULL,
+                    active INTEGER NOT NULL DEFAULT 1,
+                    claimed_by INTEGER,
+                    claimed_ts INTEGER
                 )
             """)
 
@@ -39,29 +43,138 @@ class Database:
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     user_id INTEGER NOT NULL,
                     promo_code TEXT NOT NULL,
-                    received_at TEXT NOT NULL,
+                    received_ts INTEGER NOT NULL,
                     FOREIGN KEY (user_id) REFERENCES users(user_id),
                     FOREIGN KEY (promo_code) REFERENCES promos(code) ON DELETE CASCADE,
                     UNIQUE(user_id, promo_code)
                 )
             """)
 
+            # История выдачи удаленных истекших промокодов
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS promo_usage_archive (
+                    id INTEGER PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    promo_code TEXT NOT NULL,
+                    received_ts INTEGER NOT NULL,
+                    expiry_ts INTEGER NOT NULL,
+                    archived_at INTEGER NOT NULL
+                )
+            """)
+
             await conn.execute("""
                 CREATE TABLE IF NOT EXISTS admins (
                     user_id INTEGER PRIMARY KEY,
                     first_name TEXT NOT NULL,
                     username TEXT,
-                    added_at TEXT NOT NULL,
+                    added_ts INTEGER NOT NULL,
                     added_by INTEGER NOT NULL
                 )
             """)
 
-            await conn.execute("CREATE INDEX IF NOT EXISTS idx_promo_expiry ON promos(expiry_date)")
-            await conn.execute("CREATE INDEX IF NOT EXISTS idx_promo_active ON promos(active)")
-            await conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_user ON promo_usage(user_id)")
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS tracked_messages (
+                    chat_id INTEGER PRIMARY KEY,
+                    message_ids TEXT NOT NULL,
+                    tracked_at INTEGER NOT NULL
+                )
+            """)
+
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS relay_messages (
+                    chat_id INTEGER NOT NULL,
+                    message_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    created_at INTEGER NOT NULL,
+                    PRIMARY KEY (chat_id, message_id)
+                ) WITHOUT ROWID
+            """)
+
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS notification_spool (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id INTEGER NOT NULL,
+                    user_id INTEGER,
+                    text TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at INTEGER NOT NULL,
+                    created_at INTEGER NOT NULL
+                )
+            """)
+
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS submissions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    campaign TEXT,
+                    user_id INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'open',
+                    created_at INTEGER NOT NULL
+                )
+            """)
+
+            await conn.execute("CREATE INDEX IF NOT EXISTS idx_tracked_at ON tracked_messages(tracked_at)")
+            await conn.execute("CREATE INDEX IF NOT EXISTS idx_relay_created ON relay_messages(created_at)")
+            await conn.execute("CREATE INDEX IF NOT EXISTS idx_spool_next ON notification_spool(next_attempt_at)")
+            await conn.execute("CREATE INDEX IF NOT EXISTS idx_submissions_kind ON submissions(kind, created_at)")
+            await conn.execute("CREATE INDEX IF NOT EXISTS idx_submissions_user ON submissions(user_id, kind, created_at)")
+            await conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_submissions_campaign ON submissions(campaign, user_id) WHERE campaign IS NOT NULL"
+            )
 
             await self._migrate_promo_usage_table(conn)
+            await self._migrate_promo_expiry_ts(conn)
+            await self._migrate_epoch_timestamps(conn)
+            await self._migrate_promo_claims(conn)
+
+            # Индексы под реальные запросы: выдача и планировщик ищут по частичным индексам активных,
+            # история пользователя и очистка истекших - индексы по времени
+            await conn.execute("CREATE INDEX IF NOT EXISTS idx_promo_expiry_ts ON promos(expiry_ts, code)")
+            await self._create_index(
+                conn, "idx_promo_active_expiry", "promos(expiry_ts, code) WHERE active = 1"
+            )
+            await conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_usage_user ON promo_usage(user_id, received_ts, promo_code)"
+            )
+            await conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_code ON promo_usage(promo_code)")
+            # Свободные промокоды: поиск остатка и выдача - поиск по индексу, а не anti-join с promo_usage
+            await self._create_index(
+                conn, "idx_promo_unclaimed", "promos(expiry_ts, code) WHERE active = 1 AND claimed_by IS NULL"
+            )
+            await conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_archive_user ON promo_usage_archive(user_id)")
+            await self._create_persistence_tables(conn)
+
+            await conn.commit()
+
+    async def _create_persistence_tables(self, conn):
+        """Таблицы состояния PTB (user_data, chat_data, состояния ConversationHandler)"""
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS persistence_user_data (
+                user_id INTEGER PRIMARY KEY,
+                data BLOB NOT NULL,
+                updated_at INTEGER NOT NULL
+            )
+        """)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS persistence_chat_data (
+                chat_id INTEGER PRIMARY KEY,
+                data BLOB NOT NULL,
+                updated_at INTEGER NOT NULL
+            )
+        """)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS persistence_conversations (
+                name TEXT NOT NULL,
+                conversation_key TEXT NOT NULL,
+                state BLOB NOT NULL,
+                PRIMARY KEY (name, conversation_key)
+            )
+        """)
 
+    async def init_persistence_tables(self):
+        async with aiosqlite.connect(self.db_path) as conn:
+            await self._create_persistence_tables(conn)
             await conn.commit()
 
     async def _migrate_promo_usage_table(self, conn):
@@ -74,7 +187,8 @@ class Database:
         cursor = await conn.execute("PRAGMA foreign_key_list(promo_usage)")
         foreign_keys = await cursor.fetchall()
 
-        has_promo_fk = any(fk[3] == 'promos' for fk in foreign_keys)
+        # Строка foreign_key_list: (id, seq, table, from, to, ...)
+        has_promo_fk = any(fk[2] == 'promos' for fk in foreign_keys)
 
         if has_promo_fk:
             return
@@ -102,8 +216,134 @@ class Database:
         await conn.execute("DROP TABLE promo_usage")
         await conn.execute("ALTER TABLE promo_usage_new RENAME TO promo_usage")
 
-        await conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_user ON promo_usage(user_id)")
+        await conn.execute("PRAGMA foreign_keys=ON")
+
+    async def _migrate_promo_expiry_ts(self, conn):
+        """Точное время окончания действия промокода (unix time) вместо одной даты"""
+        cursor = await conn.execute("PRAGMA table_info(promos)")
+        columns = [column[1] for column in await cursor.fetchall()]
 
+        if "expiry_date" not in columns:
+            return
+
+        if "expiry_ts" not in columns:
+            await conn.execute("ALTER TABLE promos ADD COLUMN expiry_ts INTEGER")
+
+        # Раньше промокод действовал до конца дня expiry_date - истекает в полночь следующего (местное время)
+        await conn.execute("""
+            UPDATE promos
+            SET expiry_ts = CAST(strftime('%s', expiry_date, '+1 day', 'utc') AS INTEGER)
+            WHERE expiry_ts IS NULL
+        """)
+
+    async def _migrate_epoch_timestamps(self, conn):
+        """Время в таблицах - unix time (UTC) в INTEGER вместо локальной строки strftime"""
+        # Строки 'YYYY-MM-DD HH:MM:SS' записывались в местном времени
+        def epoch(column: str) -> str:
+            return f"COALESCE(CAST(strftime('%s', {column}, 'utc') AS INTEGER), CAST(strftime('%s', 'now') AS INTEGER))"
+
+        await self._rebuild_table(conn, "users", "joined_at", """
+            CREATE TABLE users_new (
+                user_id INTEGER PRIMARY KEY,
+                first_name TEXT NOT NULL,
+                username TEXT,
+                joined_ts INTEGER NOT NULL
+            )
+        """, f"SELECT user_id, first_name, username, {epoch('joined_at')} FROM users")
+
+        await self._rebuild_table(conn, "promos", "created_at", """
+            CREATE TABLE promos_new (
+                code TEXT PRIMARY KEY,
+                expiry_ts INTEGER NOT NULL,
+                created_ts INTEGER NOT NULL,
+                active INTEGER NOT NULL DEFAULT 1
+            )
+        """, f"SELECT code, expiry_ts, {epoch('created_at')}, active FROM promos")
+
+        await self._rebuild_table(conn, "promo_usage", "received_at", """
+            CREATE TABLE promo_usage_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                promo_code TEXT NOT NULL,
+                received_ts INTEGER NOT NULL,
+                FOREIGN KEY (user_id) REFERENCES users(user_id),
+                FOREIGN KEY (promo_code) REFERENCES promos(code) ON DELETE CASCADE,
+                UNIQUE(user_id, promo_code)
+            )
+        """, f"SELECT id, user_id, promo_code, {epoch('received_at')} FROM promo_usage")
+
+        await self._rebuild_table(conn, "promo_usage_archive", "received_at", """
+            CREATE TABLE promo_usage_archive_new (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                promo_code TEXT NOT NULL,
+                received_ts INTEGER NOT NULL,
+                expiry_ts INTEGER NOT NULL,
+                archived_at INTEGER NOT NULL
+            )
+        """, f"""
+            SELECT id, user_id, promo_code, {epoch('received_at')},
+                   {epoch("expiry_date, '+1 day'")}, archived_at
+            FROM promo_usage_archive
+        """)
+
+        await self._rebuild_table(conn, "admins", "added_at", """
+            CREATE TABLE admins_new (
+                user_id INTEGER PRIMARY KEY,
+                first_name TEXT NOT NULL,
+                username TEXT,
+                added_ts INTEGER NOT NULL,
+                added_by INTEGER NOT NULL
+            )
+        """, f"SELECT user_id, first_name, username, {epoch('added_at')}, added_by FROM admins")
+
+    async def _migrate_promo_claims(self, conn):
+        """Кому выдан промокод - прямо в promos (claimed_by/claimed_ts), по первой записи promo_usage"""
+        cursor = await conn.execute("PRAGMA table_info(promos)")
+        columns = [column[1] for column in await cursor.fetchall()]
+
+        if "claimed_by" in columns:
+            return
+
+        await conn.execute("ALTER TABLE promos ADD COLUMN claimed_by INTEGER")
+        await conn.execute("ALTER TABLE promos ADD COLUMN claimed_ts INTEGER")
+        await conn.execute("""
+            UPDATE promos
+            SET (claimed_by, claimed_ts) = (
+                SELECT pu.user_id, pu.received_ts FROM promo_usage pu
+                WHERE pu.promo_code = promos.code
+                ORDER BY pu.received_ts, pu.id
+                LIMIT 1
+            )
+            WHERE EXISTS (SELECT 1 FROM promo_usage pu WHERE pu.promo_code = promos.code)
+        """)
+
+    async def _create_index(self, conn, name: str, definition: str):
+        """Создать индекс; если в старой БД он есть с другим определением - пересоздать"""
+        create_sql = f"CREATE INDEX {name} ON {definition}"
+        cursor = await conn.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = ?", (name,))
+        row = await cursor.fetchone()
+
+        if row and " ".join(row[0].split()) == create_sql:
+            return
+        if row:
+            await conn.execute(f"DROP INDEX {name}")
+        await conn.execute(create_sql)
+
+    async def _rebuild_table(self, conn, table: str, legacy_column: str, create_sql: str, select_sql: str):
+        """Пересоздать таблицу по новой схеме, если в ней еще есть устаревшая колонка"""
+        cursor = await conn.execute(f"PRAGMA table_info({table})")
+        columns = [column[1] for column in await cursor.fetchall()]
+
+        if legacy_column not in columns:
+            return
+
+        await conn.execute("PRAGMA foreign_keys=OFF")
+        await conn.execute(f"DROP TABLE IF EXISTS {table}_new")
+        await conn.execute(create_sql)
+        await conn.execute(f"INSERT INTO {table}_new {select_sql}")
+        await conn.execute(f"DROP TABLE {table}")
+        await conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
         await conn.execute("PRAGMA foreign_keys=ON")
 
     async def add_user(self, user_id: int, first_name: str, username: Optional[str] = None) -> bool:
@@ -112,14 +352,37 @@ class Database:
         async with aiosqlite.connect(self.db_path) as conn:
             try:
                 await conn.execute(
-                    "INSERT INTO users (user_id, first_name, username, joined_at) VALUES (?, ?, ?, ?)",
-                    (user_id, first_name, username, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                    "INSERT INTO users (user_id, first_name, username, joined_ts) VALUES (?, ?, ?, ?)",
+                    (user_id, first_name, username, int(time.time()))
                 )
                 await conn.commit()
                 return True
             except aiosqlite.IntegrityError:
                 return False
 
+    async def get_user_profiles(self) -> List[tuple]:
+        """(user_id, first_name, username) всех пользователей - для реестра в памяти"""
+        async with aiosqlite.connect(self.db_path) as conn:
+            async with conn.execute("SELECT user_id, first_name, username FROM users") as cursor:
+                return list(await cursor.fetchall())
+
+    async def upsert_users_batch(self, rows: List[tuple]):
+        """Добавить пачку пользователей (user_id, first_name, username, joined_ts) одной транзакцией.
+        У существующих обновляются имя и username - только если они изменились"""
+        async with aiosqlite.connect(self.db_path) as conn:
+            await conn.executemany(
+                """
+                INSERT INTO users (user_id, first_name, username, joined_ts) VALUES (?, ?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    first_name = excluded.first_name,
+                    username = excluded.username
+                WHERE users.first_name IS NOT excluded.first_name
+                   OR users.username IS NOT excluded.username
+                """,
+                rows
+            )
+            await conn.commit()
+
     async def get_user(self, user_id: int) -> Optional[dict]:
         async with aiosqlite.connect(self.db_path) as conn:
             conn.row_factory = aiosqlite.Row
@@ -162,12 +425,12 @@ class Database:
                 result = await cursor.fetchone()
                 return result[0]
 
-    async def add_promo(self, code: str, expiry_date: str) -> bool:
+    async def add_promo(self, code: str, expiry_ts: int) -> bool:
         async with aiosqlite.connect(self.db_path) as conn:
             try:
                 await conn.execute(
-                    "INSERT INTO promos (code, expiry_date, created_at, active) VALUES (?, ?, ?, 1)",
-                    (code, expiry_date, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                    "INSERT INTO promos (code, expiry_ts, created_ts, active) VALUES (?, ?, ?, 1)",
+                    (code, expiry_ts, int(time.time()))
                 )
                 await conn.commit()
                 return True
@@ -175,11 +438,11 @@ class Database:
                 return False
 
     async def get_active_promos(self) -> List[dict]:
-        now = datetime.now().strftime("%Y-%m-%d")
+        now = int(time.time())
         async with aiosqlite.connect(self.db_path) as conn:
             conn.row_factory = aiosqlite.Row
             async with conn.execute(
-                "SELECT * FROM promos WHERE active = 1 AND expiry_date >= ? ORDER BY created_at DESC",
+                "SELECT * FROM promos WHERE active = 1 AND expiry_ts > ? ORDER BY created_ts DESC",
                 (now,)
             ) as cursor:
                 rows = await cursor.fetchall()
@@ -188,7 +451,7 @@ class Database:
     async def get_all_promos(self) -> List[dict]:
         async with aiosqlite.connect(self.db_path) as conn:
             conn.row_factory = aiosqlite.Row
-            async with conn.execute("SELECT * FROM promos ORDER BY created_at DESC") as cursor:
+            async with conn.execute("SELECT * FROM promos ORDER BY created_ts DESC") as cursor:
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
 
@@ -198,19 +461,77 @@ class Database:
             await conn.commit()
             return conn.total_changes > 0
 
+    async def get_active_expiry_times(self) -> List[int]:
+        """Различные моменты окончания действия активных промокодов"""
+        async with aiosqlite.connect(self.db_path) as conn:
+            async with conn.execute(
+                "SELECT DISTINCT expiry_ts FROM promos WHERE active = 1"
+            ) as cursor:
+                return [row[0] for row in await cursor.fetchall()]
+
+    async def deactivate_expired_promos(self, now: int, batch_size: int) -> int:
+        """Деактивировать истекшие промокоды пачками по индексу активных"""
+        total = 0
+        async with aiosqlite.connect(self.db_path) as conn:
+            while True:
+                cursor = await conn.execute(
+                    """
+                    UPDATE promos SET active = 0
+                    WHERE rowid IN (
+                        SELECT rowid FROM promos WHERE active = 1 AND expiry_ts <= ? LIMIT ?
+                    )
+                    """,
+                    (now, batch_size)
+                )
+                await conn.commit()
+                total += cursor.rowcount
+                if cursor.rowcount < batch_size:
+                    return total
+
     async def delete_promo(self, code: str) -> bool:
         async with aiosqlite.connect(self.db_path) as conn:
             await conn.execute("DELETE FROM promos WHERE code = ?", (code,))
             await conn.commit()
             return conn.total_changes > 0
 
-    async def record_promo_usage(self, user_id: int, promo_code: str):
+    async def claim_promo(self, user_id: int, candidates: int) -> Optional[dict]:
+        """Атомарно выдать пользователю случайный из первых candidates свободных промокодов
+        по сроку окончания. None - свободных промокодов нет"""
+        now = int(time.time())
         async with aiosqlite.connect(self.db_path) as conn:
-            await conn.execute(
-                "INSERT INTO promo_usage (user_id, promo_code, received_at) VALUES (?, ?, ?)",
-                (user_id, promo_code, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-            )
-            await conn.commit()
+            # Блокировка записи сразу: между выбором и отметкой промокод не выдадут другому
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                async with conn.execute(
+                    """
+                    SELECT code, expiry_ts FROM promos
+                    WHERE active = 1 AND claimed_by IS NULL AND expiry_ts > ?
+                    ORDER BY expiry_ts, code
+                    LIMIT ?
+                    """,
+                    (now, candidates)
+                ) as cursor:
+                    rows = await cursor.fetchall()
+
+                if not rows:
+                    await conn.rollback()
+                    return None
+
+                code, expiry_ts = random.choice(rows)
+                await conn.execute(
+                    "UPDATE promos SET claimed_by = ?, claimed_ts = ? WHERE code = ? AND claimed_by IS NULL",
+                    (user_id, now, code)
+                )
+                await conn.execute(
+                    "INSERT INTO promo_usage (user_id, promo_code, received_ts) VALUES (?, ?, ?)",
+                    (user_id, code, now)
+                )
+                await conn.commit()
+            except BaseException:
+                await conn.rollback()
+                raise
+
+            return {"code": code, "expiry_ts": expiry_ts}
 
     async def check_promo_usage(self, user_id: int, promo_code: str) -> bool:
         async with aiosqlite.connect(self.db_path) as conn:
@@ -225,7 +546,7 @@ class Database:
         async with aiosqlite.connect(self.db_path) as conn:
             conn.row_factory = aiosqlite.Row
             async with conn.execute(
-                "SELECT * FROM promo_usage WHERE user_id = ? ORDER BY received_at DESC",
+                "SELECT * FROM promo_usage WHERE user_id = ? ORDER BY received_ts DESC",
                 (user_id,)
             ) as cursor:
                 rows = await cursor.fetchall()
@@ -248,38 +569,70 @@ class Database:
         async with aiosqlite.connect(self.db_path) as conn:
             conn.row_factory = aiosqlite.Row
             async with conn.execute("""
-                SELECT pu.promo_code, pu.received_at, p.expiry_date
+                SELECT pu.promo_code, pu.received_ts, p.expiry_ts
                 FROM promo_usage pu
                 JOIN promos p ON pu.promo_code = p.code
                 WHERE pu.user_id = ?
-                ORDER BY pu.received_at DESC
+                ORDER BY pu.received_ts DESC
                 LIMIT 1
             """, (user_id,)) as cursor:
                 result = await cursor.fetchone()
                 if result:
                     return {
                         "code": result["promo_code"],
-                        "received_at": result["received_at"],
-                        "expiry_date": result["expiry_date"]
+                        "received_ts": result["received_ts"],
+                        "expiry_ts": result["expiry_ts"]
                     }
                 return None
 
     async def get_unused_active_promos(self) -> List[dict]:
-        now = datetime.now().strftime("%Y-%m-%d")
+        """Свободные промокоды по сроку окончания; поиск по индексу idx_promo_unclaimed"""
+        now = int(time.time())
         async with aiosqlite.connect(self.db_path) as conn:
             conn.row_factory = aiosqlite.Row
             async with conn.execute("""
-                SELECT p.code, p.expiry_date, p.created_at
-                FROM promos p
-                LEFT JOIN promo_usage pu ON p.code = pu.promo_code
-                WHERE p.active = 1
-                  AND p.expiry_date >= ?
-                  AND pu.promo_code IS NULL
-                ORDER BY p.created_at DESC
+                SELECT code, expiry_ts FROM promos
+                WHERE active = 1 AND claimed_by IS NULL AND expiry_ts > ?
+                ORDER BY expiry_ts
             """, (now,)) as cursor:
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
 
+    async def has_unused_active_promos(self) -> bool:
+        now = int(time.time())
+        async with aiosqlite.connect(self.db_path) as conn:
+            async with conn.execute(
+                "SELECT 1 FROM promos WHERE active = 1 AND claimed_by IS NULL AND expiry_ts > ? LIMIT 1",
+                (now,)
+            ) as cursor:
+                return await cursor.fetchone() is not None
+
+    async def count_unused_active_promos(self) -> int:
+        now = int(time.time())
+        async with aiosqlite.connect(self.db_path) as conn:
+            async with conn.execute(
+                "SELECT COUNT(*) FROM promos WHERE active = 1 AND claimed_by IS NULL AND expiry_ts > ?",
+                (now,)
+            ) as cursor:
+                return (await cursor.fetchone())[0]
+
+    async def get_promo_stats(self) -> Dict[str, int]:
+        """Счетчики для экрана статистики без выборки самих промокодов"""
+        now = int(time.time())
+        async with aiosqlite.connect(self.db_path) as conn:
+            async with conn.execute(
+                """
+                SELECT
+                    (SELECT COUNT(*) FROM promos),
+                    (SELECT COUNT(*) FROM promos WHERE active = 1),
+                    (SELECT COUNT(*) FROM promos WHERE active = 1 AND claimed_by IS NULL AND expiry_ts > ?),
+                    (SELECT COUNT(*) FROM promo_usage)
+                """,
+                (now,)
+            ) as cursor:
+                total, active, unused, issued = await cursor.fetchone()
+                return {"total": total, "active": active, "unused": unused, "issued": issued}
+
     async def get_promo_usage_with_users(self) -> List[dict]:
         async with aiosqlite.connect(self.db_path) as conn:
             conn.row_factory = aiosqlite.Row
@@ -289,12 +642,12 @@ class Database:
                     pu.user_id,
                     u.first_name,
                     u.username,
-                    pu.received_at,
-                    p.expiry_date
+                    pu.received_ts,
+                    p.expiry_ts
                 FROM promo_usage pu
                 JOIN users u ON pu.user_id = u.user_id
                 JOIN promos p ON pu.promo_code = p.code
-                ORDER BY pu.received_at DESC
+                ORDER BY pu.received_ts DESC
             """) as cursor:
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
@@ -311,8 +664,8 @@ class Database:
         async with aiosqlite.connect(self.db_path) as conn:
             try:
                 await conn.execute(
-                    "INSERT INTO admins (user_id, first_name, username, added_at, added_by) VALUES (?, ?, ?, ?, ?)",
-                    (user_id, first_name, username, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), added_by)
+                    "INSERT INTO admins (user_id, first_name, username, added_ts, added_by) VALUES (?, ?, ?, ?, ?)",
+                    (user_id, first_name, username, int(time.time()), added_by)
                 )
                 await conn.commit()
                 return True
@@ -336,7 +689,7 @@ class Database:
     async def get_all_admins(self) -> List[dict]:
         async with aiosqlite.connect(self.db_path) as conn:
             conn.row_factory = aiosqlite.Row
-            async with conn.execute("SELECT * FROM admins ORDER BY added_at DESC") as cursor:
+            async with conn.execute("SELECT * FROM admins ORDER BY added_ts DESC") as cursor:
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
 
@@ -349,16 +702,272 @@ class Database:
                 row = await cursor.fetchone()
                 return dict(row) if row else None
 
-    async def delete_expired_promos(self) -> int:
-        now = datetime.now().strftime("%Y-%m-%d")
+    async def delete_expired_promos(self, now: int, batch_size: int, pause: float) -> int:
+        """Удалить истекшие промокоды небольшими транзакциями, перенося историю выдачи в архив.
+        Между пачками блокировка записи отпускается, чтобы выдача промокодов не ждала очистку."""
+        total = 0
         async with aiosqlite.connect(self.db_path) as conn:
-            cursor = await conn.execute(
-                "DELETE FROM promos WHERE expiry_date < ?",
-                (now,)
+            while True:
+                async with conn.execute(
+                    "SELECT code FROM promos WHERE expiry_ts <= ? LIMIT ?",
+                    (now, batch_size)
+                ) as cursor:
+                    rows = await cursor.fetchall()
+                if not rows:
+                    return total
+
+                codes = [row[0] for row in rows]
+                placeholders = ",".join("?" * len(codes))
+                await conn.execute(
+                    f"""
+                    INSERT OR IGNORE INTO promo_usage_archive
+                        (id, user_id, promo_code, received_ts, expiry_ts, archived_at)
+                    SELECT pu.id, pu.user_id, pu.promo_code, pu.received_ts, p.expiry_ts, ?
+                    FROM promo_usage pu
+                    JOIN promos p ON p.code = pu.promo_code
+                    WHERE pu.promo_code IN ({placeholders})
+                    """,
+                    (int(time.time()), *codes)
+                )
+                await conn.execute(f"DELETE FROM promo_usage WHERE promo_code IN ({placeholders})", codes)
+                await conn.execute(f"DELETE FROM promos WHERE code IN ({placeholders})", codes)
+                await conn.commit()
+                total += len(codes)
+
+                if len(rows) < batch_size:
+                    return total
+                await asyncio.sleep(pause)
+
+    async def get_tracked_messages(self, since_ts: int, limit: int) -> List[tuple]:
+        """Самые свежие отслеживаемые сообщения меню (старые первыми - порядок LRU)"""
+        async with aiosqlite.connect(self.db_path) as conn:
+            async with conn.execute(
+                """
+                SELECT chat_id, message_ids, tracked_at FROM (
+                    SELECT chat_id, message_ids, tracked_at FROM tracked_messages
+                    WHERE tracked_at >= ?
+                    ORDER BY tracked_at DESC
+                    LIMIT ?
+                ) ORDER BY tracked_at ASC
+                """,
+                (since_ts, limit)
+            ) as cursor:
+                return list(await cursor.fetchall())
+
+    async def save_tracked_messages(self, rows: List[tuple], expired_before: int):
+        """Сохранить пачку (chat_id, message_ids, tracked_at) и удалить устаревшие записи"""
+        async with aiosqlite.connect(self.db_path) as conn:
+            if rows:
+                await conn.executemany(
+                    """
+                    INSERT INTO tracked_messages (chat_id, message_ids, tracked_at) VALUES (?, ?, ?)
+                    ON CONFLICT(chat_id) DO UPDATE SET
+                        message_ids = excluded.message_ids,
+                        tracked_at = excluded.tracked_at
+                    """,
+                    rows
+                )
+            await conn.execute("DELETE FROM tracked_messages WHERE tracked_at < ?", (expired_before,))
+            await conn.commit()
+
+    async def save_relay_message(self, chat_id: int, message_id: int, user_id: int):
+        """Запомнить, от какого пользователя пришло пересланное админу сообщение"""
+        async with aiosqlite.connect(self.db_path) as conn:
+            await conn.execute(
+                "INSERT OR REPLACE INTO relay_messages (chat_id, message_id, user_id, created_at) VALUES (?, ?, ?, ?)",
+                (chat_id, message_id, user_id, int(time.time()))
             )
             await conn.commit()
+
+    async def get_relay_user(self, chat_id: int, message_id: int) -> Optional[int]:
+        async with aiosqlite.connect(self.db_path) as conn:
+            async with conn.execute(
+                "SELECT user_id FROM relay_messages WHERE chat_id = ? AND message_id = ?",
+                (chat_id, message_id)
+            ) as cursor:
+                row = await cursor.fetchone()
+                return row[0] if row else None
+
+    async def delete_expired_relay_messages(self, expired_before: int) -> int:
+        async with aiosqlite.connect(self.db_path) as conn:
+            cursor = await conn.execute("DELETE FROM relay_messages WHERE created_at < ?", (expired_before,))
+            await conn.commit()
             return cursor.rowcount
 
+    async def get_due_notifications(self, now: int, limit: int) -> List[dict]:
+        """Уведомления, которые пора отправить (в порядке поступления)"""
+        async with aiosqlite.connect(self.db_path) as conn:
+            conn.row_factory = aiosqlite.Row
+            async with conn.execute(
+                """
+                SELECT id, chat_id, user_id, text, attempts FROM notification_spool
+                WHERE next_attempt_at <= ?
+                ORDER BY id
+                LIMIT ?
+                """,
+                (now, limit)
+            ) as cursor:
+                return [dict(row) for row in await cursor.fetchall()]
+
+    async def get_notification_spool_state(self) -> tuple[int, Optional[int]]:
+        """Размер очереди уведомлений и время ближайшей попытки отправки"""
+        async with aiosqlite.connect(self.db_path) as conn:
+            async with conn.execute("SELECT COUNT(*), MIN(next_attempt_at) FROM notification_spool") as cursor:
+                count, next_attempt_at = await cursor.fetchone()
+                return count, next_attempt_at
+
+    async def delete_notifications(self, ids: List[int]):
+        async with aiosqlite.connect(self.db_path) as conn:
+            await conn.executemany("DELETE FROM notification_spool WHERE id = ?", [(i,) for i in ids])
+            await conn.commit()
+
+    async def reschedule_notifications(self, ids: List[int], next_attempt_at: int):
+        async with aiosqlite.connect(self.db_path) as conn:
+            await conn.executemany(
+                "UPDATE notification_spool SET attempts = attempts + 1, next_attempt_at = ? WHERE id = ?",
+                [(next_attempt_at, i) for i in ids]
+            )
+            await conn.commit()
+
+    async def save_submissions_batch(self, rows: List[tuple], notification_chat_id: int):
+        """Сохранить пачку заявок (kind, campaign, user_id, text, created_at, notification_text)
+        и поставить уведомления о них в очередь - одной транзакцией"""
+        async with aiosqlite.connect(self.db_path) as conn:
+            await conn.executemany(
+                "INSERT INTO submissions (kind, campaign, user_id, text, created_at) VALUES (?, ?, ?, ?, ?)",
+                [row[:5] for row in rows]
+            )
+            await conn.executemany(
+                "INSERT INTO notification_spool (chat_id, user_id, text, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(notification_chat_id, user_id, notification_text, created_at, created_at)
+                 for _, _, user_id, _, created_at, notification_text in rows]
+            )
+            await conn.commit()
+
+    async def get_recent_submitters(self, since_ts: int) -> List[tuple]:
+        """(user_id, kind, время последней заявки) за окно защиты от повторов"""
+        async with aiosqlite.connect(self.db_path) as conn:
+            async with conn.execute(
+                "SELECT user_id, kind, MAX(created_at) FROM submissions WHERE created_at >= ? GROUP BY user_id, kind",
+                (since_ts,)
+            ) as cursor:
+                return list(await cursor.fetchall())
+
+    async def get_submission_counts(self, since_ts: int) -> Dict[str, int]:
+        """Количество заявок каждого вида с момента since_ts"""
+        async with aiosqlite.connect(self.db_path) as conn:
+            async with conn.execute(
+                "SELECT kind, COUNT(*) FROM submissions WHERE created_at >= ? GROUP BY kind",
+                (since_ts,)
+            ) as cursor:
+                return {kind: count for kind, count in await cursor.fetchall()}
+
+    async def get_open_submissions(self, kind: str, since_ts: int, limit: int) -> List[dict]:
+        async with aiosqlite.connect(self.db_path) as conn:
+            conn.row_factory = aiosqlite.Row
+            async with conn.execute(
+                """
+                SELECT s.id, s.user_id, s.text, s.created_at, u.first_name, u.username
+                FROM submissions s
+                LEFT JOIN users u ON u.user_id = s.user_id
+                WHERE s.kind = ? AND s.created_at >= ? AND s.status = 'open'
+                ORDER BY s.created_at DESC
+                LIMIT ?
+                """,
+                (kind, since_ts, limit)
+            ) as cursor:
+                return [dict(row) for row in await cursor.fetchall()]
+
+    async def close_submission(self, submission_id: int) -> bool:
+        """Отметить заявку обработанной - она пропадает из списка открытых"""
+        async with aiosqlite.connect(self.db_path) as conn:
+            await conn.execute(
+                "UPDATE submissions SET status = 'closed' WHERE id = ? AND status = 'open'",
+                (submission_id,)
+            )
+            await conn.commit()
+            return conn.total_changes > 0
+
+    async def get_campaign_stats(self) -> List[tuple]:
+        """(кампания, заявок, уникальных участников) по всем розыгрышам"""
+        async with aiosqlite.connect(self.db_path) as conn:
+            async with conn.execute(
+                """
+                SELECT campaign, COUNT(*), COUNT(DISTINCT user_id) FROM submissions
+                WHERE campaign IS NOT NULL
+                GROUP BY campaign
+                ORDER BY MAX(created_at) DESC
+                """
+            ) as cursor:
+                return list(await cursor.fetchall())
+
+    async def get_persistent_data(self, table: str, key_column: str, key: int) -> Optional[bytes]:
+        async with aiosqlite.connect(self.db_path) as conn:
+            async with conn.execute(
+                f"SELECT data FROM {table} WHERE {key_column} = ?", (key,)
+            ) as cursor:
+                row = await cursor.fetchone()
+                return row[0] if row else None
+
+    async def get_persistent_conversations(self, name: str) -> List[tuple]:
+        async with aiosqlite.connect(self.db_path) as conn:
+            async with conn.execute(
+                "SELECT conversation_key, state FROM persistence_conversations WHERE name = ?", (name,)
+            ) as cursor:
+                return list(await cursor.fetchall())
+
+    async def save_persistence_batch(
+        self,
+        user_rows: List[tuple],
+        user_deletes: List[int],
+        chat_rows: List[tuple],
+        chat_deletes: List[int],
+        conversation_rows: List[tuple],
+        conversation_deletes: List[tuple]
+    ):
+        """Записать накопленные изменения состояния PTB одной транзакцией"""
+        async with aiosqlite.connect(self.db_path) as conn:
+            if user_rows:
+                await conn.executemany(
+                    """
+                    INSERT INTO persistence_user_data (user_id, data, updated_at) VALUES (?, ?, ?)
+                    ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+                    """,
+                    user_rows
+                )
+            if user_deletes:
+                await conn.executemany(
+                    "DELETE FROM persistence_user_data WHERE user_id = ?",
+                    [(user_id,) for user_id in user_deletes]
+                )
+            if chat_rows:
+                await conn.executemany(
+                    """
+                    INSERT INTO persistence_chat_data (chat_id, data, updated_at) VALUES (?, ?, ?)
+                    ON CONFLICT(chat_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+                    """,
+                    chat_rows
+                )
+            if chat_deletes:
+                await conn.executemany(
+                    "DELETE FROM persistence_chat_data WHERE chat_id = ?",
+                    [(chat_id,) for chat_id in chat_deletes]
+                )
+            if conversation_rows:
+                await conn.executemany(
+                    """
+                    INSERT INTO persistence_conversations (name, conversation_key, state) VALUES (?, ?, ?)
+                    ON CONFLICT(name, conversation_key) DO UPDATE SET state = excluded.state
+                    """,
+                    conversation_rows
+                )
+            if conversation_deletes:
+                await conn.executemany(
+                    "DELETE FROM persistence_conversations WHERE name = ? AND conversation_key = ?",
+                    conversation_deletes
+                )
+            await conn.commit()
+
 
 # Создаём экземпляр базы данных
 db = Database()
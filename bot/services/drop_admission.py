@@ -0,0 +1,326 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+
+from telegram import Update, InlineKeyboardMarkup
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes
+
+from bot.config import (
+    DROP_MAX_CONCURRENCY,
+    DROP_CLAIMS_PER_SECOND,
+    DROP_MAX_QUEUE,
+    DROP_POSITION_UPDATE_SECONDS,
+    DROP_POSITION_UPDATES_PER_TICK
+)
+from bot.constants import DROP_QUEUED_MESSAGE, DROP_SOLD_OUT_MESSAGE, DROP_BUSY_MESSAGE
+from bot.services.database import db
+from bot.services.rate_governor import TokenBucket, PRIORITY_BULK
+from bot.middleware.update_processor import update_processor
+
+logger = logging.getLogger(__name__)
+
+ClaimHandler = Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[Any]]
+
+# Обновления позиции в очереди уступают выдаче промокодов
+POSITION_RATE_LIMIT = {"priority": PRIORITY_BULK}
+# Сколько при остановке ждать отправки начатых правок сообщений
+SHUTDOWN_TIMEOUT_SECONDS = 5
+
+TURN_GO = "go"
+TURN_SOLD_OUT = "sold_out"
+TURN_CLOSED = "closed"
+
+
+class DropAdmission:
+    """Режим дропа: очередь к кнопке промокода, когда после анонса ее нажимают тысячи человек.
+
+    Одновременно обрабатывается не больше max_concurrency нажатий и не больше claims_per_second
+    в секунду, остальные ждут в очереди (FIFO) и видят свой номер в том же сообщении.
+    Нажатие ждет своей очереди внутри обработки исходного обновления (слот выполнения на это
+    время отдается другим пользователям), поэтому выдача идет в общем порядке обновлений
+    пользователя, а изменения user_data сохраняются как обычно.
+    Остаток промокодов держится в памяти: когда он кончается, ожидающие и новые нажатия
+    сразу получают "промокоды закончились" без обращения к БД."""
+
+    def __init__(
+        self,
+        max_concurrency: int = DROP_MAX_CONCURRENCY,
+        claims_per_second: float = DROP_CLAIMS_PER_SECOND,
+        max_queue: int = DROP_MAX_QUEUE,
+        position_update_seconds: float = DROP_POSITION_UPDATE_SECONDS,
+        position_updates_per_tick: int = DROP_POSITION_UPDATES_PER_TICK
+    ):
+        self.max_concurrency = max_concurrency
+        self.claims_per_second = claims_per_second
+        self.max_queue = max_queue
+        self.position_update_seconds = position_update_seconds
+        self.position_updates_per_tick = position_updates_per_tick
+        self.enabled = False
+        # Остаток неиспользованных промокодов (None - неизвестен, режим выключен)
+        self.stock: Optional[int] = None
+        # (user_id, update, future с решением: TURN_GO / TURN_SOLD_OUT / TURN_CLOSED)
+        self._queue: deque[tuple[int, Update, asyncio.Future]] = deque()
+        # Пользователи в очереди или в обработке - повторное нажатие не ставит их в очередь снова
+        self._admitted_users: set[int] = set()
+        # Номер в очереди, который пользователь видит сейчас
+        self._shown_positions: dict[int, int] = {}
+        self._position_edits: dict[int, asyncio.Task] = {}
+        # Фоновые задачи (правки сообщений, пересчет остатка) - чтобы их не собрал GC и их можно было дождаться
+        self._tasks: set[asyncio.Task] = set()
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._bucket = TokenBucket(claims_per_second, claims_per_second)
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._position_updater: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.in_progress = 0
+        self.admitted = 0
+        self.served = 0
+        self.sold_out_answers = 0
+        self.rejected = 0
+
+    async def enable(self):
+        self.enabled = True
+        await self.refresh_stock()
+        logger.info(f"Режим дропа включен, промокодов в наличии: {self.stock}")
+
+    def disable(self):
+        """Новые нажатия обрабатываются как обычно, уже стоящие в очереди дообслуживаются"""
+        self.enabled = False
+        logger.info("Режим дропа выключен")
+
+    async def refresh_stock(self):
+        if self.enabled:
+            self.stock = await db.count_unused_active_promos()
+
+    def invalidate(self):
+        """Промокоды добавлены или удалены - пересчитать остаток"""
+        if self.enabled and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = self._track(self.refresh_stock())
+
+    def consume(self):
+        """Промокод выдан"""
+        if self.stock:
+            self.stock -= 1
+
+    def mark_sold_out(self):
+        """БД сообщила, что свободных промокодов нет"""
+        if self.enabled:
+            self.stock = 0
+
+    async def admit(
+        self,
+        update: Update,
+        context: ContextTypes.DEFAULT_TYPE,
+        handler: ClaimHandler,
+        back_markup: InlineKeyboardMarkup
+    ):
+        """Пропустить нажатие к handler сразу или дождаться своей очереди"""
+        if not self.enabled and not self._queue:
+            return await handler(update, context)
+
+        user_id = update.effective_user.id
+        if self.stock == 0:
+            self.sold_out_answers += 1
+            await self._edit(update, DROP_SOLD_OUT_MESSAGE, back_markup)
+            return
+
+        if user_id in self._admitted_users:
+            return
+
+        if len(self._queue) >= self.max_queue:
+            self.rejected += 1
+            await self._edit(update, DROP_BUSY_MESSAGE, back_markup)
+            return
+
+        self.admitted += 1
+        self._admitted_users.add(user_id)
+        try:
+            # Очереди нет и есть свободный слот - обрабатываем сразу, без сообщения о номере
+            if not self._queue and not self._slots.locked() and self._bucket.time_until_available() == 0:
+                self._bucket.reserve()
+                await self._slots.acquire()
+            else:
+                turn = await self._wait_turn(user_id, update)
+                if turn != TURN_GO:
+                    if turn == TURN_SOLD_OUT:
+                        await self._edit_after(self._position_edits.pop(user_id, None), update, DROP_SOLD_OUT_MESSAGE, back_markup)
+                    return
+
+            await self._process(user_id, update, context, handler)
+        finally:
+            self._admitted_users.discard(user_id)
+            self._shown_positions.pop(user_id, None)
+            self._position_edits.pop(user_id, None)
+
+    async def _wait_turn(self, user_id: int, update: Update) -> str:
+        """Встать в очередь и дождаться решения диспетчера. При TURN_GO слот уже занят за нами"""
+        turn = asyncio.get_running_loop().create_future()
+        entry = (user_id, update, turn)
+        self._queue.append(entry)
+        position = len(self._queue)
+        self._shown_positions[user_id] = position
+        # Обработка дождется этой правки, чтобы номер не перезаписал результат выдачи
+        self._position_edits[user_id] = self._track(
+            self._edit(update, DROP_QUEUED_MESSAGE.format(position=position))
+        )
+        self._ensure_running()
+        self._wakeup.set()
+
+        try:
+            # Пока ждем, слот выполнения обработчиков нужнее другим пользователям
+            async with update_processor.yield_slot():
+                return await turn
+        except asyncio.CancelledError:
+            if turn.done() and not turn.cancelled() and turn.result() == TURN_GO:
+                self._slots.release()
+            else:
+                turn.cancel()
+                try:
+                    self._queue.remove(entry)
+                except ValueError:
+                    pass
+            raise
+
+    def _track(self, coroutine) -> asyncio.Task:
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _ensure_running(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        if self._position_updater is None or self._position_updater.done():
+            self._position_updater = asyncio.create_task(self._update_positions())
+
+    async def _dispatch(self):
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            if self.stock == 0:
+                self._resolve_all(TURN_SOLD_OUT)
+                continue
+
+            await self._slots.acquire()
+            delay = self._bucket.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            if not self._queue or self.stock == 0:
+                self._slots.release()
+                continue
+
+            user_id, _, turn = self._queue.popleft()
+            self._shown_positions.pop(user_id, None)
+            if turn.done():
+                # Ожидание отменено - слот достается следующему
+                self._slots.release()
+                continue
+            turn.set_result(TURN_GO)
+
+    async def _process(self, user_id: int, update: Update, context: ContextTypes.DEFAULT_TYPE, handler: ClaimHandler):
+        self.in_progress += 1
+        try:
+            # Дождаться отправленного обновления номера, иначе оно может прийти после результата
+            position_edit = self._position_edits.pop(user_id, None)
+            if position_edit:
+                await asyncio.wait([position_edit])
+            await handler(update, context)
+            self.served += 1
+        except Exception as e:
+            logger.error(f"Ошибка обработки нажатия пользователя {user_id} в режиме дропа: {e}")
+        finally:
+            self.in_progress -= 1
+            self._slots.release()
+
+    def _resolve_all(self, decision: str):
+        while self._queue:
+            user_id, _, turn = self._queue.popleft()
+            self._shown_positions.pop(user_id, None)
+            if not turn.done():
+                if decision == TURN_SOLD_OUT:
+                    self.sold_out_answers += 1
+                turn.set_result(decision)
+
+    async def _edit_after(self, previous: Optional[asyncio.Task], update: Update, text: str, reply_markup: InlineKeyboardMarkup):
+        if previous:
+            await asyncio.wait([previous])
+        await self._edit(update, text, reply_markup)
+
+    async def _update_positions(self):
+        """Периодически обновлять номер в очереди: сначала тем, у кого он изменился заметнее"""
+        while self._queue:
+            await asyncio.sleep(self.position_update_seconds)
+
+            changed = []
+            for position, (user_id, update, _) in enumerate(self._queue, 1):
+                shown = self._shown_positions.get(user_id)
+                if shown is not None and shown != position and (shown - position) * 5 >= shown:
+                    changed.append((position, user_id, update))
+                    if len(changed) >= self.position_updates_per_tick:
+                        break
+
+            for position, user_id, update in changed:
+                self._shown_positions[user_id] = position
+                self._position_edits[user_id] = self._track(
+                    self._edit(update, DROP_QUEUED_MESSAGE.format(position=position))
+                )
+
+    async def _edit(self, update: Update, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None):
+        """Показать статус в сообщении, на кнопку которого нажал пользователь"""
+        query = update.callback_query
+        try:
+            if query.message and query.message.photo:
+                await query.edit_message_caption(
+                    caption=text,
+                    reply_markup=reply_markup,
+                    rate_limit_args=POSITION_RATE_LIMIT
+                )
+            else:
+                await query.edit_message_text(
+                    text=text,
+                    reply_markup=reply_markup,
+                    rate_limit_args=POSITION_RATE_LIMIT
+                )
+        except BadRequest as e:
+            if "message is not modified" not in str(e).lower():
+                logger.debug(f"Не удалось обновить сообщение очереди дропа: {e}")
+        except Exception as e:
+            logger.debug(f"Не удалось обновить сообщение очереди дропа: {e}")
+
+    async def shutdown(self):
+        for task in (self._dispatcher, self._position_updater):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+
+        # Ожидающие в очереди больше не будут обслужены
+        self._resolve_all(TURN_CLOSED)
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=SHUTDOWN_TIMEOUT_SECONDS)
+            for task in set(self._tasks):
+                task.cancel()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "stock": self.stock,
+            "queued": len(self._queue),
+            "in_progress": self.in_progress,
+            "admitted": self.admitted,
+            "served": self.served,
+            "sold_out": self.sold_out_answers,
+            "rejected": self.rejected
+        }
+
+
+drop_admission = DropAdmission()
\ No newline at end of file
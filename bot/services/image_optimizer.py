@@ -0,0 +1,112 @@
+import os
+import io
+import asyncio
+import hashlib
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from bot.config import MEDIA_CACHE_DIR, MENU_PHOTO_MAX_SIDE, MENU_PHOTO_TARGET_BYTES
+
+logger = logging.getLogger(__name__)
+
+JPEG_QUALITY_STEPS = (85, 80, 75, 70, 65, 60, 50)
+
+
+class ImageOptimizer:
+    """Подготовка фото меню к загрузке: уменьшение до оптимального для Telegram размера
+    и перекодирование в progressive JPEG. Результаты кешируются по хешу содержимого."""
+
+    def __init__(
+        self,
+        cache_dir: str = MEDIA_CACHE_DIR,
+        max_side: int = MENU_PHOTO_MAX_SIDE,
+        target_bytes: int = MENU_PHOTO_TARGET_BYTES,
+        max_workers: int = 2
+    ):
+        self.cache_dir = cache_dir
+        self.max_side = max_side
+        self.target_bytes = target_bytes
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-optimizer")
+
+    async def optimize(self, photo_path: str) -> Optional[str]:
+        """Путь к оптимизированной копии фото (None - загружать оригинал)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._optimize, photo_path)
+
+    def _optimize(self, photo_path: str) -> Optional[str]:
+        try:
+            from PIL import Image, ImageOps
+        except ImportError:
+            logger.warning("Pillow не установлен, фото меню загружаются без оптимизации")
+            return None
+
+        try:
+            with open(photo_path, 'rb') as f:
+                content = f.read()
+
+            digest = hashlib.sha256(content).hexdigest()
+            derivative_path = os.path.join(self.cache_dir, f"{digest}.jpg")
+            if os.path.exists(derivative_path):
+                return derivative_path
+
+            with Image.open(io.BytesIO(content)) as img:
+                if (
+                    img.format == "JPEG"
+                    and max(img.size) <= self.max_side
+                    and len(content) <= self.target_bytes
+                ):
+                    return None
+
+                img = ImageOps.exif_transpose(img)
+                if img.mode in ("RGBA", "LA", "P"):
+                    img = img.convert("RGBA")
+                    background = Image.new("RGB", img.size, (255, 255, 255))
+                    background.paste(img, mask=img.getchannel("A"))
+                    img = background
+                elif img.mode != "RGB":
+                    img = img.convert("RGB")
+
+                img.thumbnail((self.max_side, self.max_side), Image.Resampling.LANCZOS)
+
+                data = b""
+                for quality in JPEG_QUALITY_STEPS:
+                    buffer = io.BytesIO()
+                    img.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+                    data = buffer.getvalue()
+                    if len(data) <= self.target_bytes:
+                        break
+
+            self._write_atomic(derivative_path, data)
+            logger.info(
+                f"Фото {os.path.basename(photo_path)} оптимизировано: "
+                f"{len(content) // 1024} КБ -> {len(data) // 1024} КБ"
+            )
+            return derivative_path
+
+        except Exception as e:
+            logger.error(f"Ошибка оптимизации фото {photo_path}: {e}")
+            return None
+
+    def _write_atomic(self, path: str, data: bytes):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix='.tmp', delete=False) as f:
+            tmp_path = f.name
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def prune(self, keep_paths: set[str]):
+        """Удалить копии, которые больше не соответствуют ни одному фото меню"""
+        try:
+            with os.scandir(self.cache_dir) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.path not in keep_paths:
+                        os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.debug(f"Не удалось очистить кеш оптимизированных фото: {e}")
+
+
+image_optimizer = ImageOptimizer()
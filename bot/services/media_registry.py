@@ -0,0 +1,136 @@
+import os
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from bot.config import MENU_PHOTOS_DIR, MENU_PHOTO_KEYS, MENU_PHOTO_EXTENSIONS
+from bot.services.image_optimizer import image_optimizer
+
+logger = logging.getLogger(__name__)
+
+MAX_PHOTO_SIZE_BYTES = 10 * 1024 * 1024
+MAX_PHOTO_SIDE_PX = 10000
+MAX_PHOTO_ASPECT_RATIO = 20
+
+
+@dataclass(frozen=True)
+class MenuPhoto:
+    key: str
+    path: str
+    size: int
+    mtime: float
+    upload_path: str
+    is_valid: bool
+    error: Optional[str] = None
+
+
+def validate_photo(photo_path: str, file_size: int) -> tuple[bool, Optional[str]]:
+    """Проверка фото на соответствие ограничениям Telegram Bot API"""
+    if file_size > MAX_PHOTO_SIZE_BYTES:
+        return False, f"Размер файла {file_size / 1024 / 1024:.2f} МБ превышает лимит 10 МБ"
+
+    try:
+        from PIL import Image
+        with Image.open(photo_path) as img:
+            width, height = img.size
+
+            if width > MAX_PHOTO_SIDE_PX or height > MAX_PHOTO_SIDE_PX:
+                return False, f"Разрешение {width}x{height} превышает лимит {MAX_PHOTO_SIDE_PX}px"
+
+            ratio = max(width, height) / min(width, height)
+            if ratio > MAX_PHOTO_ASPECT_RATIO:
+                return False, f"Соотношение сторон {ratio:.1f}:1 превышает лимит {MAX_PHOTO_ASPECT_RATIO}:1"
+
+        return True, None
+
+    except ImportError:
+        logger.warning("Pillow не установлен, пропуск валидации размерности изображения")
+        return True, None
+    except Exception as e:
+        logger.error(f"Ошибка валидации изображения {photo_path}: {e}")
+        return False, f"Ошибка валидации: {e}"
+
+
+class MediaRegistry:
+    """Реестр фото меню: файлы ищутся, проверяются и stat-ятся только при сканировании
+    каталога, обработчики читают готовое состояние из памяти."""
+
+    def __init__(self, media_dir: str = MENU_PHOTOS_DIR):
+        self.media_dir = media_dir
+        self._photos: dict[str, MenuPhoto] = {}
+
+    def get(self, photo_key: str) -> Optional[MenuPhoto]:
+        return self._photos.get(photo_key)
+
+    def all(self) -> list[MenuPhoto]:
+        return list(self._photos.values())
+
+    def _scan(self) -> dict[str, tuple[str, int, float]]:
+        try:
+            with os.scandir(self.media_dir) as entries:
+                files = {entry.name: entry for entry in entries if entry.is_file()}
+        except OSError as e:
+            logger.error(f"Не удалось прочитать каталог фото меню {self.media_dir}: {e}")
+            return {}
+
+        found = {}
+        for key in MENU_PHOTO_KEYS:
+            entry = next(
+                (files[f"{key}{ext}"] for ext in MENU_PHOTO_EXTENSIONS if f"{key}{ext}" in files),
+                None
+            )
+            if entry is not None:
+                stat = entry.stat()
+                found[key] = (entry.path, stat.st_size, stat.st_mtime)
+
+        return found
+
+    async def _prepare(self, key: str, path: str, size: int, mtime: float) -> MenuPhoto:
+        upload_path = await image_optimizer.optimize(path) or path
+        upload_size = size if upload_path == path else os.path.getsize(upload_path)
+        is_valid, error = await asyncio.to_thread(validate_photo, upload_path, upload_size)
+        return MenuPhoto(
+            key=key,
+            path=path,
+            size=size,
+            mtime=mtime,
+            upload_path=upload_path,
+            is_valid=is_valid,
+            error=error
+        )
+
+    async def refresh(self) -> list[str]:
+        """Пересканировать каталог в рабочем потоке. Возвращает ключи изменившихся фото"""
+        found = await asyncio.to_thread(self._scan)
+
+        photos = {}
+        for key, (path, size, mtime) in found.items():
+            previous = self._photos.get(key)
+            if previous and (previous.path, previous.size, previous.mtime) == (path, size, mtime):
+                photos[key] = previous
+            else:
+                photos[key] = await self._prepare(key, path, size, mtime)
+
+        changed = [
+            key for key in set(photos) | set(self._photos)
+            if photos.get(key) is not self._photos.get(key)
+        ]
+        self._photos = photos
+
+        for key in changed:
+            photo = photos.get(key)
+            if photo is None:
+                logger.info(f"Фото меню {key} удалено")
+            elif photo.is_valid:
+                logger.info(f"Фото меню {key} обновлено: {os.path.basename(photo.path)}")
+            else:
+                logger.warning(f"Фото меню {key} не прошло валидацию: {photo.error}")
+
+        if changed:
+            await asyncio.to_thread(image_optimizer.prune, {photo.upload_path for photo in photos.values()})
+
+        return changed
+
+
+media_registry = MediaRegistry()
@@ -0,0 +1,177 @@
+import time
+import asyncio
+import logging
+from typing import Optional
+
+from telegram import Bot
+from telegram.constants import MessageLimit
+from telegram.error import BadRequest
+
+from bot.config import (
+    NOTIFICATION_CHAT_ID,
+    NOTIFICATION_DIGEST_THRESHOLD,
+    NOTIFICATION_DIGEST_MAX_ITEMS,
+    NOTIFICATION_RETRY_BASE_SECONDS,
+    NOTIFICATION_RETRY_MAX_SECONDS
+)
+from bot.services.database import db
+from bot.services.rate_governor import PRIORITY_NOTIFICATION
+
+logger = logging.getLogger(__name__)
+
+# Уведомления в канал уступают очередь ответам пользователям
+NOTIFICATION_RATE_LIMIT = {"priority": PRIORITY_NOTIFICATION}
+DIGEST_SEPARATOR = "\n\n➖➖➖➖➖\n\n"
+
+
+class NotificationQueue:
+    """Очередь уведомлений в канал (отзывы, брони, заявки) с хранением в SQLite.
+
+    Обработчик только кладет уведомление в очередь и сразу отвечает пользователю. Отправляет
+    один фоновый обработчик через общий лимитер, поэтому лимит группового чата (~20 сообщений
+    в минуту) не задерживает ответы пользователям. Если очередь растет, несколько уведомлений
+    одного пользователя объединяются в одну сводку (чтобы ответ админа на нее дошел до этого
+    пользователя); неудачные отправки повторяются с растущей задержкой.
+    Очередь переживает перезапуск бота."""
+
+    def __init__(
+        self,
+        chat_id: int = NOTIFICATION_CHAT_ID,
+        digest_threshold: int = NOTIFICATION_DIGEST_THRESHOLD,
+        digest_max_items: int = NOTIFICATION_DIGEST_MAX_ITEMS,
+        retry_base: float = NOTIFICATION_RETRY_BASE_SECONDS,
+        retry_max: float = NOTIFICATION_RETRY_MAX_SECONDS
+    ):
+        self.chat_id = chat_id
+        self.digest_threshold = digest_threshold
+        self.digest_max_items = digest_max_items
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._bot: Optional[Bot] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self.pending = 0
+        self.sent = 0
+        self.digests = 0
+        self.failures = 0
+        self.dropped = 0
+
+    async def start(self, bot: Bot):
+        self._bot = bot
+        self.pending, _ = await db.get_notification_spool_state()
+        if self.pending:
+            logger.info(f"В очереди уведомлений после перезапуска: {self.pending}")
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановить отправку; неотправленное остается в очереди до следующего запуска"""
+        if self._worker and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+
+    def notify_enqueued(self, count: int = 1):
+        self.pending += count
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                delay = await self._send_due()
+            except Exception as e:
+                logger.error(f"Ошибка обработки очереди уведомлений: {e}")
+                delay = self.retry_base
+
+            if delay == 0:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _send_due(self) -> Optional[float]:
+        """Отправить очередную порцию. Возвращает, сколько ждать следующей (None - до новых уведомлений)"""
+        now = int(time.time())
+        limit = self.digest_max_items if self.pending >= self.digest_threshold else 1
+        rows = await db.get_due_notifications(now, limit)
+        if not rows:
+            self.pending, next_attempt_at = await db.get_notification_spool_state()
+            return None if next_attempt_at is None else max(1, next_attempt_at - now)
+
+        # В сводку попадают только уведомления того же пользователя - иначе ответить на нее некому
+        first = rows[0]
+        batch = [row for row in rows if row["chat_id"] == first["chat_id"] and row["user_id"] == first["user_id"]]
+        await self._deliver(self._fit(batch))
+        return 0
+
+    def _fit(self, batch: list[dict]) -> list[dict]:
+        # Сводка должна уложиться в одно сообщение
+        fitted, length = [], 0
+        for row in batch:
+            length += len(row["text"]) + len(DIGEST_SEPARATOR)
+            if fitted and length > MessageLimit.MAX_TEXT_LENGTH - 100:
+                break
+            fitted.append(row)
+        return fitted
+
+    def _render(self, batch: list[dict]) -> str:
+        if len(batch) == 1:
+            return batch[0]["text"]
+        return f"📬 <b>Сводка: {len(batch)} новых</b>\n\n" + DIGEST_SEPARATOR.join(row["text"] for row in batch)
+
+    async def _deliver(self, batch: list[dict]):
+        ids = [row["id"] for row in batch]
+        try:
+            sent = await self._bot.send_message(
+                chat_id=batch[0]["chat_id"],
+                text=self._render(batch),
+                parse_mode="HTML",
+                rate_limit_args=NOTIFICATION_RATE_LIMIT
+            )
+        except BadRequest as e:
+            if len(batch) > 1:
+                # Сводку испортило одно из уведомлений - отправляем по отдельности
+                for row in batch:
+                    await self._deliver([row])
+                return
+            logger.error(f"Уведомление {ids[0]} отклонено Telegram и удалено из очереди: {e}")
+            await db.delete_notifications(ids)
+            self.pending = max(0, self.pending - 1)
+            self.dropped += 1
+            return
+        except Exception as e:
+            attempts = max(row["attempts"] for row in batch)
+            delay = min(self.retry_max, self.retry_base * 2 ** attempts)
+            logger.warning(f"Не удалось отправить уведомления ({len(batch)}), повтор через {delay:.0f}с: {e}")
+            await db.reschedule_notifications(ids, int(time.time() + delay))
+            self.failures += 1
+            return
+
+        await db.delete_notifications(ids)
+        self.pending = max(0, self.pending - len(batch))
+        self.sent += len(batch)
+        if len(batch) > 1:
+            self.digests += 1
+
+        # Ответ админа на уведомление дойдет до пользователя
+        user_id = batch[0]["user_id"]
+        if user_id is not None:
+            try:
+                await db.save_relay_message(sent.chat_id, sent.message_id, user_id)
+            except Exception as e:
+                logger.warning(f"Не удалось сохранить связь уведомления с пользователем: {e}")
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "pending": self.pending,
+            "sent": self.sent,
+            "digests": self.digests,
+            "failures": self.failures,
+            "dropped": self.dropped
+        }
+
+
+notification_queue = NotificationQueue()
\ No newline at end of file
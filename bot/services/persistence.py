@@ -0,0 +1,220 @@
+import json
+import time
+import pickle
+import asyncio
+import logging
+from typing import Any, Optional
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from bot.config import PERSISTENCE_UPDATE_INTERVAL_SECONDS
+from bot.services.database import db
+
+logger = logging.getLogger(__name__)
+
+# Окно, в которое все изменения одного прохода update_persistence собираются в одну транзакцию
+FLUSH_COALESCE_SECONDS = 0.1
+
+USER_TABLE = ("persistence_user_data", "user_id")
+CHAT_TABLE = ("persistence_chat_data", "chat_id")
+
+
+class SQLitePersistence(BasePersistence[dict, dict, dict]):
+    """Хранение user_data, chat_data и состояний ConversationHandler в SQLite.
+
+    Данные пользователя загружаются лениво - при первом обновлении от него после запуска
+    (refresh_user_data), а не все сразу при старте. Изменения, которые PTB передает раз
+    в update_interval, копятся в памяти и записываются одной транзакцией."""
+
+    def __init__(self, update_interval: float = PERSISTENCE_UPDATE_INTERVAL_SECONDS):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=True, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self._schema_ready = False
+        self._loaded_users: set[int] = set()
+        self._loaded_chats: set[int] = set()
+        # Выгруженные из памяти по неактивности: их drop_* не должен удалять данные из БД
+        self._offloaded_users: set[int] = set()
+        self._offloaded_chats: set[int] = set()
+        self.restored = 0
+        self.offloaded_total = 0
+        # Отложенные записи: id -> pickle (None - удалить)
+        self._user_writes: dict[int, Optional[bytes]] = {}
+        self._chat_writes: dict[int, Optional[bytes]] = {}
+        self._conversation_writes: dict[tuple[str, str], Optional[bytes]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    async def _ensure_schema(self):
+        if not self._schema_ready:
+            await db.init_persistence_tables()
+            self._schema_ready = True
+
+    # Загрузка
+
+    async def get_user_data(self) -> dict[int, dict]:
+        # Пользователи подгружаются по одному в refresh_user_data
+        await self._ensure_schema()
+        return {}
+
+    async def get_chat_data(self) -> dict[int, dict]:
+        await self._ensure_schema()
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> dict[tuple, object]:
+        await self._ensure_schema()
+        rows = await db.get_persistent_conversations(name)
+        conversations = {tuple(json.loads(key)): pickle.loads(state) for key, state in rows}
+        logger.info(f"Загружено состояний диалога {name}: {len(conversations)}")
+        return conversations
+
+    async def _load_into(self, table: tuple[str, str], key: int, data: dict, pending: dict[int, Optional[bytes]]):
+        # Еще не записанная версия новее той, что в БД
+        if key in pending:
+            blob = pending[key]
+        else:
+            blob = await db.get_persistent_data(table[0], table[1], key)
+        if blob is None:
+            return
+
+        self.restored += 1
+        for name, value in pickle.loads(blob).items():
+            data.setdefault(name, value)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        if user_id in self._loaded_users:
+            return
+        await self._load_into(USER_TABLE, user_id, user_data, self._user_writes)
+        self._loaded_users.add(user_id)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        if chat_id in self._loaded_chats:
+            return
+        await self._load_into(CHAT_TABLE, chat_id, chat_data, self._chat_writes)
+        self._loaded_chats.add(chat_id)
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    # Запись
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        if user_id not in self._loaded_users:
+            # Данные изменены без refresh (например, из задачи) - не затираем сохраненное
+            await self._load_into(USER_TABLE, user_id, data, self._user_writes)
+            self._loaded_users.add(user_id)
+        self._user_writes[user_id] = pickle.dumps(data)
+        self._schedule_flush()
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        if chat_id not in self._loaded_chats:
+            await self._load_into(CHAT_TABLE, chat_id, data, self._chat_writes)
+            self._loaded_chats.add(chat_id)
+        self._chat_writes[chat_id] = pickle.dumps(data)
+        self._schedule_flush()
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        state = pickle.dumps(new_state) if new_state is not None else None
+        self._conversation_writes[(name, json.dumps(key))] = state
+        self._schedule_flush()
+
+    def mark_offloaded(self, user_ids: list[int], chat_ids: list[int]):
+        """Данные этих пользователей и чатов выгружаются из памяти, а не удаляются:
+        при следующем обращении они будут загружены из БД заново"""
+        for user_id in user_ids:
+            self._loaded_users.discard(user_id)
+            self._offloaded_users.add(user_id)
+        for chat_id in chat_ids:
+            self._loaded_chats.discard(chat_id)
+            self._offloaded_chats.add(chat_id)
+        self.offloaded_total += len(user_ids)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        if user_id in self._offloaded_users:
+            self._offloaded_users.discard(user_id)
+            return
+        self._loaded_users.discard(user_id)
+        self._user_writes[user_id] = None
+        self._schedule_flush()
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        if chat_id in self._offloaded_chats:
+            self._offloaded_chats.discard(chat_id)
+            return
+        self._loaded_chats.discard(chat_id)
+        self._chat_writes[chat_id] = None
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(FLUSH_COALESCE_SECONDS)
+        try:
+            await self._write_pending()
+        except Exception as e:
+            logger.error(f"Ошибка сохранения состояния пользователей: {e}")
+
+    async def _write_pending(self):
+        async with self._flush_lock:
+            users, self._user_writes = self._user_writes, {}
+            chats, self._chat_writes = self._chat_writes, {}
+            conversations, self._conversation_writes = self._conversation_writes, {}
+            if not (users or chats or conversations):
+                return
+
+            now = int(time.time())
+            try:
+                await db.save_persistence_batch(
+                    user_rows=[(key, blob, now) for key, blob in users.items() if blob is not None],
+                    user_deletes=[key for key, blob in users.items() if blob is None],
+                    chat_rows=[(key, blob, now) for key, blob in chats.items() if blob is not None],
+                    chat_deletes=[key for key, blob in chats.items() if blob is None],
+                    conversation_rows=[(name, key, state) for (name, key), state in conversations.items() if state is not None],
+                    conversation_deletes=[(name, key) for (name, key), state in conversations.items() if state is None]
+                )
+            except Exception:
+                # Вернуть неудачную пачку, не затирая более свежие изменения
+                for pending, failed in (
+                    (self._user_writes, users),
+                    (self._chat_writes, chats),
+                    (self._conversation_writes, conversations)
+                ):
+                    for key, value in failed.items():
+                        pending.setdefault(key, value)
+                raise
+
+            logger.debug(
+                f"Сохранено состояние: пользователей {len(users)}, чатов {len(chats)}, диалогов {len(conversations)}"
+            )
+
+    async def flush(self) -> None:
+        """Вызывается PTB при остановке: записать все, что еще не сохранено"""
+        if self._flush_task and not self._flush_task.done():
+            await self._flush_task
+        await self._write_pending()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "loaded_users": len(self._loaded_users),
+            "pending_writes": len(self._user_writes) + len(self._chat_writes) + len(self._conversation_writes),
+            "offloaded_total": self.offloaded_total,
+            "restored": self.restored
+        }
+
+
+persistence = SQLitePersistence()
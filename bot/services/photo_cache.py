@@ -1,96 +1,162 @@
 import os
 import json
+import asyncio
 import logging
+import tempfile
 from typing import Optional
 from pathlib import Path
+from telegram import Bot, InputFile
+from telegram.error import TelegramError
+
+from bot.services.media_registry import MenuPhoto
 
 logger = logging.getLogger(__name__)
 
+
 class PhotoCache:
-    def __init__(self, cache_file: str = "data/photo_cache.json"):
+    def __init__(self, cache_file: str = "data/photo_cache.json", save_delay: float = 1.0):
         self.cache_file = cache_file
+        self.save_delay = save_delay
         self.cache = self._load_cache()
+        self._upload_locks: dict[str, asyncio.Lock] = {}
+        self._dirty = False
+        self._save_task: Optional[asyncio.Task] = None
+        self._flush_requested = asyncio.Event()
 
     def _load_cache(self) -> dict:
-        if os.path.exists(self.cache_file):
+        if not os.path.exists(self.cache_file):
+            return {}
+
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+            if not isinstance(cache, dict):
+                raise ValueError("ожидался JSON-объект")
+            return cache
+        except Exception as e:
+            # Откладываем поврежденный файл в сторону, чтобы не потерять его при следующей записи
+            corrupt_path = f"{self.cache_file}.corrupt"
+            logger.error(f"Кеш фото поврежден ({e}), файл перемещен в {corrupt_path}")
             try:
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"Ошибка загрузки кеша фото: {e}")
-                return {}
-        return {}
-
-    def _save_cache(self):
+                os.replace(self.cache_file, corrupt_path)
+            except OSError:
+                pass
+            return {}
+
+    def _write_cache(self, data: str):
+        """Атомарная запись кеша: временный файл + os.replace (выполняется в рабочем потоке)"""
+        cache_dir = os.path.dirname(self.cache_file) or "."
+        tmp_path = None
         try:
-            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.cache, f, ensure_ascii=False, indent=2)
+            os.makedirs(cache_dir, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                'w', encoding='utf-8', dir=cache_dir, suffix='.tmp', delete=False
+            ) as f:
+                tmp_path = f.name
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.cache_file)
         except Exception as e:
             logger.error(f"Ошибка сохранения кеша фото: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
-    def get_file_id(self, photo_key: str, photo_path: str) -> Optional[str]:
-        if not photo_path or not os.path.exists(photo_path):
-            return None
+    def _schedule_save(self):
+        """Отложенное сохранение: изменения за save_delay секунд пишутся одной записью"""
+        self._dirty = True
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._dirty = False
+            self._write_cache(json.dumps(self.cache, ensure_ascii=False))
+            return
 
-        file_stat = os.stat(photo_path)
-        file_size = file_stat.st_size
-        file_mtime = file_stat.st_mtime
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._save_later())
 
-        cached = self.cache.get(photo_key)
+    async def _save_later(self):
+        while self._dirty:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.save_delay)
+            except asyncio.TimeoutError:
+                pass
+            self._dirty = False
+            data = json.dumps(self.cache, ensure_ascii=False)
+            await asyncio.to_thread(self._write_cache, data)
+
+    async def flush(self):
+        """Немедленно сохранить накопленные изменения (при остановке бота)"""
+        if self._save_task and not self._save_task.done():
+            self._flush_requested.set()
+            await self._save_task
+            self._flush_requested.clear()
+        elif self._dirty:
+            self._dirty = False
+            data = json.dumps(self.cache, ensure_ascii=False)
+            await asyncio.to_thread(self._write_cache, data)
+
+    def get_file_id(self, photo: MenuPhoto) -> Optional[str]:
+        cached = self.cache.get(photo.key)
         if cached:
-            if cached.get('size') == file_size and cached.get('mtime') == file_mtime:
-                logger.debug(f"Использование кешированного file_id для {photo_key}")
+            if cached.get('size') == photo.size and cached.get('mtime') == photo.mtime:
+                logger.debug(f"Использование кешированного file_id для {photo.key}")
                 return cached.get('file_id')
 
         return None
 
-    def save_file_id(self, photo_key: str, photo_path: str, file_id: str):
-        if not photo_path or not os.path.exists(photo_path):
-            return
+    def save_file_id(self, photo: MenuPhoto, file_id: str):
+        self.cache[photo.key] = {
+            'file_id': file_id,
+            'size': photo.size,
+            'mtime': photo.mtime,
+            'path': photo.path
+        }
+        self._schedule_save()
+        logger.info(f"Сохранен file_id для {photo.key}")
+
+    def upload_lock(self, photo_key: str) -> asyncio.Lock:
+        """Блокировка загрузки фото: один файл загружается в Telegram только один раз"""
+        lock = self._upload_locks.get(photo_key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._upload_locks[photo_key] = lock
+        return lock
+
+    async def warm_up(self, bot: Bot, chat_id: int, photos: list[MenuPhoto]) -> int:
+        """Предзагрузка некешированных фото меню в служебный чат для получения file_id"""
+        uploaded = 0
+
+        for photo in photos:
+            if not photo.is_valid:
+                logger.warning(f"Фото {photo.key} пропущено при прогреве: {photo.error}")
+                continue
+
+            async with self.upload_lock(photo.key):
+                if self.get_file_id(photo):
+                    continue
+
+                try:
+                    with open(photo.upload_path, 'rb') as photo_file:
+                        message = await bot.send_photo(
+                            chat_id=chat_id,
+                            photo=InputFile(photo_file),
+                            disable_notification=True
+                        )
+                except (OSError, TelegramError) as e:
+                    logger.warning(f"Не удалось загрузить фото {photo.key} при прогреве: {e}")
+                    continue
+
+                if message.photo:
+                    self.save_file_id(photo, message.photo[-1].file_id)
+                    uploaded += 1
+
+                try:
+                    await message.delete()
+                except TelegramError as e:
+                    logger.debug(f"Не удалось удалить служебное фото {photo.key}: {e}")
+
+        return uploaded
 
-        try:
-            file_stat = os.stat(photo_path)
-            self.cache[photo_key] = {
-                'file_id': file_id,
-                'size': file_stat.st_size,
-                'mtime': file_stat.st_mtime,
-                'path': photo_path
-            }
-            self._save_cache()
-            logger.info(f"Сохранен file_id для {photo_key}")
-        except Exception as e:
-            logger.error(f"Ошибка сохранения file_id для {photo_key}: {e}")
-
-    def validate_photo(self, photo_path: str) -> tuple[bool, Optional[str]]:
-        if not os.path.exists(photo_path):
-            return False, "Файл не найден"
-
-        file_size = os.path.getsize(photo_path)
-        max_size = 10 * 1024 * 1024
-
-        if file_size > max_size:
-            return False, f"Размер файла {file_size / 1024 / 1024:.2f} МБ превышает лимит 10 МБ"
-
-        try:
-            from PIL import Image
-            with Image.open(photo_path) as img:
-                width, height = img.size
-
-                if width > 10000 or height > 10000:
-                    return False, f"Разрешение {width}x{height} превышает лимит 10000px"
-
-                ratio = max(width, height) / min(width, height)
-                if ratio > 20:
-                    return False, f"Соотношение сторон {ratio:.1f}:1 превышает лимит 20:1"
-
-            return True, None
-
-        except ImportError:
-            logger.warning("Pillow не установлен, пропуск валидации размерности изображения")
-            return True, None
-        except Exception as e:
-            logger.error(f"Ошибка валидации изображения {photo_path}: {e}")
-            return False, f"Ошибка валидации: {e}"
 
 photo_cache = PhotoCache()
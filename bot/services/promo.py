@@ -1,25 +1,21 @@
-import random
 from datetime import datetime, timedelta
 from typing import Optional, Tuple
 
+from bot.config import PROMO_CLAIM_CANDIDATES
+from bot.utils.timefmt import end_of_day_ts
 from bot.services.database import db
+from bot.services.drop_admission import drop_admission
+from bot.services.promo_expiry import promo_expiry
 
 
 class PromoService:
     def __init__(self):
         self.db = db
 
-    async def get_random_active_promo(self) -> Optional[dict]:
-        """Получить случайный активный неиспользованный промокод"""
-        unused_promos = await db.get_unused_active_promos()
-        if not unused_promos:
-            return None
-
-        promo = random.choice(unused_promos)
-        return {
-            "code": promo["code"],
-            "expiry_date": promo["expiry_date"]
-        }
+    async def claim_random_promo(self, user_id: int) -> Optional[dict]:
+        """Выдать пользователю случайный из первых PROMO_CLAIM_CANDIDATES свободных промокодов.
+        Выбор и отметка о выдаче - одна транзакция, один промокод не достанется двоим"""
+        return await db.claim_promo(user_id, PROMO_CLAIM_CANDIDATES)
 
     async def can_receive_promo(self, user_id: int) -> Tuple[bool, Optional[str]]:
         """Проверить может ли пользователь получить промокод"""
@@ -28,8 +24,7 @@ class PromoService:
         if has_received:
             return False, "already_received"
 
-        unused_promos = await db.get_unused_active_promos()
-        if not unused_promos:
+        if not await db.has_unused_active_promos():
             return False, "no_promo"
 
         return True, None
@@ -41,19 +36,7 @@ class PromoService:
         if not can_receive:
             return None
 
-        # Получаем случайный промокод
-        promo = await self.get_random_active_promo()
-        if not promo:
-            return None
-
-        # Записываем что пользователь получил промокод
-        await self.mark_promo_received(user_id, promo["code"])
-
-        return promo
-
-    async def mark_promo_received(self, user_id: int, promo_code: str):
-        """Отметить что пользователь получил промокод"""
-        await db.record_promo_usage(user_id, promo_code)
+        return await self.claim_random_promo(user_id)
 
     async def get_last_received_promo(self, user_id: int) -> Optional[dict]:
         """Получить последний полученный промокод пользователя"""
@@ -67,13 +50,17 @@ class PromoService:
         return active_promos[0]
 
     async def create_promo(self, code: str, days_valid: int = 7) -> bool:
-        """Создать новый промокод"""
-        expiry_date = (datetime.now() + timedelta(days=days_valid)).strftime("%Y-%m-%d")
-        return await db.add_promo(code, expiry_date)
-
-    async def create_promo_with_date(self, code: str, expiry_date: str) -> bool:
-        """Создать промокод с конкретной датой окончания"""
-        return await db.add_promo(code, expiry_date)
+        """Создать новый промокод, действующий до конца дня через days_valid дней"""
+        expiry_ts = end_of_day_ts(datetime.now() + timedelta(days=days_valid))
+        return await self.create_promo_until(code, expiry_ts)
+
+    async def create_promo_until(self, code: str, expiry_ts: int) -> bool:
+        """Создать промокод, действующий до момента expiry_ts (unix time)"""
+        created = await db.add_promo(code, expiry_ts)
+        if created:
+            promo_expiry.add(expiry_ts)
+            drop_admission.invalidate()
+        return created
 
     async def get_all_promos(self) -> list[dict]:
         """Получить все промокоды"""
@@ -81,11 +68,17 @@ class PromoService:
 
     async def delete_promo(self, code: str) -> bool:
         """Удалить промокод"""
-        return await db.delete_promo(code)
+        deleted = await db.delete_promo(code)
+        if deleted:
+            drop_admission.invalidate()
+        return deleted
 
     async def deactivate_promo(self, code: str) -> bool:
         """Деактивировать промокод"""
-        return await db.deactivate_promo(code)
+        deactivated = await db.deactivate_promo(code)
+        if deactivated:
+            drop_admission.invalidate()
+        return deactivated
 
 
 # Создаем экземпляр сервиса
@@ -0,0 +1,97 @@
+import time
+import heapq
+import logging
+from typing import Optional
+
+from telegram.ext import Application, ContextTypes, Job, JobQueue
+
+from bot.config import PROMO_EXPIRY_BATCH_SIZE
+from bot.services.database import db
+from bot.services.drop_admission import drop_admission
+
+logger = logging.getLogger(__name__)
+
+
+class PromoExpiryScheduler:
+    """Деактивация промокодов точно в момент окончания их действия.
+
+    Моменты окончания активных промокодов лежат в куче; в job_queue всегда запланирована
+    одна задача - на ближайший из них. Новый промокод с более ранним сроком переносит задачу."""
+
+    def __init__(self, batch_size: int = PROMO_EXPIRY_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._heap: list[int] = []
+        self._known: set[int] = set()
+        self._job_queue: Optional[JobQueue] = None
+        self._job: Optional[Job] = None
+        self._scheduled_at: Optional[int] = None
+        self.deactivated_total = 0
+
+    async def start(self, application: Application):
+        self._job_queue = application.job_queue
+        for expiry_ts in await db.get_active_expiry_times():
+            self._push(expiry_ts)
+        # Истекшие, пока бот был выключен, деактивируются сразу
+        self._reschedule()
+
+    def add(self, expiry_ts: int):
+        """Учесть срок нового промокода"""
+        if self._push(expiry_ts):
+            self._reschedule()
+
+    def _push(self, expiry_ts: int) -> bool:
+        if expiry_ts in self._known:
+            return False
+        self._known.add(expiry_ts)
+        heapq.heappush(self._heap, expiry_ts)
+        return True
+
+    def _reschedule(self):
+        if not self._job_queue or not self._heap:
+            return
+
+        next_expiry = self._heap[0]
+        if self._job and self._scheduled_at == next_expiry:
+            return
+        if self._job:
+            self._job.schedule_removal()
+
+        self._scheduled_at = next_expiry
+        self._job = self._job_queue.run_once(
+            self._expire_due,
+            when=max(0.0, next_expiry - time.time()),
+            name="promo_expiry"
+        )
+
+    async def _expire_due(self, context: ContextTypes.DEFAULT_TYPE):
+        now = int(time.time())
+        self._job = None
+        self._scheduled_at = None
+
+        while self._heap and self._heap[0] <= now:
+            self._known.discard(heapq.heappop(self._heap))
+
+        try:
+            deactivated = await db.deactivate_expired_promos(now, self.batch_size)
+        except Exception as e:
+            logger.error(f"Ошибка деактивации истекших промокодов: {e}")
+            # Повторим на следующем проходе
+            self._push(now + 60)
+            deactivated = 0
+
+        if deactivated:
+            self.deactivated_total += deactivated
+            drop_admission.invalidate()
+            logger.info(f"Деактивировано истекших промокодов: {deactivated}")
+
+        self._reschedule()
+
+    def stats(self) -> dict[str, Optional[int]]:
+        return {
+            "pending_expiries": len(self._heap),
+            "next_expiry": self._heap[0] if self._heap else None,
+            "deactivated_total": self.deactivated_total
+        }
+
+
+promo_expiry = PromoExpiryScheduler()
\ No newline at end of file
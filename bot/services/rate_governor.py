@@ -0,0 +1,177 @@
+import time
+import heapq
+import asyncio
+import itertools
+import logging
+from typing import Optional, Union
+
+from bot.config import (
+    API_GLOBAL_RATE_PER_SECOND,
+    API_PRIVATE_CHAT_RATE_PER_SECOND,
+    API_GROUP_CHAT_RATE_PER_MINUTE
+)
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты очереди: меньше - раньше
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NOTIFICATION = 1
+PRIORITY_BULK = 2
+
+# Методы, на которые действуют лимиты Telegram на отправку сообщений
+GOVERNED_ENDPOINTS = frozenset({
+    "sendMessage",
+    "sendPhoto",
+    "sendDocument",
+    "sendMediaGroup",
+    "copyMessage",
+    "forwardMessage",
+    "editMessageText",
+    "editMessageCaption",
+    "editMessageMedia",
+})
+
+# Небольшой запас на всплески: пользователь может быстро пролистать пару экранов меню
+CHAT_BURST = 3
+MAX_CHAT_BUCKETS = 10000
+
+
+class TokenBucket:
+    """Token bucket с резервированием: reserve() возвращает, сколько ждать своего слота"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self) -> float:
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def time_until_available(self) -> float:
+        now = time.monotonic()
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def penalize(self, seconds: float):
+        """Не выдавать токены ближайшие seconds секунд (после RetryAfter от Telegram)"""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+    def is_idle(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+class RateGovernor:
+    """Общий лимит отправки для токена бота: глобально N/с, на чат - 1/с в личке и 20/мин в группах.
+    Ожидающие глобального слота запросы выстраиваются в очередь по приоритету,
+    так что ответы пользователям обгоняют рассылки."""
+
+    def __init__(
+        self,
+        global_rate: float = API_GLOBAL_RATE_PER_SECOND,
+        private_rate: float = API_PRIVATE_CHAT_RATE_PER_SECOND,
+        group_rate_per_minute: float = API_GROUP_CHAT_RATE_PER_MINUTE
+    ):
+        self.private_rate = private_rate
+        self.group_rate = group_rate_per_minute / 60
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: dict[Union[int, str], TokenBucket] = {}
+        self._queue: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self.waited = 0
+        self.wait_seconds = 0.0
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_CHAT_BUCKETS:
+                self._chats = {key: value for key, value in self._chats.items() if not value.is_idle()}
+            # Положительный id - личный чат, отрицательный или @username - группа/канал
+            is_private = isinstance(chat_id, int) and chat_id > 0
+            rate = self.private_rate if is_private else self.group_rate
+            bucket = self._chats[chat_id] = TokenBucket(rate, CHAT_BURST)
+        return bucket
+
+    async def acquire(self, chat_id: Optional[Union[int, str]], priority: int = PRIORITY_INTERACTIVE):
+        """Дождаться права на отправку: сначала слот чата, затем глобальный слот по приоритету"""
+        started = time.monotonic()
+
+        if chat_id is not None:
+            delay = self._chat_bucket(chat_id).reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        if not self._queue and self._global.time_until_available() == 0:
+            self._global.reserve()
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._queue, (priority, next(self._seq), future))
+            self._wakeup.set()
+            if self._dispatcher is None or self._dispatcher.done():
+                self._dispatcher = asyncio.create_task(self._dispatch())
+            await future
+
+        waited = time.monotonic() - started
+        if waited > 0.05:
+            self.waited += 1
+            self.wait_seconds += waited
+
+    def penalize(self, chat_id: Optional[Union[int, str]], seconds: float):
+        """Учесть RetryAfter: придержать отправку в чат (или все отправки, если чат неизвестен)"""
+        bucket = self._chat_bucket(chat_id) if chat_id is not None else self._global
+        bucket.penalize(seconds)
+
+    async def _dispatch(self):
+        while True:
+            # Отмененные ожидания не должны занимать слоты
+            while self._queue and self._queue[0][2].done():
+                heapq.heappop(self._queue)
+
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            delay = self._global.time_until_available()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            _, _, future = heapq.heappop(self._queue)
+            if not future.done():
+                self._global.reserve()
+                future.set_result(None)
+
+    async def shutdown(self):
+        if self._dispatcher and not self._dispatcher.done():
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+        for _, _, future in self._queue:
+            future.cancel()
+        self._queue.clear()
+
+    def stats(self) -> dict[str, Union[int, float]]:
+        return {
+            "queued": len(self._queue),
+            "queued_bulk": sum(1 for priority, _, _ in self._queue if priority >= PRIORITY_BULK),
+            "chats": len(self._chats),
+            "waited": self.waited,
+            "avg_wait": self.wait_seconds / self.waited if self.waited else 0.0
+        }
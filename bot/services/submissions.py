@@ -0,0 +1,125 @@
+import time
+import asyncio
+import logging
+from typing import Optional
+
+from bot.config import SUBMISSION_DEDUP_MINUTES
+from bot.services.database import db
+from bot.services.notification_queue import notification_queue
+
+logger = logging.getLogger(__name__)
+
+SUBMISSION_BOOKING = "booking"
+SUBMISSION_FEEDBACK = "feedback"
+SUBMISSION_WINTER_DROP = "winter_drop"
+
+# Окно, в которое заявки собираются в одну транзакцию
+FLUSH_COALESCE_SECONDS = 0.2
+FLUSH_RETRY_SECONDS = 1
+# Порог, после которого из памяти вычищаются отметки старше окна защиты от повторов
+MAX_TRACKED_SUBMITTERS = 10000
+
+
+class SubmissionStore:
+    """Хранение заявок (брони, отзывы, участие в розыгрыше) в SQLite.
+
+    Заявка принимается сразу: проверка повтора идет по памяти, запись в БД откладывается
+    и выполняется пачкой - вместе с постановкой уведомлений в очередь, одной транзакцией."""
+
+    def __init__(self, dedup_seconds: float = SUBMISSION_DEDUP_MINUTES * 60):
+        self.dedup_seconds = dedup_seconds
+        # (user_id, kind) -> время последней принятой заявки
+        self._last_submitted: dict[tuple[int, str], float] = {}
+        self._pending: list[tuple] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.accepted = 0
+        self.duplicates = 0
+
+    async def load(self):
+        """Восстановить отметки защиты от повторов после перезапуска"""
+        rows = await db.get_recent_submitters(int(time.time() - self.dedup_seconds))
+        for user_id, kind, created_at in rows:
+            self._last_submitted[(user_id, kind)] = created_at
+
+    def submit(
+        self,
+        kind: str,
+        user_id: int,
+        text: str,
+        notification_text: str,
+        campaign: Optional[str] = None
+    ) -> bool:
+        """Принять заявку. False - такая заявка от пользователя уже была в течение окна"""
+        now = time.time()
+        key = (user_id, kind)
+        last = self._last_submitted.get(key)
+        if last is not None and now - last < self.dedup_seconds:
+            self.duplicates += 1
+            return False
+
+        if len(self._last_submitted) >= MAX_TRACKED_SUBMITTERS:
+            self._prune(now)
+        self._last_submitted[key] = now
+        self._pending.append((kind, campaign, user_id, text, int(now), notification_text))
+        self.accepted += 1
+        self._schedule_flush()
+        return True
+
+    def _prune(self, now: float):
+        self._last_submitted = {
+            key: ts for key, ts in self._last_submitted.items() if now - ts < self.dedup_seconds
+        }
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(FLUSH_COALESCE_SECONDS)
+        while True:
+            try:
+                # Запись не прерывается отменой: иначе пачка может оказаться и в БД, и снова в буфере
+                await asyncio.shield(self._write_pending())
+                return
+            except Exception as e:
+                # Заявки остались в очереди на запись - повторим
+                logger.error(f"Ошибка сохранения заявок: {e}")
+                await asyncio.sleep(FLUSH_RETRY_SECONDS)
+
+    async def _write_pending(self):
+        async with self._flush_lock:
+            rows, self._pending = self._pending, []
+            if not rows:
+                return
+
+            try:
+                await db.save_submissions_batch(rows, notification_queue.chat_id)
+            except Exception:
+                self._pending[:0] = rows
+                raise
+
+            notification_queue.notify_enqueued(len(rows))
+            logger.debug(f"Сохранено заявок: {len(rows)}")
+
+    async def flush(self):
+        """Записать все, что еще не сохранено (при остановке бота)"""
+        if self._flush_task and not self._flush_task.done():
+            # Прерывается только ожидание; начатая запись завершится под _flush_lock,
+            # и _write_pending ниже дождется ее
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        await self._write_pending()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "accepted": self.accepted,
+            "duplicates": self.duplicates,
+            "pending_writes": len(self._pending)
+        }
+
+
+submission_store = SubmissionStore()
\ No newline at end of file
@@ -0,0 +1,235 @@
+import time
+import asyncio
+import random
+import logging
+from collections import defaultdict
+from typing import Any, Callable, Coroutine, Optional, Union
+
+from telegram.error import BadRequest, NetworkError, RetryAfter, TelegramError, TimedOut
+from telegram.ext import BaseRateLimiter
+from telegram.request import BaseRequest
+
+from bot.config import (
+    API_MAX_ATTEMPTS,
+    API_BACKOFF_BASE_SECONDS,
+    API_BACKOFF_MAX_SECONDS,
+    API_RETRY_AFTER_MAX_SECONDS,
+    API_CIRCUIT_FAILURE_THRESHOLD,
+    API_CIRCUIT_RESET_SECONDS
+)
+from bot.services.rate_governor import RateGovernor, GOVERNED_ENDPOINTS, PRIORITY_INTERACTIVE
+
+logger = logging.getLogger(__name__)
+
+# Таймауты по методам Bot API (read, write). Явно переданные в вызов таймауты не переопределяются
+DEFAULT_TIMEOUTS = (10.0, 10.0)
+ENDPOINT_TIMEOUTS = {
+    "answerCallbackQuery": (5.0, 5.0),
+    "sendMessage": (10.0, 10.0),
+    "editMessageText": (10.0, 10.0),
+    "sendPhoto": (20.0, 30.0),
+    "editMessageMedia": (20.0, 30.0),
+    "copyMessage": (15.0, 15.0),
+    "deleteMessages": (10.0, 10.0),
+    "getChatMember": (5.0, 5.0),
+}
+
+
+class CircuitOpenError(NetworkError):
+    """Метод Bot API временно отключен предохранителем после серии сетевых ошибок"""
+
+    def __init__(self, endpoint: str, retry_in: float):
+        super().__init__(f"Circuit open for {endpoint}, retry in {retry_in:.0f}s")
+        self.endpoint = endpoint
+
+
+class CircuitBreaker:
+    """Предохранитель одного метода: closed -> open после серии ошибок -> half-open (одна пробная попытка)"""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def retry_in(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self) -> bool:
+        """Учесть ошибку. Возвращает True, если предохранитель только что разомкнулся"""
+        self.failures += 1
+        was_closed = self.opened_at is None
+        if self._probe_in_flight or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+            return was_closed
+        return False
+
+    def release_probe(self):
+        self._probe_in_flight = False
+
+
+class TelegramApiLimiter(BaseRateLimiter[dict]):
+    """Единый слой исходящих запросов к Bot API: лимиты отправки с приоритетами (RateGovernor),
+    повторы с экспоненциальной задержкой и джиттером, ожидание RetryAfter, таймауты по методам,
+    предохранитель по методам и счетчики.
+
+    Приоритет задается через rate_limit_args={"priority": PRIORITY_BULK} в вызове метода бота."""
+
+    def __init__(
+        self,
+        max_attempts: int = API_MAX_ATTEMPTS,
+        backoff_base: float = API_BACKOFF_BASE_SECONDS,
+        backoff_max: float = API_BACKOFF_MAX_SECONDS,
+        retry_after_max: float = API_RETRY_AFTER_MAX_SECONDS,
+        failure_threshold: int = API_CIRCUIT_FAILURE_THRESHOLD,
+        reset_seconds: float = API_CIRCUIT_RESET_SECONDS
+    ):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.governor = RateGovernor()
+        self._breakers: dict[str, CircuitBreaker] = defaultdict(
+            lambda: CircuitBreaker(failure_threshold, reset_seconds)
+        )
+        self._counters: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        await self.governor.shutdown()
+
+    def _count(self, endpoint: str, name: str):
+        self._counters[endpoint][name] += 1
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: случайная задержка от 0 до экспоненциального потолка
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _apply_timeouts(self, endpoint: str, kwargs: dict[str, Any]) -> dict[str, Any]:
+        read_timeout, write_timeout = ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUTS)
+        kwargs = dict(kwargs)
+        # BaseRequest.DEFAULT_NONE - таймаут, не переданный вызывающим кодом
+        if kwargs.get("read_timeout") is BaseRequest.DEFAULT_NONE:
+            kwargs["read_timeout"] = read_timeout
+        if kwargs.get("write_timeout") is BaseRequest.DEFAULT_NONE:
+            kwargs["write_timeout"] = write_timeout
+        return kwargs
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, dict, list[dict]]]],
+        args: Any,
+        kwargs: dict[str, Any],
+        endpoint: str,
+        data: dict[str, Any],
+        rate_limit_args: Optional[dict],
+    ) -> Union[bool, dict, list[dict]]:
+        breaker = self._breakers[endpoint]
+        kwargs = self._apply_timeouts(endpoint, kwargs)
+        self._count(endpoint, "requests")
+
+        governed = endpoint in GOVERNED_ENDPOINTS
+        chat_id = data.get("chat_id")
+        priority = (rate_limit_args or {}).get("priority", PRIORITY_INTERACTIVE)
+
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                self._count(endpoint, "rejected")
+                raise CircuitOpenError(endpoint, breaker.retry_in())
+
+            if governed:
+                try:
+                    await self.governor.acquire(chat_id, priority)
+                except BaseException:
+                    breaker.release_probe()
+                    raise
+
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as e:
+                breaker.release_probe()
+                self._count(endpoint, "retry_after")
+                if e.retry_after > self.retry_after_max or attempt + 1 >= self.max_attempts:
+                    raise
+                logger.warning(f"Flood control для {endpoint}: ожидание {e.retry_after}с")
+                if governed:
+                    # Ожидание выполнит governor - заодно придержит остальные отправки в этот чат
+                    self.governor.penalize(chat_id, e.retry_after + random.uniform(0, 1))
+                else:
+                    await asyncio.sleep(e.retry_after + random.uniform(0, 1))
+                attempt += 1
+                continue
+            except BadRequest:
+                # API ответил ошибкой запроса - сеть в порядке, а повтор не поможет
+                breaker.record_success()
+                self._count(endpoint, "bad_request")
+                raise
+            except (TimedOut, NetworkError) as e:
+                self._count(endpoint, "network_errors")
+                if breaker.record_failure():
+                    self._count(endpoint, "circuit_opened")
+                    logger.error(f"Предохранитель {endpoint} разомкнут после серии ошибок: {e}")
+                if attempt + 1 >= self.max_attempts or breaker.state != "closed":
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(
+                    f"Ошибка сети при вызове {endpoint} (попытка {attempt + 1}/{self.max_attempts}), "
+                    f"повтор через {delay:.1f}с: {e}"
+                )
+                self._count(endpoint, "retries")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except TelegramError:
+                breaker.record_success()
+                self._count(endpoint, "api_errors")
+                raise
+            except BaseException:
+                breaker.release_probe()
+                raise
+
+            breaker.record_success()
+            self._count(endpoint, "ok")
+            return result
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """Счетчики и состояние предохранителя по каждому методу Bot API"""
+        return {
+            endpoint: {
+                **counters,
+                "circuit": self._breakers[endpoint].state
+            }
+            for endpoint, counters in sorted(self._counters.items())
+        }
+
+
+telegram_api = TelegramApiLimiter()
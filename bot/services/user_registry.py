@@ -0,0 +1,110 @@
+import time
+import asyncio
+import logging
+from typing import Optional
+
+from bot.config import USER_REGISTRY_FLUSH_SECONDS
+from bot.services.database import db
+
+logger = logging.getLogger(__name__)
+
+FLUSH_RETRY_SECONDS = 1
+
+
+class UserRegistry:
+    """Пользователи бота: кто уже есть в БД и с каким именем, известно из памяти.
+
+    /start не пишет в БД сам: новые пользователи и изменившиеся имя/username копятся в буфере
+    и записываются одной транзакцией раз в flush_seconds. Повторный /start без изменений
+    профиля не обращается к БД вовсе."""
+
+    def __init__(self, flush_seconds: float = USER_REGISTRY_FLUSH_SECONDS):
+        self.flush_seconds = flush_seconds
+        # user_id -> (first_name, username) в том виде, в каком он записан (или будет записан) в БД
+        self._profiles: dict[int, tuple[str, Optional[str]]] = {}
+        # user_id -> строка для записи; более поздняя регистрация заменяет более раннюю
+        self._pending: dict[int, tuple] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.new_users = 0
+        self.profile_updates = 0
+
+    async def load(self):
+        for user_id, first_name, username in await db.get_user_profiles():
+            self._profiles[user_id] = (first_name, username)
+        logger.info(f"Загружено пользователей в реестр: {len(self._profiles)}")
+
+    def register(self, user_id: int, first_name: str, username: Optional[str] = None) -> bool:
+        """Учесть пользователя. True - он новый или его профиль изменился (запись поставлена в буфер)"""
+        # username хранится в нижнем регистре, как и раньше в add_user
+        profile = (first_name, username.lower() if username else None)
+        known = self._profiles.get(user_id)
+        if known == profile:
+            return False
+
+        if known is None:
+            self.new_users += 1
+        else:
+            self.profile_updates += 1
+        self._profiles[user_id] = profile
+        self._pending[user_id] = (user_id, *profile, int(time.time()))
+        self._schedule_flush()
+        return True
+
+    def is_known(self, user_id: int) -> bool:
+        return user_id in self._profiles
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_seconds)
+        while True:
+            try:
+                # Запись не прерывается отменой: иначе пачка может оказаться и в БД, и снова в буфере
+                await asyncio.shield(self._write_pending())
+                return
+            except Exception as e:
+                # Пользователи остались в буфере - повторим
+                logger.error(f"Ошибка сохранения пользователей: {e}")
+                await asyncio.sleep(FLUSH_RETRY_SECONDS)
+
+    async def _write_pending(self):
+        async with self._flush_lock:
+            rows, self._pending = self._pending, {}
+            if not rows:
+                return
+
+            try:
+                await db.upsert_users_batch(list(rows.values()))
+            except Exception:
+                # Не затираем то, что успело прийти за время записи
+                for user_id, row in rows.items():
+                    self._pending.setdefault(user_id, row)
+                raise
+
+            logger.debug(f"Сохранено пользователей: {len(rows)}")
+
+    async def flush(self):
+        """Записать все, что еще не сохранено (при остановке бота)"""
+        if self._flush_task and not self._flush_task.done():
+            # Прерывается только ожидание; начатая запись завершится под _flush_lock,
+            # и _write_pending ниже дождется ее
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        await self._write_pending()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "known": len(self._profiles),
+            "new_users": self.new_users,
+            "profile_updates": self.profile_updates,
+            "pending_writes": len(self._pending)
+        }
+
+
+user_registry = UserRegistry()
\ No newline at end of file
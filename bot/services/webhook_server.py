@@ -0,0 +1,216 @@
+import json
+import hmac
+import asyncio
+import logging
+from typing import Optional
+
+from telegram import Update
+from telegram.ext import Application
+
+from bot.config import (
+    WEBHOOK_LISTEN,
+    WEBHOOK_PORT,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET_TOKEN,
+    WEBHOOK_QUEUE_SIZE
+)
+from bot.middleware.update_processor import update_processor
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 1024 * 1024
+MAX_HEADER_LINES = 100
+# Простаивающее keep-alive соединение закрывается через это время
+IDLE_TIMEOUT_SECONDS = 60
+READ_TIMEOUT_SECONDS = 10
+
+HTTP_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    503: "Service Unavailable",
+}
+
+
+class WebhookServer:
+    """Встроенный HTTP-сервер для приема обновлений от Telegram (asyncio, без зависимостей).
+
+    POST на WEBHOOK_PATH проверяет секретный токен, кладет обновление в ограниченную входную
+    очередь и сразу отвечает 200; переполненная очередь отвечает 503, и Telegram повторит доставку.
+    GET /healthz - проверка живости для Docker/балансировщика."""
+
+    def __init__(
+        self,
+        application: Application,
+        listen: str = WEBHOOK_LISTEN,
+        port: int = WEBHOOK_PORT,
+        path: str = WEBHOOK_PATH,
+        secret_token: str = WEBHOOK_SECRET_TOKEN,
+        queue_size: int = WEBHOOK_QUEUE_SIZE
+    ):
+        self.application = application
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token
+        self._ingress: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._forwarder: Optional[asyncio.Task] = None
+        self.accepted = 0
+        self.rejected = 0
+
+    async def start(self):
+        self._forwarder = asyncio.create_task(self._forward_updates())
+        self._server = await asyncio.start_server(self._handle_connection, self.listen, self.port)
+        logger.info(f"Webhook-сервер слушает {self.listen}:{self.port}{self.path}")
+
+    async def stop(self):
+        """Перестать принимать запросы и передать приложению уже принятые обновления"""
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+        if self._forwarder and not self._forwarder.done():
+            self._forwarder.cancel()
+            try:
+                await self._forwarder
+            except asyncio.CancelledError:
+                pass
+
+        while not self._ingress.empty():
+            self.application.update_queue.put_nowait(self._ingress.get_nowait())
+
+        logger.info(f"Webhook-сервер остановлен (принято {self.accepted}, отклонено {self.rejected})")
+
+    async def _forward_updates(self):
+        """Передача обновлений в приложение с учетом его загрузки: пока обработчики заняты,
+        обновления копятся во входной очереди, а при ее переполнении Telegram получает 503."""
+        update_queue = self.application.update_queue
+        while True:
+            update = await self._ingress.get()
+            while update_processor.in_flight + update_queue.qsize() >= update_processor.max_concurrent_updates:
+                await update_processor.wait_for_slot()
+            update_queue.put_nowait(update)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT_SECONDS)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+
+                keep_alive = await asyncio.wait_for(
+                    self._handle_request(request_line, reader, writer),
+                    READ_TIMEOUT_SECONDS
+                )
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            logger.debug(f"Webhook-соединение закрыто: {e}")
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _handle_request(
+        self,
+        request_line: bytes,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter
+    ) -> bool:
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            await self._respond(writer, 400, keep_alive=False)
+            return False
+
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        else:
+            await self._respond(writer, 400, keep_alive=False)
+            return False
+
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+        content_length = int(headers.get("content-length", "0") or 0)
+        if content_length > MAX_BODY_BYTES:
+            await self._respond(writer, 413, keep_alive=False)
+            return False
+        body = await reader.readexactly(content_length) if content_length else b""
+
+        path = target.split("?", 1)[0]
+        if path == "/healthz":
+            status, payload = self._health()
+            await self._respond(writer, status, payload, keep_alive=keep_alive)
+        elif path != self.path:
+            await self._respond(writer, 404, keep_alive=keep_alive)
+        elif method != "POST":
+            await self._respond(writer, 405, keep_alive=keep_alive)
+        else:
+            await self._respond(writer, self._accept_update(headers, body), keep_alive=keep_alive)
+
+        return keep_alive
+
+    def _accept_update(self, headers: dict[str, str], body: bytes) -> int:
+        # Без секретного токена любой, кто угадал путь, мог бы прислать поддельное обновление от админа
+        received_token = headers.get("x-telegram-bot-api-secret-token", "")
+        if not self.secret_token or not hmac.compare_digest(received_token, self.secret_token):
+            logger.warning("Webhook-запрос с неверным секретным токеном отклонен")
+            return 403
+
+        try:
+            data = json.loads(body)
+            if not isinstance(data, dict):
+                raise ValueError("тело запроса не JSON-объект")
+            update = Update.de_json(data, self.application.bot)
+        except Exception as e:
+            logger.warning(f"Некорректное тело webhook-запроса: {e}")
+            return 400
+
+        if update is None:
+            return 400
+
+        try:
+            self._ingress.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            logger.warning("Входная очередь webhook переполнена, обновление отклонено (503)")
+            return 503
+
+        self.accepted += 1
+        return 200
+
+    def _health(self) -> tuple[int, dict]:
+        running = self.application.running
+        return (200 if running else 503), {
+            "status": "ok" if running else "starting",
+            "ingress_queue": self._ingress.qsize(),
+            "in_flight": update_processor.in_flight,
+            "accepted": self.accepted,
+            "rejected": self.rejected
+        }
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, payload: Optional[dict] = None, keep_alive: bool = True):
+        body = json.dumps(payload if payload is not None else {"ok": status == 200}).encode()
+        head = (
+            f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            f"\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta
+
+
+# В БД время хранится как unix time; здесь оно переводится в местное для сообщений
+
+def format_date(ts: int) -> str:
+    return datetime.fromtimestamp(ts).strftime("%d.%m.%Y")
+
+
+def format_datetime(ts: int) -> str:
+    return datetime.fromtimestamp(ts).strftime("%d.%m.%Y %H:%M")
+
+
+def format_time(ts: int) -> str:
+    return datetime.fromtimestamp(ts).strftime("%H:%M")
+
+
+def format_expiry(ts: int) -> str:
+    """Срок действия "до ...": промокод, истекающий в полночь, действует до конца предыдущего дня"""
+    moment = datetime.fromtimestamp(ts)
+    if moment.hour == 0 and moment.minute == 0:
+        return format_date(int((moment - timedelta(days=1)).timestamp()))
+    return format_datetime(ts)
+
+
+def end_of_day_ts(day: datetime) -> int:
+    """Момент окончания дня day (полночь следующего) в unix time"""
+    midnight = day.replace(hour=0, minute=0, second=0, microsecond=0)
+    return int((midnight + timedelta(days=1)).timestamp())
\ No newline at end of file
@@ -1,4 +1,7 @@
 import os
+import signal
+import asyncio
+import time
 import logging
 
 from telegram import BotCommand, BotCommandScopeDefault, BotCommandScopeChat
@@ -13,8 +16,39 @@ from telegram.ext import (
 )
 from telegram.error import TimedOut, NetworkError
 
-from bot.config import BOT_TOKEN, ADMIN_ID, LOGS_PATH, PROMO_CHECK_INTERVAL_HOURS
+from bot.config import (
+    BOT_TOKEN,
+    ADMIN_ID,
+    LOGS_PATH,
+    PROMO_CHECK_INTERVAL_HOURS,
+    PROMO_CLEANUP_BATCH_SIZE,
+    PROMO_CLEANUP_PAUSE_SECONDS,
+    PHOTO_WARMUP_CHAT_ID,
+    MEDIA_SCAN_INTERVAL_SECONDS,
+    TRACKED_MESSAGES_FLUSH_SECONDS,
+    BOT_MODE,
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET_TOKEN,
+    WEBHOOK_MAX_CONNECTIONS,
+    USER_DATA_EVICTION_INTERVAL_MINUTES,
+    NOTIFICATION_CHAT_ID,
+    RELAY_MESSAGE_TTL_DAYS
+)
 from bot.services.database import db
+from bot.services.photo_cache import photo_cache
+from bot.services.media_registry import media_registry
+from bot.services.telegram_api import telegram_api
+from bot.services.webhook_server import WebhookServer
+from bot.services.persistence import persistence
+from bot.services.notification_queue import notification_queue
+from bot.services.submissions import submission_store
+from bot.services.user_registry import user_registry
+from bot.services.drop_admission import drop_admission
+from bot.services.promo_expiry import promo_expiry
+from bot.middleware.message_cleanup import message_cleanup
+from bot.middleware.update_processor import update_processor
+from bot.middleware.user_activity import user_activity
 from bot.handlers.menu import (
     menu_start,
     handle_leave_feedback,
@@ -52,6 +86,9 @@ from bot.handlers.admin import (
 )
 
 
+ALLOWED_UPDATES = ["message", "callback_query"]
+
+
 def setup_logging():
     """Настройка логирования"""
     os.makedirs(os.path.dirname(LOGS_PATH), exist_ok=True)
@@ -90,7 +127,9 @@ async def cleanup_expired_promos(context: ContextTypes.DEFAULT_TYPE):
     """Фоновая задача для автоматической очистки истекших промокодов"""
     logger = logging.getLogger(__name__)
     try:
-        deleted_count = await db.delete_expired_promos()
+        deleted_count = await db.delete_expired_promos(
+            int(time.time()), PROMO_CLEANUP_BATCH_SIZE, PROMO_CLEANUP_PAUSE_SECONDS
+        )
         if deleted_count > 0:
             logger.info(f"Удалено истекших промокодов: {deleted_count}")
         else:
@@ -99,6 +138,40 @@ async def cleanup_expired_promos(context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Ошибка при очистке истекших промокодов: {e}")
 
 
+async def cleanup_relay_messages(context: ContextTypes.DEFAULT_TYPE):
+    """Фоновая задача: удаление устаревших связей сообщений админа с пользователями"""
+    logger = logging.getLogger(__name__)
+    expired_before = int(time.time()) - RELAY_MESSAGE_TTL_DAYS * 86400
+    try:
+        deleted_count = await db.delete_expired_relay_messages(expired_before)
+        if deleted_count > 0:
+            logger.info(f"Удалено устаревших связей сообщений с пользователями: {deleted_count}")
+    except Exception as e:
+        logger.error(f"Ошибка при очистке связей сообщений: {e}")
+
+
+async def refresh_menu_photos(context: ContextTypes.DEFAULT_TYPE):
+    """Фоновая задача: пересканирование каталога фото меню"""
+    logger = logging.getLogger(__name__)
+    try:
+        changed = await media_registry.refresh()
+    except Exception as e:
+        logger.error(f"Ошибка обновления реестра фото меню: {e}")
+        return
+
+    if changed:
+        await warm_up_menu_photos(context.application)
+
+
+async def flush_tracked_messages(context: ContextTypes.DEFAULT_TYPE):
+    """Фоновая задача: сохранение отслеживаемых сообщений меню в БД"""
+    logger = logging.getLogger(__name__)
+    try:
+        await message_cleanup.flush()
+    except Exception as e:
+        logger.error(f"Ошибка сохранения отслеживаемых сообщений: {e}")
+
+
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Глобальный обработчик ошибок для логирования таймаутов и других сетевых ошибок"""
     logger = logging.getLogger(__name__)
@@ -113,15 +186,60 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
         logger.error(f"Необработанная ошибка: {error}", exc_info=error)
 
 
+async def warm_up_menu_photos(application: Application):
+    """Предзагрузка фото меню, чтобы первые пользователи не ждали загрузку файлов"""
+    logger = logging.getLogger(__name__)
+    try:
+        uploaded = await photo_cache.warm_up(
+            application.bot,
+            PHOTO_WARMUP_CHAT_ID or ADMIN_ID,
+            media_registry.all()
+        )
+        logger.info(f"Прогрев фото меню завершен, загружено новых фото: {uploaded}")
+    except Exception as e:
+        logger.error(f"Ошибка прогрева фото меню: {e}")
+
+
 async def init_application(application: Application):
     """Инициализация приложения"""
     logger = logging.getLogger(__name__)
 
     await db.init_db()
+    await message_cleanup.load()
     await setup_bot_commands(application)
+    await media_registry.refresh()
+    await warm_up_menu_photos(application)
+    await user_registry.load()
+    await submission_store.load()
+    await notification_queue.start(application.bot)
+    await promo_expiry.start(application)
 
     job_queue = application.job_queue
     if job_queue:
+        job_queue.run_repeating(
+            refresh_menu_photos,
+            interval=MEDIA_SCAN_INTERVAL_SECONDS,
+            first=MEDIA_SCAN_INTERVAL_SECONDS
+        )
+
+        job_queue.run_repeating(
+            flush_tracked_messages,
+            interval=TRACKED_MESSAGES_FLUSH_SECONDS,
+            first=TRACKED_MESSAGES_FLUSH_SECONDS
+        )
+
+        job_queue.run_repeating(
+            user_activity.evict_idle,
+            interval=USER_DATA_EVICTION_INTERVAL_MINUTES * 60,
+            first=USER_DATA_EVICTION_INTERVAL_MINUTES * 60
+        )
+
+        job_queue.run_repeating(
+            cleanup_relay_messages,
+            interval=24 * 3600,
+            first=60
+        )
+
         job_queue.run_repeating(
             cleanup_expired_promos,
             interval=PROMO_CHECK_INTERVAL_HOURS * 3600,
@@ -133,6 +251,16 @@ async def init_application(application: Application):
         logger.info("Выполнена первичная очистка истекших промокодов")
 
 
+async def shutdown_application(application: Application):
+    """Сохранение отложенных данных при остановке бота"""
+    await drop_admission.shutdown()
+    await user_registry.flush()
+    await submission_store.flush()
+    await notification_queue.stop()
+    await message_cleanup.shutdown()
+    await photo_cache.flush()
+
+
 def setup_handlers(application: Application):
     """Настройка всех обработчиков"""
     
@@ -141,7 +269,7 @@ def setup_handlers(application: Application):
         entry_points=[
             CallbackQueryHandler(
                 button_callback,
-                pattern="^(admin_main|add_promo|list_promos|promo_history|stats|broadcast_menu|delete_promo_menu|upload_promo_file|delete_.*|manage_admins|add_admin|remove_admin_menu|remove_admin_.*|cancel)$"
+                pattern="^(admin_main|add_promo|list_promos|promo_history|stats|perf|submissions|close_submission_.*|drop_mode|drop_toggle|broadcast_menu|delete_promo_menu|upload_promo_file|delete_.*|manage_admins|add_admin|remove_admin_menu|remove_admin_.*|cancel)$"
             )
         ],
         states={
@@ -184,9 +312,14 @@ def setup_handlers(application: Application):
             ],
         },
         fallbacks=[CommandHandler("cancel", cancel)],
-        allow_reentry=True
+        allow_reentry=True,
+        name="admin_conversation",
+        persistent=True
     )
 
+    # Учет активности для выгрузки user_data неактивных пользователей
+    user_activity.register(application)
+
     # Основные обработчики команд
     application.add_handler(CommandHandler("start", menu_start))
     application.add_handler(CommandHandler("help", help_command))
@@ -198,9 +331,10 @@ def setup_handlers(application: Application):
     # Обработчики callback запросов для пользовательского меню
     application.add_handler(CallbackQueryHandler(menu_callback))
 
-    # Обработчик ответов админа на сообщения пользователей (должен идти ДО общего текстового хэндлера)
+    # Обработчик ответов админа на сообщения пользователей (должен идти ДО общего текстового хэндлера).
+    # Отвечать можно и в личке с ботом, и в канале уведомлений (отзывы, брони, заявки)
     application.add_handler(MessageHandler(
-        filters.ChatType.PRIVATE & filters.User(ADMIN_ID) & filters.REPLY,
+        (filters.ChatType.PRIVATE | filters.Chat(NOTIFICATION_CHAT_ID)) & filters.User(ADMIN_ID) & filters.REPLY,
         handle_admin_reply
     ))
 
@@ -211,6 +345,48 @@ def setup_handlers(application: Application):
     ))
 
 
+async def run_webhook(application: Application):
+    """Запуск в режиме webhook: жизненный цикл приложения ведется вручную,
+    так как run_webhook из PTB требует внешнюю зависимость (tornado)"""
+    logger = logging.getLogger(__name__)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    server = WebhookServer(application)
+
+    await application.initialize()
+    try:
+        await init_application(application)
+        await server.start()
+
+        if WEBHOOK_URL:
+            await application.bot.set_webhook(
+                url=f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+                secret_token=WEBHOOK_SECRET_TOKEN,
+                allowed_updates=ALLOWED_UPDATES,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                drop_pending_updates=True
+            )
+            logger.info(f"Webhook зарегистрирован: {WEBHOOK_URL}{WEBHOOK_PATH}")
+        else:
+            logger.warning("WEBHOOK_URL не задан, webhook в Telegram не регистрируется")
+
+        await application.start()
+        logger.info("Бот запущен успешно (webhook)")
+
+        await stop_event.wait()
+        logger.info("Остановка бота...")
+    finally:
+        await server.stop()
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        await shutdown_application(application)
+
+
 def main():
     """Основная функция запуска бота"""
     # Проверка обязательных переменных окружения
@@ -220,6 +396,9 @@ def main():
     if ADMIN_ID == 0:
         raise ValueError("ADMIN_ID не установлен в .env файле")
 
+    if BOT_MODE == "webhook" and not WEBHOOK_SECRET_TOKEN:
+        raise ValueError("WEBHOOK_SECRET_TOKEN не установлен в .env файле (обязателен в webhook-режиме)")
+
     # Настройка логирования
     setup_logging()
     logger = logging.getLogger(__name__)
@@ -227,7 +406,16 @@ def main():
 
     try:
         # Создание приложения
-        application = Application.builder().token(BOT_TOKEN).post_init(init_application).build()
+        application = (
+            Application.builder()
+            .token(BOT_TOKEN)
+            .rate_limiter(telegram_api)
+            .concurrent_updates(update_processor)
+            .persistence(persistence)
+            .post_init(init_application)
+            .post_shutdown(shutdown_application)
+            .build()
+        )
 
         # Добавление глобального обработчика ошибок
         application.add_error_handler(error_handler)
@@ -236,11 +424,14 @@ def main():
         setup_handlers(application)
 
         # Запуск бота
-        logger.info("Бот запущен успешно")
-        application.run_polling(
-            allowed_updates=["message", "callback_query"],
-            drop_pending_updates=True
-        )
+        if BOT_MODE == "webhook":
+            asyncio.run(run_webhook(application))
+        else:
+            logger.info("Бот запущен успешно")
+            application.run_polling(
+                allowed_updates=ALLOWED_UPDATES,
+                drop_pending_updates=True
+            )
 
     except Exception as e:
         logger.error(f"Ошибка при запуске бота: {e}")